@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark looking up candidate geonames in the geoname_lookup table against
+joining the geonames and alternatenames tables at query time.
+
+The names looked up for each document are its lowercased word ngrams of up
+to three words, which approximates the candidate names the GeonameAnnotator
+queries without needing the spacy models. The database must have a
+geoname_lookup table. Create one in an existing database with
+`python -m epitator.importers.import_geonames --create-lookup-table`.
+
+Usage:
+    python benchmarks/geoname_lookup.py
+    python benchmarks/geoname_lookup.py --documents article1.txt article2.txt
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import glob
+import io
+import os
+import re
+import timeit
+from epitator.get_database_connection import get_database_connection
+from epitator.geoname_annotator import (
+    has_geoname_lookup_table, query_geoname_lookup_table, query_geoname_tables)
+from epitator.utils import batched
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_DOCUMENTS = sorted(glob.glob(os.path.join(ROOT, 'tests', 'annotator', 'resources', '*.txt')))
+
+
+def document_names(text, max_ngram_length=3):
+    words = re.findall(r"\w+", text.lower(), re.UNICODE)
+    return sorted(set(
+        ' '.join(words[start:start + length])
+        for length in range(1, max_ngram_length + 1)
+        for start in range(len(words) - length + 1)))
+
+
+def query_in_batches(query_function, connection, names):
+    # Older versions of sqlite allow at most 999 query parameters.
+    return [row for batch in batched(names, 500) for row in query_function(connection, batch)]
+
+
+def normalize_results(rows):
+    return sorted(tuple(sorted(
+        (key, row[key]) for key in row.keys()
+        # The order of the concatenated names may differ.
+        if key != 'names_used')) for row in rows)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', nargs='+', default=DEFAULT_DOCUMENTS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    connection = get_database_connection(read_only=True)
+    if not has_geoname_lookup_table(connection):
+        raise Exception("The database doesn't have a geoname_lookup table.")
+    totals = {query_geoname_lookup_table: 0, query_geoname_tables: 0}
+    for path in args.documents:
+        with io.open(path, encoding='utf8') as f:
+            names = document_names(f.read())
+        results = []
+        for query_function in [query_geoname_lookup_table, query_geoname_tables]:
+            time = min(timeit.repeat(
+                lambda: query_in_batches(query_function, connection, names),
+                number=1, repeat=args.repeat))
+            totals[query_function] += time
+            results.append(normalize_results(query_in_batches(query_function, connection, names)))
+        if results[0] != results[1]:
+            raise Exception("The queries returned different geonames for " + path)
+        print('%-40s %6d names %6d geonames' % (os.path.basename(path), len(names), len(results[0])))
+    print('%-40s %8.1f ms' % ('geoname_lookup table', totals[query_geoname_lookup_table] * 1000.0))
+    print('%-40s %8.1f ms' % ('geonames and alternatenames join', totals[query_geoname_tables] * 1000.0))
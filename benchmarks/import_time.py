@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark the time it takes to import EpiTator modules.
+
+Each module is imported in a fresh interpreter started with
+`python -X importtime` (Python 3.7+) and the cumulative import time of the
+module is reported. Models are loaded lazily, so the time it takes to load
+them on first use is reported separately.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --modules epitator.count_annotator
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import timeit
+
+DEFAULT_MODULES = [
+    'epitator.annotator',
+    'epitator.spacy_annotator',
+    'epitator.structured_data_annotator',
+    'epitator.database_interface',
+    'epitator.date_annotator',
+    'epitator.count_annotator',
+    'epitator.geoname_annotator',
+    'epitator.structured_incident_annotator',
+]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time_us(module):
+    """
+    Return the cumulative import time of the module in microseconds.
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        raise Exception("Could not import " + module + ":\n" + stderr.decode('utf8'))
+    for line in stderr.decode('utf8').splitlines():
+        # Lines have the format: import time: self | cumulative | name
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1].strip())
+    if sys.version_info < (3, 7):
+        raise Exception("-X importtime requires Python 3.7 or later.")
+    raise Exception(
+        "The import time of " + module + " was not reported, "
+        "so it may have been imported when the interpreter started.")
+
+
+def model_load_time_s():
+    """
+    Return the time in seconds that it takes to load the spacy models.
+    """
+    return timeit.timeit(
+        'load_models()',
+        setup='from epitator.spacy_nlp import load_models',
+        number=1)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument(
+        "--skip-models", dest='skip_models', action='store_true')
+    parser.set_defaults(skip_models=False)
+    args = parser.parse_args()
+    for module in args.modules:
+        print('%-45s %8.1f ms' % (module, import_time_us(module) / 1000.0))
+    if not args.skip_models:
+        print('%-45s %8.1f ms' % ('spacy model load', model_load_time_s() * 1000.0))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark the memory used by each kind of span.
+
+Spans of each class are created across a large document and the memory
+allocated for them, including their metadata and base span containers, is
+measured with tracemalloc (Python 3.4+). The objects the spans refer to,
+like the document and geonames, are shared by all the spans, so they don't
+count towards the per-span size. The spacy token and sentence spans aren't
+included since they require the spacy models.
+
+Usage:
+    python benchmarks/span_memory.py
+    python benchmarks/span_memory.py --spans 200000
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import datetime
+import gc
+import tracemalloc
+from epitator.annodoc import AnnoDoc
+from epitator.annospan import AnnoSpan, SpanGroup
+from epitator.count_annotator import CountSpan
+from epitator.date_annotator import DateSpan
+from epitator.geoname_annotator import GeoSpan, GeonameRow
+from epitator.resolved_keyword_annotator import ResolvedKeywordSpan
+
+GEONAME = GeonameRow({
+    'geonameid': '1153671',
+    'name': 'Chiang Mai',
+    'latitude': 18.79038,
+    'longitude': 98.98468,
+})
+DATETIME_RANGE = [datetime.datetime(2018, 1, 1), datetime.datetime(2018, 1, 2)]
+RESOLUTIONS = [{'entity_id': 'http://purl.obolibrary.org/obo/DOID_4325', 'weight': 3}]
+
+SPAN_FACTORIES = [
+    ('AnnoSpan', lambda doc, start: AnnoSpan(start, start + 5, doc)),
+    ('AnnoSpan with label', lambda doc, start: AnnoSpan(start, start + 5, doc, label='word')),
+    ('SpanGroup of 2 spans', lambda doc, start: SpanGroup([
+        AnnoSpan(start, start + 2, doc), AnnoSpan(start + 3, start + 5, doc)], 'group')),
+    ('GeoSpan', lambda doc, start: GeoSpan(start, start + 5, doc, GEONAME)),
+    ('DateSpan', lambda doc, start: DateSpan(AnnoSpan(start, start + 5, doc), DATETIME_RANGE)),
+    ('CountSpan', lambda doc, start: CountSpan(
+        AnnoSpan(start, start + 5, doc), {'count': 5, 'attributes': ['case']})),
+    ('ResolvedKeywordSpan', lambda doc, start: ResolvedKeywordSpan(
+        AnnoSpan(start, start + 5, doc), RESOLUTIONS)),
+]
+
+
+def measure_span_size(factory, doc, span_count):
+    """
+    Return the average number of bytes allocated for each span. The
+    intermediate spans used to construct a span are freed before the
+    measurement is taken.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start_size = tracemalloc.get_traced_memory()[0]
+    spans = [None] * span_count
+    list_size = tracemalloc.get_traced_memory()[0] - start_size
+    for idx in range(span_count):
+        spans[idx] = factory(doc, (idx * 6) % (len(doc.text) - 6))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start_size - list_size
+    tracemalloc.stop()
+    has_dict = hasattr(spans[0], '__dict__')
+    del spans
+    return float(size) / span_count, has_dict
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spans', type=int, default=100000)
+    args = parser.parse_args()
+    doc = AnnoDoc('Three cases of Ebola were reported in Chiang Mai. ' * 20000)
+    print('%-25s %10s %10s' % ('span class', 'bytes', '__dict__'))
+    for name, factory in SPAN_FACTORIES:
+        size, has_dict = measure_span_size(factory, doc, args.spans)
+        print('%-25s %10.1f %10s' % (name, size, 'yes' if has_dict else 'no'))
@@ -5,12 +5,50 @@ from __future__ import absolute_import
 from __future__ import print_function
 import json
 from . import maximum_weight_interval_set as mwis
+from . import regex_scanner
 import six
 import re
 from .annospan import AnnoSpan, SpanGroup
 from .annotier import AnnoTier
 
 
+def iterate_referenced_spans(roots):
+    """
+    Iterate over the given spans and every span reachable from them through
+    base spans and metadata, visiting each span once.
+    """
+    visited_ids = set()
+    stack = list(roots)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, AnnoSpan):
+            if id(item) in visited_ids:
+                continue
+            visited_ids.add(id(item))
+            yield item
+            stack.extend(item.base_spans)
+            if item.metadata:
+                stack.append(item.metadata)
+        elif isinstance(item, (dict, list, tuple, set, frozenset)):
+            if id(item) in visited_ids:
+                continue
+            visited_ids.add(id(item))
+            if isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            else:
+                stack.extend(item)
+
+
+def expand_to_lines(text, start, end):
+    """
+    Return the offsets of the full lines containing the range of text.
+    """
+    start = text.rfind("\n", 0, start) + 1
+    end = text.find("\n", end)
+    return start, len(text) if end < 0 else end + 1
+
+
 class AnnoDoc(object):
     """
     A document to be annotated.
@@ -26,16 +64,164 @@ class AnnoDoc(object):
         self.tiers = {}
         self.properties = {}
         self.date = date
+        # The annotators applied to the document in the order they finished
+        # and the annotator that created each tier. These are used to
+        # update the tiers when the text is edited.
+        self.annotators = []
+        self.tier_annotators = {}
 
     def add_tier(self, annotator, **kwargs):
         return self.add_tiers(annotator, **kwargs)
 
     def add_tiers(self, annotator, **kwargs):
+        previous_tiers = dict(self.tiers)
+        previous_tier_annotators = dict(self.tier_annotators)
         result = annotator.annotate(self, **kwargs)
         if isinstance(result, dict):
             self.tiers.update(result)
+        for name, tier in self.tiers.items():
+            if previous_tiers.get(name) is tier:
+                continue
+            # Tiers added by the add_tiers calls the annotator made for its
+            # dependencies belong to the annotators that created them.
+            claimed = self.tier_annotators.get(name) is not previous_tier_annotators.get(name)
+            if not claimed or (isinstance(result, dict) and name in result):
+                self.tier_annotators[name] = annotator
+        if not any(a is annotator for a, _ in self.annotators):
+            self.annotators.append((annotator, kwargs))
         return self
 
+    def add_tiers_async(self, annotator, executor=None, timeout=None, **kwargs):
+        """
+        Return an asyncio future that resolves to the document after the
+        annotator is run on it in the executor. See async_annotation.
+        """
+        from .async_annotation import add_tiers_async
+        return add_tiers_async(self, annotator, executor=executor, timeout=timeout, **kwargs)
+
+    def update_text(self, text, context=100):
+        r"""
+        Replace the text of the document and update its tiers without
+        re-annotating all of it.
+
+        Spans in the changed region, or within context characters of it, are
+        removed along with any spans that overlap them, and the offsets of the
+        spans after it are shifted. The annotators that created the tiers are
+        re-run on the window of full lines covering the removed spans and the
+        new spans are added to the tiers. Annotators with a true
+        document_level attribute use information from the whole document,
+        so they are re-run on the full text instead.
+
+        >>> from .annotier import AnnoTier
+        >>> class WordAnnotator(object):
+        ...     def annotate(self, doc):
+        ...         return {'words': doc.create_regex_tier(r"\w+")}
+        >>> doc = AnnoDoc('one two\nthree four\nfive')
+        >>> doc.add_tiers(WordAnnotator()).tiers['words'].spans[-1]
+        SpanGroup(text=five, label=None, AnnoSpan(19-23, five))
+        >>> doc.update_text('one two\nthree 4\nfive', context=0)
+        >>> [span.text for span in doc.tiers['words']]
+        ['one', 'two', 'three', '4', 'five']
+        >>> doc.tiers['words'].spans[-1]
+        SpanGroup(text=five, label=None, AnnoSpan(16-20, five))
+        """
+        if type(text) is not six.text_type:
+            text = six.text_type(text, 'utf8')
+        old_text = self.text
+        # Find the changed region from the common prefix and suffix.
+        prefix_len = 0
+        max_len = min(len(old_text), len(text))
+        while prefix_len < max_len and old_text[prefix_len] == text[prefix_len]:
+            prefix_len += 1
+        suffix_len = 0
+        while suffix_len < max_len - prefix_len and\
+                old_text[-suffix_len - 1] == text[-suffix_len - 1]:
+            suffix_len += 1
+        old_change_end = len(old_text) - suffix_len
+        offset_change = len(text) - len(old_text)
+        document_level_tiers = set(
+            name for name, annotator in self.tier_annotators.items()
+            if getattr(annotator, 'document_level', False))
+        local_tiers = [
+            tier for name, tier in self.tiers.items()
+            if name not in document_level_tiers]
+        # Expand the window to include all the spans that overlap it.
+        window_start, window_end = expand_to_lines(
+            old_text,
+            max(0, prefix_len - context),
+            min(len(old_text), old_change_end + context))
+        expanded = True
+        while expanded:
+            expanded = False
+            for tier in local_tiers:
+                for span in tier.spans:
+                    if span.end > window_start and span.start < window_end and (
+                            span.start < window_start or span.end > window_end):
+                        window_start, window_end = expand_to_lines(
+                            old_text,
+                            min(window_start, span.start),
+                            max(window_end, span.end))
+                        expanded = True
+
+        def shift_offset(offset):
+            if offset >= old_change_end and offset > prefix_len:
+                return offset + offset_change
+            return min(offset, prefix_len + max(0, offset_change))
+
+        kept_spans_by_tier = {}
+        for name, tier in self.tiers.items():
+            if name in document_level_tiers:
+                continue
+            kept_spans_by_tier[name] = (
+                [span for span in tier.spans if span.end <= window_start],
+                [span for span in tier.spans if span.start >= window_end])
+        for span in iterate_referenced_spans(
+                span for spans_before, spans_after in kept_spans_by_tier.values()
+                for span in spans_after):
+            span.start = shift_offset(span.start)
+            span.end = max(span.start, shift_offset(span.end))
+        self.text = text
+        # Re-annotate the window in a separate document.
+        window_end += offset_change
+        window_doc = AnnoDoc(text[window_start:window_end], date=self.date)
+        window_doc.properties = self.properties
+        for annotator, kwargs in self.annotators:
+            tier_names = [
+                name for name, tier_annotator in self.tier_annotators.items()
+                if tier_annotator is annotator]
+            if getattr(annotator, 'document_level', False) or len(tier_names) == 0:
+                continue
+            if all(name in window_doc.tiers for name in tier_names):
+                continue
+            window_doc.add_tiers(annotator, **kwargs)
+        for span in iterate_referenced_spans(
+                span for tier in window_doc.tiers.values() for span in tier.spans):
+            span.start += window_start
+            span.end += window_start
+            span.doc = self
+        for name, (spans_before, spans_after) in kept_spans_by_tier.items():
+            tier = self.tiers[name]
+            new_spans = []
+            if name in window_doc.tiers:
+                tier = window_doc.tiers[name]
+                new_spans = tier.spans
+            self.tiers[name] = tier.__class__(
+                spans_before + new_spans + spans_after, presorted=True)
+        for annotator, kwargs in self.annotators:
+            if getattr(annotator, 'document_level', False):
+                for name in document_level_tiers:
+                    if self.tier_annotators[name] is annotator:
+                        del self.tiers[name]
+        for annotator, kwargs in list(self.annotators):
+            if getattr(annotator, 'document_level', False):
+                self.add_tiers(annotator, **kwargs)
+
+    def append_text(self, text, context=100):
+        """
+        Add text to the end of the document and update its tiers.
+        """
+        self.update_text(self.text + text, context)
+
     def require_tiers(self, *tier_names, **kwargs):
         """
         Return the specified tiers or add them using the via annotator.
@@ -69,6 +255,35 @@ class AnnoDoc(object):
                     match.group(0))], label))
         return AnnoTier(spans, presorted=True)
 
+    def create_regex_tiers(self, patterns):
+        r"""
+        Create an AnnoTier for each of the given labeled regexes from the
+        spans of text that match it. The text is prefiltered for the
+        characters the regexes' matches can start with (see regex_scanner),
+        and the spans are AnnoSpans with the regex's label rather than span
+        groups.
+
+        Args:
+            patterns (list): (label, regex) pairs.
+        Returns:
+            A dict mapping each label to a tier of its regex's matches.
+
+        >>> doc = AnnoDoc('3 cases on 2017-01-02 and 1,000 cases on 2017-01-03')
+        >>> tiers = doc.create_regex_tiers([
+        ...     ('date', r'\b\d{4}-\d{2}-\d{2}\b'),
+        ...     ('number', r'\d+(,\d{3})*')])
+        >>> tiers['date']
+        AnnoTier([AnnoSpan(11-21, date), AnnoSpan(41-51, date)])
+        >>> [span.text for span in tiers['number']]
+        ['3', '2017', '01', '02', '1,000', '2017', '01', '03']
+        """
+        labels = [label for label, regex in patterns]
+        matches = regex_scanner.find_matches(self.text, [regex for label, regex in patterns])
+        return {
+            label: AnnoTier([AnnoSpan(start, end, self, label) for start, end in label_matches],
+                            presorted=True)
+            for label, label_matches in zip(labels, matches)}
+
     def to_json(self):
         json_obj = {'text': self.text,
                     'properties': self.properties}
@@ -3,7 +3,8 @@
 from __future__ import absolute_import
 
 
-EMPTY_LIST = []
+# The base spans of spans that aren't groups.
+EMPTY_TUPLE = ()
 
 
 class AnnoSpan(object):
@@ -18,7 +19,7 @@ class AnnoSpan(object):
         self.doc = doc
         self.metadata = metadata
         # Base spans is only non-empty on span groups.
-        self.base_spans = EMPTY_LIST
+        self.base_spans = EMPTY_TUPLE
         self.label = label
 
     def __repr__(self):
@@ -124,46 +125,95 @@ class AnnoSpan(object):
         >>> number_span_g.groupdict()
         {'number': [AnnoSpan(0-3, number), AnnoSpan(4-7, number)], 'animal': [AnnoSpan(8-12, animal)]}
         """
-        out = {}
-        for base_span in self.base_spans:
-            for key, values in base_span.groupdict().items():
-                out[key] = out.get(key, []) + values
+        return {key: list(spans) for key, spans in self._label_index().items()}
+
+    def _label_index(self):
+        """
+        Return the mapping of labels to spans that groupdict returns a copy
+        of. It must not be modified.
+        """
         if self.label:
-            out[self.label] = [self]
-        return out
+            return {self.label: [self]}
+        return {}
 
     def iterate_base_spans(self):
         """
-        Recursively iterate over all base_spans including base_spans of child SpanGroups.
+        Iterate over all base_spans including base_spans of child SpanGroups.
+        Each span is followed by its own base spans.
+
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two wolf')
+        >>> numbers = SpanGroup([AnnoSpan(0, 3, doc), AnnoSpan(4, 7, doc)], 'numbers')
+        >>> span_g = SpanGroup([numbers, AnnoSpan(8, 12, doc)])
+        >>> list(span_g.iterate_base_spans())[1:]
+        [AnnoSpan(0-3, one), AnnoSpan(4-7, two), AnnoSpan(8-12, wolf)]
+        >>> list(span_g.iterate_leaf_base_spans())
+        [AnnoSpan(0-3, one), AnnoSpan(4-7, two), AnnoSpan(8-12, wolf)]
         """
-        for span in self.base_spans:
+        stack = list(reversed(self.base_spans))
+        while stack:
+            span = stack.pop()
             yield span
-            for span2 in span.iterate_base_spans():
-                yield span2
+            stack.extend(reversed(span.base_spans))
+
+    def _leaf_spans(self):
+        return EMPTY_TUPLE
 
     def iterate_leaf_base_spans(self):
         """
-        Return the leaf base spans in a SpanGroup tree.
+        Return an iterator over the leaf base spans in a SpanGroup tree.
         """
-        for span in self.iterate_base_spans():
-            if not isinstance(span, SpanGroup):
-                yield span
+        return iter(self._leaf_spans())
 
 
 class SpanGroup(AnnoSpan):
     """
     A AnnoSpan that extends through a group of AnnoSpans.
+    The base spans are stored in a tuple. The group's labeled spans and leaf
+    spans are computed the first time they are used and reused after that,
+    so groups of groups build on their base spans' results.
     """
+    __slots__ = ['_cached_label_index', '_cached_leaf_spans']
+
     def __init__(self, base_spans, label=None, metadata=None):
         assert isinstance(base_spans, list)
         assert len(base_spans) > 0
-        super(SpanGroup, self).__init__(
-            min(s.start for s in base_spans),
-            max(s.end for s in base_spans),
-            base_spans[0].doc,
-            label,
-            metadata)
-        self.base_spans = base_spans
+        start = base_spans[0].start
+        end = base_spans[0].end
+        for span in base_spans:
+            if span.start < start:
+                start = span.start
+            if span.end > end:
+                end = span.end
+        super(SpanGroup, self).__init__(start, end, base_spans[0].doc, label, metadata)
+        self.base_spans = tuple(base_spans)
+        self._cached_label_index = None
+        self._cached_leaf_spans = None
+
+    def _label_index(self):
+        if self._cached_label_index is None:
+            label_index = {}
+            for base_span in self.base_spans:
+                for key, spans in base_span._label_index().items():
+                    if key in label_index:
+                        label_index[key].extend(spans)
+                    else:
+                        label_index[key] = list(spans)
+            if self.label:
+                label_index[self.label] = [self]
+            self._cached_label_index = label_index
+        return self._cached_label_index
+
+    def _leaf_spans(self):
+        if self._cached_leaf_spans is None:
+            leaf_spans = []
+            for span in self.base_spans:
+                if isinstance(span, SpanGroup):
+                    leaf_spans.extend(span._leaf_spans())
+                else:
+                    leaf_spans.append(span)
+            self._cached_leaf_spans = tuple(leaf_spans)
+        return self._cached_leaf_spans
 
     def __repr__(self):
         return ("SpanGroup("
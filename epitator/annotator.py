@@ -5,10 +5,14 @@ from __future__ import absolute_import
 from __future__ import print_function
 from .annodoc import AnnoDoc  # noqa: F401
 from .annospan import AnnoSpan  # noqa: F401
-from .annotier import AnnoTier  # noqa: F401
+from .annotier import AnnoTier, AnnoTierBuilder  # noqa: F401
 
 
 class Annotator(object):
+    # Whether the annotations depend on the whole document rather than just
+    # the text around them. This determines how the annotator is re-run
+    # when the document text is updated.
+    document_level = False
 
     def annotate(self, doc):
         """Take an AnnoDoc and produce a new annotation tier"""
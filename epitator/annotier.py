@@ -4,15 +4,26 @@ from __future__ import absolute_import
 import json
 import six
 import re
+from bisect import bisect_left
+from operator import attrgetter
 from .annospan import SpanGroup, AnnoSpan
 from . import maximum_weight_interval_set as mwis
 
+# The key spans are sorted by. It orders spans the same way as AnnoSpan.__lt__
+# but the comparisons are done in C.
+span_offsets = attrgetter('start', 'end')
+
+# Patterns made of literal alternatives, like "case|death", that search_spans
+# can look up in the tier's text index instead of matching every span.
+literal_alternation_re = re.compile(r"[\w '-]+(\|[\w '-]+)*$", re.U)
+
 
 class AnnoTier(object):
     """
     A group of AnnoSpans stored sorted by start offset.
     """
     def __init__(self, spans=None, presorted=False):
+        self._indexes = {}
         if spans is None:
             self.spans = []
         elif isinstance(spans, AnnoTier):
@@ -21,7 +32,7 @@ class AnnoTier(object):
             if presorted:
                 self.spans = spans
             else:
-                self.spans = sorted(spans)
+                self.spans = sorted(spans, key=span_offsets)
 
     def __repr__(self):
         return ('AnnoTier([' +
@@ -32,7 +43,21 @@ class AnnoTier(object):
         return len(self.spans)
 
     def __add__(self, other_tier):
-        return AnnoTier(self.spans + other_tier.spans)
+        """
+        Create a tier with the spans from both tiers. Spans with the same
+        offsets in both tiers are ordered with this tier's first.
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two three')
+        >>> AnnoTier([AnnoSpan(0, 3, doc), AnnoSpan(8, 13, doc)]) + AnnoTier([AnnoSpan(4, 7, doc)])
+        AnnoTier([AnnoSpan(0-3, one), AnnoSpan(4-7, two), AnnoSpan(8-13, three)])
+        """
+        spans = self.spans + other_tier.spans
+        # The list is made of two sorted runs, so the sort merges them
+        # in linear time.
+        spans.sort(key=span_offsets)
+        return AnnoTier(spans, presorted=True)
 
     def __iter__(self):
         return iter(self.spans)
@@ -65,7 +90,7 @@ class AnnoTier(object):
         if isinstance(other_tier, AnnoTier):
             other_spans = other_tier.spans
         else:
-            other_spans = sorted(other_tier)
+            other_spans = sorted(other_tier, key=span_offsets)
         other_spans_idx = 0
         for span in self.spans:
             span_group = []
@@ -106,9 +131,23 @@ class AnnoTier(object):
         >>> tier1.spans_contained_by_span(span1)
         AnnoTier([AnnoSpan(4-7, two)])
         """
-        return(
-            AnnoTier([span for span in self if selector_span.contains(span)])
-        )
+        # Binary search for the first span that starts within the selector span.
+        low = 0
+        high = len(self.spans)
+        while low < high:
+            mid = (low + high) // 2
+            if self.spans[mid].start < selector_span.start:
+                low = mid + 1
+            else:
+                high = mid
+        result = []
+        for idx in range(low, len(self.spans)):
+            span = self.spans[idx]
+            if span.start > selector_span.end:
+                break
+            if span.end <= selector_span.end:
+                result.append(span)
+        return AnnoTier(result, presorted=True)
 
     def spans_overlapped_by_span(self, selector_span):
         """
@@ -140,7 +179,8 @@ class AnnoTier(object):
         >>> tier.with_label("odd")
         AnnoTier([AnnoSpan(0-3, odd), AnnoSpan(8-13, odd)])
         """
-        return AnnoTier([span for span in self if span.label == label])
+        return AnnoTier([self.spans[idx] for idx in self._index('label').get(label, [])],
+                        presorted=True)
 
     def optimal_span_set(self, prefer="text_length"):
         """
@@ -318,20 +358,55 @@ class AnnoTier(object):
     def chains(self, at_least=1, at_most=None, max_dist=1):
         """
         Create a new tier from all chains of spans within max_dist of eachother.
-        """
-        combined_spans = AnnoTier()
-        new_combined_spans = self
+        Each chain of more than one span is a SpanGroup of the spans in it.
+        The tier is ordered by offsets, then by chain length.
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two three')
+        >>> tier = AnnoTier([AnnoSpan(0, 3, doc),
+        ...                  AnnoSpan(4, 7, doc),
+        ...                  AnnoSpan(8, 13, doc)])
+        >>> tier.chains(at_least=2)
+        AnnoTier([SpanGroup(text=one two, label=None, AnnoSpan(0-3, one), AnnoSpan(4-7, two)), SpanGroup(text=one two three, label=None, AnnoSpan(0-3, one), AnnoSpan(4-7, two), AnnoSpan(8-13, three)), SpanGroup(text=two three, label=None, AnnoSpan(4-7, two), AnnoSpan(8-13, three))])
+        """
+        spans = self.spans
+        starts = [span.start for span in spans]
+        ends = [span.end for span in spans]
+
+        def offsets(chain):
+            return starts[chain[0]], ends[chain[-1]]
+
+        # The range of indices of the spans that can follow each span.
+        following_ranges = [
+            (bisect_left(starts, end), bisect_left(starts, end + max_dist + 1))
+            for end in ends]
+        # Chains are built one span longer at a time from tuples of span
+        # indices. Each length's chains are ordered by offsets, and chains
+        # with the same offsets are kept in the order they were extended in.
+        chains = [(idx,) for idx in range(len(spans))]
         chain_len = 1
+        result = []
         while True:
             if chain_len >= at_least:
-                combined_spans += new_combined_spans
-            if len(new_combined_spans) == 0:
+                result.extend(chains)
+            if len(chains) == 0 or (at_most and chain_len >= at_most):
                 break
+            # Following spans must end after the chain starts so empty spans
+            # don't form chains with themselves.
+            chains = sorted([
+                chain + (following_idx,)
+                for chain in chains
+                for following_idx in range(*following_ranges[chain[-1]])
+                if ends[following_idx] > starts[chain[0]]],
+                key=offsets)
             chain_len += 1
-            if at_most and chain_len > at_most:
-                break
-            new_combined_spans = new_combined_spans.with_following_spans_from(self, max_dist=max_dist)
-        return combined_spans
+        # The sort is stable, so shorter chains come before longer ones with
+        # the same offsets.
+        result.sort(key=offsets)
+        return AnnoTier([
+            spans[chain[0]] if len(chain) == 1 else SpanGroup([spans[idx] for idx in chain])
+            for chain in result], presorted=True)
 
     def span_before(self, target_span, allow_overlap=True):
         """
@@ -374,14 +449,47 @@ class AnnoTier(object):
 
     def search_spans(self, regex, label=None):
         """
-        Search spans for ones matching the given regular expression.
-        """
-        regex = re.compile(regex + r'$', re.I)
-        match_spans = []
-        for span in self:
-            if regex.match(span.text):
-                match_spans.append(SpanGroup([span], label))
-        return AnnoTier(match_spans, presorted=True)
+        Search spans for ones whose full text matches the given regular
+        expression, ignoring case. Patterns that are literal words or
+        alternations of them are looked up in the tier's text index.
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('To and today or Or')
+        >>> tier = AnnoTier([AnnoSpan(0, 2, doc), AnnoSpan(3, 6, doc),
+        ...                  AnnoSpan(7, 12, doc), AnnoSpan(13, 15, doc),
+        ...                  AnnoSpan(16, 18, doc)])
+        >>> [span.text for span in tier.search_spans('to|or')]
+        ['To', 'or', 'Or']
+        >>> [span.text for span in tier.search_spans('to.*')]
+        ['To', 'today']
+        """
+        if literal_alternation_re.match(regex):
+            text_index = self._index('text')
+            indices = set()
+            for text in regex.lower().split('|'):
+                indices.update(text_index.get(text, []))
+            match_spans = [self.spans[idx] for idx in sorted(indices)]
+        else:
+            regex = re.compile(r'(?:' + regex + r')$', re.I)
+            match_spans = [span for span in self if regex.match(span.text)]
+        return AnnoTier([SpanGroup([span], label) for span in match_spans], presorted=True)
+
+    def _index(self, name):
+        """
+        Return a dict mapping the labels or lowercased texts of the spans to
+        their indices in the tier. The index is built the first time it is
+        needed and rebuilt if the span list is replaced or added to.
+        """
+        cached = self._indexes.get(name)
+        if cached and cached[0] is self.spans and cached[1] == len(self.spans):
+            return cached[2]
+        index = {}
+        for idx, span in enumerate(self.spans):
+            key = span.label if name == 'label' else span.text.lower()
+            index.setdefault(key, []).append(idx)
+        self._indexes[name] = (self.spans, len(self.spans), index)
+        return index
 
     def match_subspans(self, regex):
         """
@@ -407,3 +515,39 @@ class AnnoTier(object):
                     span.doc
                 ))
         return AnnoTier(match_spans, presorted=True)
+
+
+class AnnoTierBuilder(object):
+    """
+    Collects spans for a new tier. The spans are only sorted when the tier
+    is built, so spans can be added from a loop without creating a sorted
+    tier on each iteration.
+
+    >>> from .annospan import AnnoSpan
+    >>> from .annodoc import AnnoDoc
+    >>> doc = AnnoDoc('one two three')
+    >>> builder = AnnoTierBuilder()
+    >>> builder.add(AnnoTier([AnnoSpan(8, 13, doc)]))
+    >>> builder.add_span(AnnoSpan(0, 3, doc))
+    >>> builder.build()
+    AnnoTier([AnnoSpan(0-3, one), AnnoSpan(8-13, three)])
+    """
+    def __init__(self, spans=None):
+        self.spans = list(spans) if spans else []
+
+    def __len__(self):
+        return len(self.spans)
+
+    def add_span(self, span):
+        self.spans.append(span)
+
+    def add(self, spans):
+        """
+        Add the spans in a tier or other iterable.
+        """
+        if isinstance(spans, AnnoTier):
+            spans = spans.spans
+        self.spans.extend(spans)
+
+    def build(self):
+        return AnnoTier(self.spans)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+Annotate documents from asyncio code without blocking the event loop.
+
+The annotators run in an executor, so awaiting a document only suspends the
+calling coroutine. The database queries made by the GeonameAnnotator and
+ResolvedKeywordAnnotator are sent to a separate pool of threads that each
+have their own database connection, so slow queries don't occupy the
+threads doing CPU work.
+
+    pipeline = AsyncPipeline([GeonameAnnotator(), CountAnnotator()])
+    doc = await pipeline.annotate(AnnoDoc(text), timeout=10)
+
+This module requires Python 3.
+"""
+from __future__ import absolute_import
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .get_database_connection import get_database_connection, set_query_executor
+
+
+class AnnotationCancelled(Exception):
+    """
+    Raised in the thread annotating a document when the annotation is
+    cancelled or times out.
+    """
+    pass
+
+
+class DatabaseExecutor(object):
+    """
+    A pool of threads that run database queries, each with its own
+    read-only connection. Queries are submitted with run, which blocks until
+    the result is available.
+    """
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers)
+
+    def call_with_connection(self, query_function, *args):
+        return query_function(get_database_connection(read_only=True), *args)
+
+    def run(self, query_function, *args):
+        return self.executor.submit(self.call_with_connection, query_function, *args).result()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait)
+
+
+class CancellableQueryExecutor(object):
+    """
+    Sends the queries made while annotating a document to a DatabaseExecutor
+    unless the annotation was cancelled.
+    """
+    def __init__(self, database_executor, cancelled):
+        self.database_executor = database_executor
+        self.cancelled = cancelled
+
+    def run(self, query_function, *args):
+        if self.cancelled.is_set():
+            raise AnnotationCancelled()
+        return self.database_executor.run(query_function, *args)
+
+
+_default_database_executor = None
+_default_database_executor_lock = threading.Lock()
+
+
+def get_default_database_executor():
+    """
+    Return a DatabaseExecutor shared by the pipelines that don't have one.
+    """
+    global _default_database_executor
+    with _default_database_executor_lock:
+        if _default_database_executor is None:
+            _default_database_executor = DatabaseExecutor()
+        return _default_database_executor
+
+
+def run_annotators(doc, annotators, cancelled, database_executor):
+    """
+    Apply the (annotator, kwargs) pairs to the document in order, checking
+    whether the annotation was cancelled before each one.
+    """
+    set_query_executor(CancellableQueryExecutor(database_executor, cancelled))
+    try:
+        for annotator, kwargs in annotators:
+            if cancelled.is_set():
+                raise AnnotationCancelled()
+            doc.add_tiers(annotator, **kwargs)
+        return doc
+    finally:
+        set_query_executor(None)
+
+
+class AsyncPipeline(object):
+    """
+    Applies a sequence of annotators to documents in an executor.
+
+    executor is the concurrent.futures executor the annotators run in. It
+    must use threads rather than processes since documents and annotators
+    can't be pickled. By default the event loop's default executor is used.
+    Annotators may be used by several threads at once, so they shouldn't
+    keep per-document state on themselves.
+
+    database_executor is the DatabaseExecutor used for queries. By default
+    a pool shared by all pipelines is used.
+    """
+    def __init__(self, annotators, executor=None, database_executor=None):
+        self.annotators = [
+            annotator if isinstance(annotator, tuple) else (annotator, {})
+            for annotator in annotators]
+        self.executor = executor
+        self.database_executor = database_executor
+
+    def annotate(self, doc, timeout=None):
+        """
+        Return a future that resolves to the document once the annotators
+        have been applied to it.
+
+        If the future is cancelled or the timeout in seconds expires, the
+        annotation stops before the next annotator or database query, and
+        the future raises CancelledError or asyncio.TimeoutError. Tiers
+        added before it stopped remain on the document.
+        """
+        loop = asyncio.get_event_loop()
+        cancelled = threading.Event()
+        future = loop.run_in_executor(
+            self.executor,
+            run_annotators,
+            doc,
+            self.annotators,
+            cancelled,
+            self.database_executor or get_default_database_executor())
+
+        def set_cancelled(future):
+            if future.cancelled():
+                cancelled.set()
+        future.add_done_callback(set_cancelled)
+        if timeout is not None:
+            future = asyncio.ensure_future(asyncio.wait_for(future, timeout))
+        return future
+
+    def annotate_all(self, docs, timeout=None):
+        """
+        Return a future that resolves to the list of documents once they
+        have all been annotated. The timeout applies to each document.
+        """
+        return asyncio.gather(*[self.annotate(doc, timeout) for doc in docs])
+
+
+def add_tiers_async(doc, annotator, executor=None, timeout=None, **kwargs):
+    """
+    The async version of AnnoDoc.add_tiers.
+    """
+    return AsyncPipeline([(annotator, kwargs)], executor=executor).annotate(doc, timeout)
@@ -9,15 +9,39 @@ from .spacy_annotator import SpacyAnnotator
 from .date_annotator import DateAnnotator
 from .raw_number_annotator import RawNumberAnnotator
 from . import utils
-from .spacy_nlp import spacy_nlp
+from .spacy_nlp import spacy_nlp, LazyModel
 import logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s %(message)s')
 logger = logging.getLogger(__name__)
 
-in_case_token = spacy_nlp(u"Break glass in case of emergency.")[3]
+# The token is created on first use so that importing this module doesn't
+# load the spacy model.
+in_case_token = LazyModel(
+    lambda: spacy_nlp(u"Break glass in case of emergency.")[3])
+# Token similarities are computed from the word vectors of their lexemes,
+# so the similarity of each lexeme to the in_case_token is only computed once.
+in_case_similarities = {}
+
+
+def in_case_similarity(token):
+    """
+    Return the similarity of the token to the "in case of" sense of the
+    word case.
+    """
+    if token.vocab.vectors.size == 0 or token.doc.user_token_hooks:
+        # Without word vectors spacy uses context sensitive token vectors
+        # so the similarity cannot be cached.
+        return token.similarity(in_case_token.load())
+    similarity = in_case_similarities.get(token.orth)
+    if similarity is None:
+        similarity = token.similarity(in_case_token.load())
+        in_case_similarities[token.orth] = similarity
+    return similarity
 
 
 class CountSpan(AnnoSpan):
+    __slots__ = []
+
     def __init__(self, span, metadata):
         super(CountSpan, self).__init__(
             span.start,
@@ -55,27 +79,19 @@ def is_valid_count(count_string):
 
 class CountAnnotator(Annotator):
     def annotate(self, doc):
-        if 'spacy.tokens' not in doc.tiers:
+        spacy_tokens = doc.require_tiers('spacy.tokens', via=SpacyAnnotator)
+        if len(spacy_tokens) > 0 and not spacy_tokens.spans[0].token.doc.is_parsed:
+            # The singular case detection below uses the dependency parse,
+            # so tokens created with the parser disabled are replaced.
             doc.add_tiers(SpacyAnnotator())
         if 'dates' not in doc.tiers:
             doc.add_tiers(DateAnnotator())
         if 'raw_numbers' not in doc.tiers:
             doc.add_tiers(RawNumberAnnotator())
-        spacy_tokens = doc.tiers['spacy.tokens']
-        spacy_sentences = doc.tiers['spacy.sentences']
-        spacy_nes = doc.tiers['spacy.nes']
+        spacy_tokens, spacy_sentences, spacy_nes = doc.require_tiers(
+            'spacy.tokens', 'spacy.sentences', 'spacy.nes', via=SpacyAnnotator)
         counts = doc.tiers['raw_numbers']
 
-        spacy_lemmas = [span.token.lemma_ for span in spacy_tokens]
-
-        def search_lemmas(lemmas, match_name=None):
-            match_spans = []
-            lemmas = set(lemmas)
-            for span, lemma in zip(spacy_tokens, spacy_lemmas):
-                if lemma in lemmas:
-                    match_spans.append(span)
-            return AnnoTier(match_spans, presorted=True).label_spans(match_name)
-
         counts_tier = AnnoTier(AnnoSpan(count.start, count.end, doc, 'count')
                                for count in counts if is_valid_count(count.text))
         # Remove counts that overlap an age
@@ -106,52 +122,68 @@ class CountAnnotator(Annotator):
             'approximate|about|near|around',
             'ongoing|active',
         ]
+        lemma_groups = {
+            'death': [
+                'death',
+                'die',
+                'kill',
+                'claim',
+                'fatality',
+                'decease',
+                'deceased'
+            ],
+            'hospitalization': [
+                'hospitalization',
+                'hospital',
+                'hospitalize'
+            ],
+            'recovery': ['recovery'],
+            'case': [
+                'case',
+                'infect',
+                'infection',
+                'strike',
+                'stricken'
+            ],
+            'suspected': ['suspect'],
+            'confirmed': ['confirm'],
+            'person': [
+                'man', 'woman',
+                'male', 'female',
+                'adult', 'senior', 'child',
+                'patient',
+                'life',
+                'person'
+            ],
+        }
+        for group in modifier_lemma_groups:
+            lemmas = group.split('|')
+            lemma_groups[lemmas[0]] = lemmas
+        # All the lemma groups are matched in a single pass over the tokens.
+        lemma_matches = spacy_tokens.search_lemmas(lemma_groups)
+
+        def search_lemmas(group_name, match_name):
+            return lemma_matches[group_name].label_spans(match_name)
+
         count_descriptions = AnnoTier(counts_tier)
         person_and_place_nes = spacy_nes.with_label('GPE') + spacy_nes.with_label('PERSON')
         for group in modifier_lemma_groups:
-            lemmas = group.split('|')
-            results = search_lemmas(lemmas, match_name=lemmas[0])
+            group_name = group.split('|')[0]
+            results = search_lemmas(group_name, group_name)
             # prevent components of NEs like the "New" in New York from being
             # treated as count descriptors.
             results = results.without_overlaps(person_and_place_nes)
             count_descriptions += count_descriptions.with_nearby_spans_from(results)
         case_descriptions = AnnoTier(
-            search_lemmas(
-                [
-                    'death',
-                    'die',
-                    'kill',
-                    'claim',
-                    'fatality',
-                    'decease',
-                    'deceased'
-                ], 'death') +
-            search_lemmas(
-                [
-                    'hospitalization',
-                    'hospital',
-                    'hospitalize'
-                ], 'hospitalization') +
-            search_lemmas(['recovery'], 'recovery') +
-            search_lemmas(
-                [
-                    'case',
-                    'infect',
-                    'infection',
-                    'strike',
-                    'stricken'
-                ], 'case'))
+            search_lemmas('death', 'death') +
+            search_lemmas('hospitalization', 'hospitalization') +
+            search_lemmas('recovery', 'recovery') +
+            search_lemmas('case', 'case'))
         case_statuses = (
-            search_lemmas(['suspect'], 'suspected') +
-            search_lemmas(['confirm'], 'confirmed'))
+            search_lemmas('suspected', 'suspected') +
+            search_lemmas('confirmed', 'confirmed'))
         case_descriptions += case_descriptions.with_nearby_spans_from(case_statuses, max_dist=1)
-        person_descriptions = search_lemmas([
-            'man', 'woman',
-            'male', 'female',
-            'adult', 'senior', 'child',
-            'patient',
-            'life',
-            'person'], 'case')
+        person_descriptions = search_lemmas('person', 'case')
         case_descriptions += person_descriptions.with_nearby_spans_from(case_descriptions)
         case_descriptions += person_descriptions
         case_descriptions_with_counts = case_descriptions.with_nearby_spans_from(
@@ -163,7 +195,7 @@ class CountAnnotator(Annotator):
         for cd_span, token_group in case_descriptions.group_spans_by_containing_span(spacy_tokens):
             for t_span in token_group:
                 token = t_span.token
-                if token.lemma_ == 'case' and token.similarity(in_case_token) < 0.5:
+                if token.lemma_ == 'case' and in_case_similarity(token) < 0.5:
                     continue
                 if token.tag_ == 'NN' and any(c.lower_ in determiner_lemmas
                                               for c in token.children):
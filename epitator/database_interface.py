@@ -16,17 +16,37 @@ class DatabaseInterface(object):
             return d
         self.db_connection.row_factory = dict_factory
 
-    def lookup_synonym(self, synonym, entity_type):
+    @property
+    def has_synonym_index(self):
+        return next(self.db_connection.execute('''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'synonyms_fts'
+        '''), None) is not None
+
+    def lookup_synonym(self, synonym, entity_type, mode='substring'):
+        """
+        Return the 20 entities of the given type with the highest weighted
+        synonyms containing the given text, or starting with it if mode is
+        'prefix'. Shorter synonyms are ranked first among synonyms with the
+        same weight. The trigram index built by the importers is used when
+        it exists.
+        """
+        if mode == 'prefix':
+            pattern = synonym + '%'
+        elif mode == 'substring':
+            pattern = '%' + synonym + '%'
+        else:
+            raise ValueError("Unknown lookup mode: " + mode)
+        synonyms_table = 'synonyms_fts' if self.has_synonym_index else 'synonyms'
         cursor = self.db_connection.cursor()
         return cursor.execute('''
         SELECT id, label, synonym, max(weight) AS weight
-        FROM synonyms
-        JOIN entities ON synonyms.entity_id=entities.id
+        FROM ''' + synonyms_table + '''
+        JOIN entities ON entity_id=entities.id
         WHERE synonym LIKE ? AND entities.type=?
         GROUP BY entity_id
         ORDER BY weight DESC, length(synonym) ASC
         LIMIT 20
-        ''', ['%' + synonym + '%', entity_type])
+        ''', [pattern, entity_type])
 
     def get_entity(self, entity_id):
         cursor = self.db_connection.cursor()
@@ -52,6 +52,8 @@ ends_with_timeunit_re = re.compile(r".*(months|days|years)$", re.I)
 
 
 class DateSpan(AnnoSpan):
+    __slots__ = []
+
     def __init__(self, base_span, datetime_range):
         super(DateSpan, self).__init__(
             base_span.start,
@@ -60,10 +62,13 @@ class DateSpan(AnnoSpan):
             metadata={
                 'datetime_range': datetime_range
             })
+
+    @property
+    def datetime_range(self):
         # The date span's datetime range is the time interval represented by
         # the span. The interval ends at the final datetime, and does not
         # include the day, minute or second of the final datetime.
-        self.datetime_range = datetime_range
+        return self.metadata['datetime_range']
 
     def __repr__(self):
         return (
@@ -192,10 +197,10 @@ class DateAnnotator(Annotator):
 
         if 'structured_data' not in doc.tiers:
             doc.add_tiers(StructuredDataAnnotator())
-        if 'spacy.nes' not in doc.tiers:
-            doc.add_tiers(SpacyAnnotator())
+        spacy_tokens, spacy_nes = doc.require_tiers(
+            'spacy.tokens', 'spacy.nes', via=SpacyAnnotator)
         # Create a combine tier of nes and regex dates
-        date_span_tier = doc.tiers['spacy.nes'].with_label('DATE')
+        date_span_tier = spacy_nes.with_label('DATE')
         # Regex for formatted dates
         regex = re.compile(
             r"\b("
@@ -208,8 +213,7 @@ class DateAnnotator(Annotator):
             # yyyy-mm-dd
             r"(\d{1,4} ?[\/\-] ?\d{1,2} ?[\/\-] ?\d{1,2})"
             r")\b", re.I)
-        match_tier = doc.create_regex_tier(regex)
-        date_span_tier += match_tier
+        date_span_tier += doc.create_regex_tiers([('formatted_date', regex)])['formatted_date']
         # Add year components individually incase the full spans are thrown out.
         # Sometimes extra text is added to dates that makes them invalid,
         # this allows some of the date to be recovered.
@@ -237,14 +241,14 @@ class DateAnnotator(Annotator):
                     grouped_date_spans.append(date_group)
         # Find date ranges by looking for joiner words between dates.
         date_range_joiners = [
-            t_span for t_span in doc.tiers['spacy.tokens']
+            t_span for t_span in spacy_tokens
             if re.match(r"(" + DATE_RANGE_JOINERS + r"|\-)$", t_span.text, re.I)]
         date_range_tier = date_span_tier.label_spans('start')\
             .with_following_spans_from(date_range_joiners, max_dist=3)\
             .with_following_spans_from(date_span_tier.label_spans('end'), max_dist=3)\
             .label_spans('date_range')
         since_tokens = AnnoTier([
-            t_span for t_span in doc.tiers['spacy.tokens']
+            t_span for t_span in spacy_tokens
             if 'since' == t_span.token.lemma_], presorted=True).label_spans('since_token')
         since_date_tier = (
             since_tokens.with_following_spans_from(date_span_tier, allow_overlap=True) +
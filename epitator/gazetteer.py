@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+A read-only geonames gazetteer stored in memory mapped numpy arrays.
+
+The gazetteer is a directory of .npy files created from the geonames
+tables in the EpiTator database by
+`python -m epitator.importers.export_gazetteer PATH`. Opening it maps the
+files into memory without reading them, so it is ready to use immediately,
+and processes using the same gazetteer share one copy of it in the page
+cache.
+
+The arrays are:
+
+- names: The sorted string table of lemmatized alternate names.
+- name_pair_offsets: For each name, the offset of its first
+  (geoname, names used) pair. The pairs of name i end where the pairs
+  of name i + 1 begin.
+- pair_geonames: The geoname row of each pair.
+- pair_names_used: A string table of the ";" separated alternate names
+  each pair was created from.
+- The geoname columns in GEONAME_COLUMNS, with geonames sorted by
+  geonameid.
+- admin_keys, admin_names: The tab separated admin codes of each admin
+  division in sorted order and their names.
+
+A string table is stored as two arrays, NAME_offsets and NAME_data,
+where string i is the utf8 encoded data between offsets i and i + 1.
+"""
+from __future__ import absolute_import
+import json
+import os
+import numpy as np
+import six
+
+GAZETTEER_VERSION = 1
+
+# The geoname columns with the numpy types used to store them. Text columns
+# are stored as fixed width byte strings or, when they vary widely in
+# length, string tables.
+GEONAME_COLUMNS = [
+    ('geonameid', 'S'),
+    ('name', 'string_table'),
+    ('asciiname', 'string_table'),
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('feature_class', 'S'),
+    ('feature_code', 'S'),
+    ('country_code', 'S'),
+    ('cc2', 'S'),
+    ('admin1_code', 'S'),
+    ('admin2_code', 'S'),
+    ('admin3_code', 'S'),
+    ('admin4_code', 'S'),
+    ('population', 'i8'),
+    ('name_count', 'i4'),
+]
+
+
+class StringTable(object):
+    """
+    A sequence of strings stored as utf8 data and offset arrays.
+    """
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_bytes(self, idx):
+        return self.data[self.offsets[idx]:self.offsets[idx + 1]].tobytes()
+
+    def __getitem__(self, idx):
+        return self.get_bytes(idx).decode('utf8')
+
+    def find(self, value):
+        """
+        Return the index of the value in the table, which must be sorted, or
+        None if it isn't present.
+        """
+        value = value.encode('utf8')
+        low = 0
+        high = len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if self.get_bytes(mid) < value:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self) and self.get_bytes(low) == value:
+            return low
+        return None
+
+
+class PackedGazetteer(object):
+    """
+    Looks up geonames in a packed gazetteer directory. The lookup methods
+    return the same values as the GeonameAnnotator's database queries.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'gazetteer.json')) as f:
+            metadata = json.load(f)
+        if metadata.get('version') != GAZETTEER_VERSION:
+            raise Exception("The gazetteer at " + path +
+                            " was created by an incompatible version of EpiTator.\n"
+                            "You will need to export it again.")
+        self.names = self.load_string_table('names')
+        self.name_pair_offsets = self.load_array('name_pair_offsets')
+        self.pair_geonames = self.load_array('pair_geonames')
+        self.pair_names_used = self.load_string_table('pair_names_used')
+        self.columns = {}
+        for column, column_type in GEONAME_COLUMNS:
+            if column_type == 'string_table':
+                self.columns[column] = self.load_string_table(column)
+            else:
+                self.columns[column] = self.load_array(column)
+        self.admin_keys = self.load_string_table('admin_keys')
+        self.admin_names = self.load_string_table('admin_names')
+
+    def load_array(self, name):
+        return np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+
+    def load_string_table(self, name):
+        return StringTable(self.load_array(name + '_offsets'), self.load_array(name + '_data'))
+
+    def get_column_value(self, column, row):
+        value = self.columns[column][row]
+        if isinstance(value, bytes):
+            return value.decode('utf8')
+        elif isinstance(value, six.text_type):
+            return value
+        elif isinstance(value, np.floating):
+            return float(value)
+        return int(value)
+
+    def get_geonames_for_names(self, names):
+        """
+        Return dicts for the geonames with lemmatized alternate names in the
+        given list, one per geoname and matching name.
+        """
+        results = []
+        for name in names:
+            name_idx = self.names.find(name)
+            if name_idx is None:
+                continue
+            for pair_idx in range(self.name_pair_offsets[name_idx], self.name_pair_offsets[name_idx + 1]):
+                row = self.pair_geonames[pair_idx]
+                result = {
+                    column: self.get_column_value(column, row)
+                    for column, column_type in GEONAME_COLUMNS}
+                result['names_used'] = self.pair_names_used[pair_idx]
+                result['alternatename_lemmatized'] = name
+                results.append(result)
+        return results
+
+    def get_admin_name(self, codes):
+        idx = self.admin_keys.find('\t'.join(codes))
+        if idx is None:
+            return None
+        return self.admin_names[idx]
+
+    def get_admin_names(self, admin_codes):
+        """
+        Return a list of the tuples of country and admin division names for
+        each (country_code, admin1_code, admin2_code, admin3_code) tuple.
+        The adminnames table's primary key is the admin codes, so like the
+        SQL query, there is at most one tuple for each codes tuple.
+        """
+        results = []
+        for country_code, admin1_code, admin2_code, admin3_code in admin_codes:
+            names = (
+                self.get_admin_name((country_code, '00', '', '')),
+                self.get_admin_name((country_code, admin1_code, '', '')),
+                self.get_admin_name((country_code, admin1_code, admin2_code, '')),
+                self.get_admin_name((country_code, admin1_code, admin2_code, admin3_code)),)
+            results.append([] if None in names else [names])
+        return results
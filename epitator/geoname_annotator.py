@@ -3,7 +3,6 @@
 from __future__ import absolute_import
 import math
 import re
-import sqlite3
 from collections import defaultdict
 
 from .annotator import Annotator, AnnoTier, AnnoSpan
@@ -12,10 +11,12 @@ from .ne_annotator import NEAnnotator
 from geopy.distance import great_circle
 from .maximum_weight_interval_set import Interval, find_maximum_weight_interval_set
 
-from .get_database_connection import get_database_connection
+from .get_database_connection import get_database_connection, run_query
+from .gazetteer import PackedGazetteer
 from . import geoname_classifier
 
 import logging
+import six
 from six.moves import zip
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s %(message)s')
 logger = logging.getLogger(__name__)
@@ -89,17 +90,103 @@ def location_contains(loc_outer, loc_inner):
     return outer_feature_level
 
 
+def has_geoname_lookup_table(connection):
+    return next(connection.execute("""
+    SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'geoname_lookup'
+    """), None) is not None
+
+
+def query_geoname_lookup_table(connection, names):
+    """
+    Look up the names in the geoname_lookup table created by the geonames
+    import. The rows are read from its primary key index with no joins or
+    grouping.
+    """
+    cursor = connection.cursor()
+    return list(cursor.execute('''
+    SELECT * FROM geoname_lookup
+    WHERE alternatename_lemmatized IN
+    (''' + ','.join('?' for x in names) + ')', names))
+
+
+def query_geoname_tables(connection, names):
+    """
+    Look up the names by joining the geonames and alternatenames tables, for
+    databases without a geoname_lookup table.
+    """
+    cursor = connection.cursor()
+    return list(cursor.execute('''
+    SELECT
+        geonames.*,
+        count AS name_count,
+        alternatename_lemmatized,
+        group_concat(alternatename, ";") AS names_used
+    FROM geonames
+    JOIN alternatename_counts USING ( geonameid )
+    JOIN alternatenames USING ( geonameid )
+    WHERE alternatename_lemmatized IN
+    (''' + ','.join('?' for x in names) + ''')
+    GROUP BY geonameid, alternatename_lemmatized''', names))
+
+
+def query_geonames_for_names(connection, names):
+    """
+    Return the rows for the geonames with lemmatized alternate names in the
+    given list, one per geoname and matching name.
+    """
+    if has_geoname_lookup_table(connection):
+        return query_geoname_lookup_table(connection, names)
+    return query_geoname_tables(connection, names)
+
+
+def query_admin_names(connection, admin_codes):
+    """
+    Return a list of the rows of country and admin division names for each
+    (country_code, admin1_code, admin2_code, admin3_code) tuple.
+    """
+    cursor = connection.cursor()
+    return [list(cursor.execute('''
+        SELECT
+            cc.name,
+            a1.name,
+            a2.name,
+            a3.name
+        FROM adminnames a3
+        JOIN adminnames a2 ON (
+            a2.country_code = a3.country_code AND
+            a2.admin1_code = a3.admin1_code AND
+            a2.admin2_code = a3.admin2_code AND
+            a2.admin3_code = "" )
+        JOIN adminnames a1 ON (
+            a1.country_code = a3.country_code AND
+            a1.admin1_code = a3.admin1_code AND
+            a1.admin2_code = "" AND
+            a1.admin3_code = "" )
+        JOIN adminnames cc ON (
+            cc.country_code = a3.country_code AND
+            cc.admin1_code = "00" AND
+            cc.admin2_code = "" AND
+            cc.admin3_code = "" )
+        WHERE (a3.country_code = ? AND a3.admin1_code = ? AND a3.admin2_code = ? AND a3.admin3_code = ?)
+        ''', codes)) for codes in admin_codes]
+
+
 class GeoSpan(AnnoSpan):
+    __slots__ = []
+
     def __init__(self, start, end, doc, geoname):
         super(GeoSpan, self).__init__(
             start,
             end,
             doc,
+            label=geoname.name,
             metadata={
                 'geoname': geoname
             })
-        self.geoname = geoname
-        self.label = geoname.name
+
+    @property
+    def geoname(self):
+        return self.metadata['geoname']
 
     def to_dict(self):
         result = super(GeoSpan, self).to_dict()
@@ -330,13 +417,78 @@ class GeonameFeatures(object):
 
 
 class GeonameAnnotator(Annotator):
-    def __init__(self, custom_classifier=None):
-        self.connection = get_database_connection()
-        self.connection.row_factory = sqlite3.Row
+    # Geonames are scored using the other locations mentioned in the document.
+    document_level = True
+    # The maximum number of names to cache geoname query results for.
+    CANDIDATE_CACHE_SIZE = 100000
+
+    def __init__(self, custom_classifier=None, gazetteer=None):
+        """
+        gazetteer may be a PackedGazetteer or the path to one. When it is
+        given, geonames are looked up in it rather than the database.
+        """
+        if isinstance(gazetteer, six.string_types):
+            gazetteer = PackedGazetteer(gazetteer)
+        self.gazetteer = gazetteer
+        if gazetteer is None:
+            # Fail early if the database is missing.
+            get_database_connection(read_only=True)
         if custom_classifier:
             self.geoname_classifier = custom_classifier
         else:
             self.geoname_classifier = geoname_classifier
+        # Geoname rows matching each lemmatized name queried so far.
+        # Annotating an edited document only queries the names it didn't
+        # already contain.
+        self.candidate_cache = {}
+
+    @property
+    def connection(self):
+        # Each thread uses its own read-only connection, so annotators can
+        # be shared by threads.
+        return get_database_connection(read_only=True)
+
+    def get_geonames_for_names(self, names):
+        """
+        Return dicts for the geonames with alternate names matching any of
+        the given lemmatized names, ordered by geonameid. The names_used
+        property lists the names that matched.
+        """
+        # The cache may be used by several threads, so the lists of
+        # candidates are only added to it once they are complete.
+        candidate_cache = self.candidate_cache
+        candidates = {}
+        uncached_names = []
+        for name in names:
+            cached_candidates = candidate_cache.get(name)
+            if cached_candidates is None:
+                uncached_names.append(name)
+            else:
+                candidates[name] = cached_candidates
+        if len(uncached_names) > 0:
+            queried_candidates = {name: [] for name in uncached_names}
+            if self.gazetteer is not None:
+                results = self.gazetteer.get_geonames_for_names(uncached_names)
+            else:
+                results = run_query(self.connection, query_geonames_for_names, uncached_names)
+            for result in results:
+                queried_candidates[result['alternatename_lemmatized']].append(
+                    {key: result[key] for key in result.keys()
+                     if key != 'alternatename_lemmatized'})
+            candidates.update(queried_candidates)
+            if len(candidate_cache) + len(queried_candidates) > self.CANDIDATE_CACHE_SIZE:
+                self.candidate_cache = queried_candidates
+            else:
+                candidate_cache.update(queried_candidates)
+        geonames_by_id = {}
+        for name in sorted(names):
+            for geoname in candidates[name]:
+                if geoname['geonameid'] in geonames_by_id:
+                    combined_geoname = geonames_by_id[geoname['geonameid']]
+                    combined_geoname['names_used'] += ';' + geoname['names_used']
+                else:
+                    geonames_by_id[geoname['geonameid']] = dict(geoname)
+        return [geonames_by_id[geonameid] for geonameid in sorted(geonames_by_id.keys())]
 
     def get_candidate_geonames(self, doc):
         """
@@ -366,18 +518,7 @@ class GeonameAnnotator(Annotator):
                                if is_possible_geoname(span.text)
                                ]))
         logger.info('%s ngrams extracted' % len(all_ngrams))
-        cursor = self.connection.cursor()
-        geoname_results = list(cursor.execute('''
-        SELECT
-            geonames.*,
-            count AS name_count,
-            group_concat(alternatename, ";") AS names_used
-        FROM geonames
-        JOIN alternatename_counts USING ( geonameid )
-        JOIN alternatenames USING ( geonameid )
-        WHERE alternatename_lemmatized IN
-        (''' + ','.join('?' for x in all_ngrams) + ''')
-        GROUP BY geonameid''', all_ngrams))
+        geoname_results = self.get_geonames_for_names(all_ngrams)
         logger.info('%s geonames fetched' % len(geoname_results))
         geoname_results = [GeonameRow(g) for g in geoname_results]
         # Associate spans with the geonames.
@@ -568,36 +709,17 @@ class GeonameAnnotator(Annotator):
         culled_geonames = [geoname
                            for geoname in candidate_geonames
                            if geoname.score > self.geoname_classifier.GEONAME_SCORE_THRESHOLD]
-        cursor = self.connection.cursor()
-        for geoname in culled_geonames:
-            geoname_results = list(cursor.execute('''
-                SELECT
-                    cc.name,
-                    a1.name,
-                    a2.name,
-                    a3.name
-                FROM adminnames a3
-                JOIN adminnames a2 ON (
-                    a2.country_code = a3.country_code AND
-                    a2.admin1_code = a3.admin1_code AND
-                    a2.admin2_code = a3.admin2_code AND
-                    a2.admin3_code = "" )
-                JOIN adminnames a1 ON (
-                    a1.country_code = a3.country_code AND
-                    a1.admin1_code = a3.admin1_code AND
-                    a1.admin2_code = "" AND
-                    a1.admin3_code = "" )
-                JOIN adminnames cc ON (
-                    cc.country_code = a3.country_code AND
-                    cc.admin1_code = "00" AND
-                    cc.admin2_code = "" AND
-                    cc.admin3_code = "" )
-                WHERE (a3.country_code = ? AND a3.admin1_code = ? AND a3.admin2_code = ? AND a3.admin3_code = ?)
-                ''', (
-                geoname.country_code or "",
-                geoname.admin1_code or "",
-                geoname.admin2_code or "",
-                geoname.admin3_code or "",)))
+        admin_codes = [
+            (geoname.country_code or "",
+             geoname.admin1_code or "",
+             geoname.admin2_code or "",
+             geoname.admin3_code or "",)
+            for geoname in culled_geonames]
+        if self.gazetteer is not None:
+            admin_names = self.gazetteer.get_admin_names(admin_codes)
+        else:
+            admin_names = run_query(self.connection, query_admin_names, admin_codes)
+        for geoname, geoname_results in zip(culled_geonames, admin_names):
             for result in geoname_results:
                 prev_val = None
                 for idx, attr in enumerate(['country_name', 'admin1_name', 'admin2_name', 'admin3_name']):
@@ -2,6 +2,8 @@ from __future__ import absolute_import
 from __future__ import print_function
 import os
 import sqlite3
+import threading
+from six.moves.urllib.request import pathname2url
 
 
 if os.environ.get('ANNOTATOR_DB_PATH'):
@@ -9,8 +11,98 @@ if os.environ.get('ANNOTATOR_DB_PATH'):
 else:
     ANNOTATOR_DB_PATH = os.path.expanduser("~") + '/.epitator.sqlitedb'
 
+# Setting ANNOTATOR_DB_IMMUTABLE tells sqlite that the database file won't
+# change while it is open, so read-only connections don't need to lock it.
+# Only set it when nothing writes to the database while EpiTator is running.
+ANNOTATOR_DB_IMMUTABLE = os.environ.get('ANNOTATOR_DB_IMMUTABLE', '').lower() not in ('', '0', 'false')
 
-def get_database_connection(create_database=False):
+# Pragmas applied to read-only connections. Memory mapped pages are shared
+# by all the connections to the database in the process.
+READ_ONLY_PRAGMAS = [
+    ('query_only', 'ON'),
+    ('mmap_size', 2**30),
+    ('cache_size', -2**14),
+    ('temp_store', 'MEMORY'),
+]
+
+# The executor that the current thread sends the queries made with run_query
+# to. The async annotation API sets it so the threads doing CPU work don't
+# block on the database.
+_query_context = threading.local()
+
+# The current thread's read-only connections keyed by database path.
+_thread_connections = threading.local()
+
+# The database paths with versions that have been checked.
+_checked_database_paths = set()
+
+
+def check_database_version(connection, path):
+    """
+    Raise an exception if the database's version isn't compatible with this
+    version of EpiTator. Each database is only checked once per process.
+    """
+    if path in _checked_database_paths:
+        return
+    try:
+        db_version = next(connection.execute("""
+        SELECT value AS version FROM metadata WHERE property = 'dbversion'
+        """), None)
+    except sqlite3.OperationalError:
+        db_version = None
+    if not db_version or db_version[0] != "0.0.0":
+        raise Exception("The database at " + path +
+                        " has a version that is not compatible by this version of EpiTator.\n"
+                        "You will need to rerun the data import scripts.")
+    _checked_database_paths.add(path)
+
+
+def missing_database_exception():
+    return Exception("There is no EpiTator database at: " + ANNOTATOR_DB_PATH +
+                     "\nRun `python -m epitator.importers.import_all` to create a new database"
+                     "\nor set ANNOTATOR_DB_PATH to use a database at a different location.")
+
+
+def open_read_only_connection(path):
+    uri = 'file:' + pathname2url(os.path.abspath(path)) + '?mode=ro'
+    if ANNOTATOR_DB_IMMUTABLE:
+        uri += '&immutable=1'
+    try:
+        connection = sqlite3.connect(uri, uri=True)
+    except TypeError:
+        # Python 2 doesn't support URI filenames. The query_only pragma
+        # still prevents writes.
+        connection = sqlite3.connect(path)
+    for pragma, value in READ_ONLY_PRAGMAS:
+        connection.execute("PRAGMA %s = %s" % (pragma, value))
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def get_database_connection(create_database=False, read_only=False):
+    """
+    Return a connection to the EpiTator database.
+
+    When read_only is true, the connection is read-only, tuned for lookups
+    and returns sqlite3.Row objects. Each thread has one read-only
+    connection that is shared by everything running in that thread, so it
+    shouldn't be closed or reconfigured.
+
+    Otherwise a new read-write connection is returned. The database is
+    created if it doesn't exist and create_database is true.
+    """
+    if read_only:
+        connections = getattr(_thread_connections, 'connections', None)
+        if connections is None:
+            connections = _thread_connections.connections = {}
+        connection = connections.get(ANNOTATOR_DB_PATH)
+        if connection is None:
+            if not os.path.exists(ANNOTATOR_DB_PATH):
+                raise missing_database_exception()
+            connection = open_read_only_connection(ANNOTATOR_DB_PATH)
+            check_database_version(connection, ANNOTATOR_DB_PATH)
+            connections[ANNOTATOR_DB_PATH] = connection
+        return connection
     databse_exists = os.path.exists(ANNOTATOR_DB_PATH)
     if databse_exists or create_database:
         if not databse_exists:
@@ -39,15 +131,29 @@ def get_database_connection(create_database=False):
             ''')
             cur.execute("INSERT INTO metadata VALUES ('dbversion', '0.0.0')")
             connection.commit()
-        db_version = next(cur.execute("""
-        SELECT value AS version FROM metadata WHERE property = 'dbversion'
-        """), None)
-        if not db_version or db_version[0] != "0.0.0":
-            raise Exception("The database at " + ANNOTATOR_DB_PATH +
-                            " has a version that is not compatible by this version of EpiTator.\n"
-                            "You will need to rerun the data import scripts.")
+        check_database_version(connection, ANNOTATOR_DB_PATH)
         return connection
     else:
-        raise Exception("There is no EpiTator database at: " + ANNOTATOR_DB_PATH +
-                        "\nRun `python -m epitator.importers.import_all` to create a new database"
-                        "\nor set ANNOTATOR_DB_PATH to use a database at a different location.")
+        raise missing_database_exception()
+
+
+def set_query_executor(executor):
+    """
+    Send the queries the current thread makes with run_query to the given
+    executor, or run them on the caller's connection if it is None.
+    The executor's run method is called with the query function and its
+    arguments and must call it with a database connection.
+    """
+    _query_context.executor = executor
+
+
+def run_query(connection, query_function, *args):
+    """
+    Call query_function with a database connection and the given arguments.
+    The query function should return its results in a list rather than a
+    cursor since it may be run by another thread.
+    """
+    executor = getattr(_query_context, 'executor', None)
+    if executor is None:
+        return query_function(connection, *args)
+    return executor.run(query_function, *args)
@@ -0,0 +1,175 @@
+"""
+Script for exporting the geonames tables in the EpiTator database to a
+packed gazetteer directory that the GeonameAnnotator can memory map.
+See epitator.gazetteer for a description of the format.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import itertools
+import json
+import os
+from array import array
+import numpy as np
+from ..get_database_connection import get_database_connection
+from ..gazetteer import GAZETTEER_VERSION, GEONAME_COLUMNS
+
+
+class StringTableWriter(object):
+    def __init__(self):
+        self.offsets = array('q', [0])
+        self.data = bytearray()
+
+    def append(self, value):
+        self.data.extend(value.encode('utf8'))
+        self.offsets.append(len(self.data))
+
+    def save(self, path, name):
+        np.save(os.path.join(path, name + '_offsets.npy'),
+                np.frombuffer(self.offsets.tobytes(), dtype='i8'))
+        np.save(os.path.join(path, name + '_data.npy'),
+                np.frombuffer(bytes(self.data), dtype='u1'))
+
+
+def find_geoname_rows(geonameids, pairs, batch_size=100000):
+    """
+    Yield the (name, geonameid, names_used) pairs with the row of their
+    geoname in the sorted geonameids array, in batches so each batch can
+    be looked up with one binary search. Pairs with geonames that aren't in
+    the array are yielded with a row of None.
+    """
+    batch = []
+    for pair in itertools.chain(pairs, [None]):
+        if pair is not None:
+            batch.append(pair)
+            if len(batch) < batch_size:
+                continue
+        if len(batch) == 0:
+            break
+        batch_geonameids = np.array([pair[1].encode('utf8') for pair in batch], dtype='S')
+        rows = np.searchsorted(geonameids, batch_geonameids)
+        for pair, pair_geonameid, row in zip(batch, batch_geonameids, rows):
+            if row < len(geonameids) and geonameids[row] == pair_geonameid:
+                yield pair, int(row)
+            else:
+                yield pair, None
+        batch = []
+
+
+def export_gazetteer(path):
+    connection = get_database_connection(read_only=True)
+    cursor = connection.cursor()
+    if not os.path.exists(path):
+        os.makedirs(path)
+    print("Exporting geonames...")
+    geonames_query = '''
+    FROM geonames
+    JOIN alternatename_counts USING ( geonameid )'''
+    # The columns are preallocated, so the byte strings are given the width
+    # of the longest value in their column.
+    fixed_width_columns = [
+        column for column, column_type in GEONAME_COLUMNS if column_type == 'S']
+    sizes = cursor.execute('SELECT count(*), ' + ', '.join(
+        'max(length(CAST(' + column + ' AS BLOB)))' for column in fixed_width_columns
+    ) + geonames_query).fetchone()
+    row_count = sizes[0]
+    widths = dict(zip(fixed_width_columns, sizes[1:]))
+    columns = {}
+    for column, column_type in GEONAME_COLUMNS:
+        if column_type == 'string_table':
+            columns[column] = StringTableWriter()
+        elif column_type == 'S':
+            columns[column] = np.zeros(row_count, dtype='S%d' % max(1, widths[column] or 0))
+        else:
+            columns[column] = np.zeros(row_count, dtype=column_type)
+    # The geonames are sorted so geoname rows can be found by id with a
+    # binary search.
+    cursor.execute('SELECT geonames.*, count AS name_count' + geonames_query + '''
+    ORDER BY geonameid''')
+    row_idx = 0
+    while True:
+        rows = cursor.fetchmany(100000)
+        if len(rows) == 0:
+            break
+        for column, column_type in GEONAME_COLUMNS:
+            if column_type == 'string_table':
+                for row in rows:
+                    columns[column].append(row[column] or '')
+            elif column_type == 'S':
+                columns[column][row_idx:row_idx + len(rows)] = [
+                    (row[column] or '').encode('utf8') for row in rows]
+            else:
+                columns[column][row_idx:row_idx + len(rows)] = [row[column] for row in rows]
+        row_idx += len(rows)
+    for column, column_type in GEONAME_COLUMNS:
+        if column_type == 'string_table':
+            columns[column].save(path, column)
+        else:
+            np.save(os.path.join(path, column + '.npy'), columns[column])
+    geonameids = np.load(os.path.join(path, 'geonameid.npy'), mmap_mode='r')
+    del columns
+    print("Exporting alternate names...")
+    names = StringTableWriter()
+    name_pair_offsets = array('q', [0])
+    pair_geonames = array('i')
+    pair_names_used = StringTableWriter()
+    previous_name = None
+    missing_geonameids = set()
+    for (name, geonameid, names_used), row in find_geoname_rows(geonameids, cursor.execute('''
+    SELECT alternatename_lemmatized, geonameid, group_concat(alternatename, ";")
+    FROM alternatenames
+    JOIN alternatename_counts USING ( geonameid )
+    GROUP BY alternatename_lemmatized, geonameid
+    ORDER BY alternatename_lemmatized''')):
+        if row is None:
+            # The alternate names of geonames missing from the geonames
+            # table, which can be left by an outdated alternatename_counts
+            # table, are skipped.
+            missing_geonameids.add(geonameid)
+            continue
+        if name != previous_name:
+            names.append(name)
+            previous_name = name
+            name_pair_offsets.append(name_pair_offsets[-1])
+        name_pair_offsets[-1] += 1
+        pair_geonames.append(row)
+        pair_names_used.append(names_used)
+    if missing_geonameids:
+        print("Skipped the alternate names of", len(missing_geonameids),
+              "geonames that are not in the geonames table.")
+    names.save(path, 'names')
+    np.save(os.path.join(path, 'name_pair_offsets.npy'),
+            np.frombuffer(name_pair_offsets.tobytes(), dtype='i8'))
+    pair_names_used.save(path, 'pair_names_used')
+    np.save(os.path.join(path, 'pair_geonames.npy'),
+            np.frombuffer(pair_geonames.tobytes(), dtype='i4'))
+    del pair_geonames
+    print("Exporting admin names...")
+    # The adminnames table's primary key is the admin codes, so each key
+    # has a single name, like the rows the SQL admin name query joins.
+    admin_keys = StringTableWriter()
+    admin_names = StringTableWriter()
+    admin_rows = []
+    for name, country_code, admin1_code, admin2_code, admin3_code in cursor.execute('''
+    SELECT name, country_code, admin1_code, admin2_code, admin3_code
+    FROM adminnames'''):
+        key = '\t'.join(code or '' for code in (country_code, admin1_code, admin2_code, admin3_code))
+        admin_rows.append((key.encode('utf8'), name))
+    # Keys are sorted by their utf8 encoding, which is the order they are
+    # compared in when searching the string table.
+    admin_rows.sort()
+    for key, name in admin_rows:
+        admin_keys.append(key.decode('utf8'))
+        admin_names.append(name)
+    admin_keys.save(path, 'admin_keys')
+    admin_names.save(path, 'admin_names')
+    with open(os.path.join(path, 'gazetteer.json'), 'w') as f:
+        json.dump({'version': GAZETTEER_VERSION}, f)
+    print("Gazetteer exported to:", path)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="The directory to write the gazetteer to.")
+    args = parser.parse_args()
+    export_gazetteer(args.path)
@@ -5,16 +5,197 @@ annotator.
 """
 from __future__ import absolute_import
 from __future__ import print_function
-import rdflib
+import os
 import re
+import shutil
+import tempfile
+from collections import defaultdict, deque
+from xml.etree import ElementTree
+from six.moves.urllib import request
 from ..get_database_connection import get_database_connection
-from ..utils import batched
+from .synonym_index import rebuild_synonym_index
 
 
 DISEASE_ONTOLOGY_URL = "http://purl.obolibrary.org/obo/doid.owl"
+OBO_URI_PREFIX = "http://purl.obolibrary.org/obo/"
+# Only diseases by infectious agent are imported.
+ROOT_URI = OBO_URI_PREFIX + "DOID_0050117"
 
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+RDFS = "{http://www.w3.org/2000/01/rdf-schema#}"
+OWL = "{http://www.w3.org/2002/07/owl#}"
+OBO_IN_OWL = "{http://www.geneontology.org/formats/oboInOwl#}"
 
-def import_disease_ontology(drop_previous=False):
+# The weights of each type of synonym. Synonyms of other types are ignored.
+SYNONYM_TYPE_WEIGHTS = {
+    'label': 3,
+    'hasExactSynonym': 2,
+    'hasNarrowSynonym': 1,
+    'hasRelatedSynonym': 0,
+}
+
+OBO_SYNONYM_TYPES = {
+    'EXACT': 'hasExactSynonym',
+    'NARROW': 'hasNarrowSynonym',
+    'RELATED': 'hasRelatedSynonym',
+}
+
+
+class DiseaseOntologyTerms(object):
+    """
+    The parts of the disease ontology used by the import: the labels,
+    synonyms and superclasses of each term.
+    """
+    def __init__(self):
+        self.version = None
+        self.labels = defaultdict(list)
+        # (synonym type, synonym) pairs, including labels
+        self.synonyms = defaultdict(list)
+        self.children = defaultdict(set)
+
+    def add_synonym(self, uri, synonym_type, synonym):
+        if synonym_type == 'label':
+            self.labels[uri].append(synonym)
+        self.synonyms[uri].append((synonym_type, synonym))
+
+    def add_parent(self, uri, parent_uri):
+        self.children[parent_uri].add(uri)
+
+    def descendants(self, uri):
+        """
+        Return the set containing the term and every term that is a subclass
+        of it directly or indirectly.
+        """
+        result = set([uri])
+        queue = deque([uri])
+        while queue:
+            for child in self.children[queue.popleft()]:
+                if child not in result:
+                    result.add(child)
+                    queue.append(child)
+        return result
+
+
+def parse_owl(f):
+    """
+    Read the terms from the RDF/XML serialization of the ontology
+    incrementally.
+    """
+    terms = DiseaseOntologyTerms()
+    depth = 0
+    root = None
+    for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        # The element describes a resource at the top level of the document.
+        uri = element.get(RDF + 'about')
+        if element.tag == OWL + 'Ontology':
+            for child in element.iter(OWL + 'versionIRI'):
+                terms.version = child.get(RDF + 'resource')
+        elif uri:
+            for child in element:
+                if child.tag == RDFS + 'subClassOf':
+                    parent_uri = child.get(RDF + 'resource')
+                    if parent_uri:
+                        terms.add_parent(uri, parent_uri)
+                elif child.tag == RDFS + 'label':
+                    terms.add_synonym(uri, 'label', child.text or '')
+                elif child.tag.startswith(OBO_IN_OWL):
+                    synonym_type = child.tag[len(OBO_IN_OWL):]
+                    if synonym_type in SYNONYM_TYPE_WEIGHTS:
+                        terms.add_synonym(uri, synonym_type, child.text or '')
+        root.clear()
+    return terms
+
+
+def parse_obo(f):
+    """
+    Read the terms from the OBO serialization of the ontology line by line.
+    """
+    terms = DiseaseOntologyTerms()
+    uri = None
+    in_header = True
+    for line in f:
+        line = line.decode('utf8').strip()
+        if line.startswith('['):
+            in_header = False
+            uri = None
+            is_term = line == '[Term]'
+            continue
+        tag, _, value = line.partition(': ')
+        # Remove trailing comments.
+        value = re.sub(r"\s+!\s.*$", "", value)
+        if in_header:
+            if tag == 'data-version':
+                terms.version = OBO_URI_PREFIX + value
+        elif not is_term:
+            continue
+        elif tag == 'id':
+            uri = OBO_URI_PREFIX + value.replace(':', '_')
+        elif tag == 'name':
+            terms.add_synonym(uri, 'label', value)
+        elif tag == 'is_a':
+            terms.add_parent(uri, OBO_URI_PREFIX + value.split()[0].replace(':', '_'))
+        elif tag == 'synonym':
+            match = re.match(r'"((?:[^"\\]|\\.)*)"\s+(\w+)', value)
+            if match and match.group(2) in OBO_SYNONYM_TYPES:
+                synonym = re.sub(r"\\(.)", r"\1", match.group(1))
+                terms.add_synonym(uri, OBO_SYNONYM_TYPES[match.group(2)], synonym)
+    return terms
+
+
+def read_disease_ontology(path):
+    """
+    Parse the OWL or OBO file at the given path.
+    """
+    with open(path, 'rb') as f:
+        is_xml = f.read(1024).lstrip().startswith(b'<')
+    with open(path, 'rb') as f:
+        if is_xml:
+            return parse_owl(f)
+        return parse_obo(f)
+
+
+def get_synonym_tuples(uri, synonym_type, syn_string):
+    """
+    Return the (synonym, entity_id, weight) tuples to insert for a synonym of
+    the given entity.
+    """
+    # The rdflib based import was meant to boost the weight of diseases with
+    # no children, but it compared the rdflib child count literal to 0,
+    # which is never equal, so no boost was applied. The weights are kept
+    # the same so resolutions don't change.
+    weight = SYNONYM_TYPE_WEIGHTS[synonym_type]
+    # Remove text that starts with a bracket
+    if re.match(re.compile(r"^(\[|\()", re.I), syn_string):
+        return []
+    syn_string = re.sub(r"\s*\(.*?\)\s*", " ", syn_string)
+    syn_string = re.sub(r"\s*\[.*?\]\s*", " ", syn_string)
+    syn_string = syn_string.strip()
+    if re.match(re.compile(r"^(or|and)\b", re.I), syn_string):
+        return []
+    if len(syn_string) == 0:
+        return []
+    elif len(syn_string) > 6:
+        return [(syn_string.lower(), uri, weight), (syn_string, uri, weight)]
+    else:
+        # Short syn_strings are likely to be acronyms so
+        # capitalization is preserved.
+        return [(syn_string, uri, weight)]
+
+
+def import_disease_ontology(drop_previous=False, ontology_path=None):
+    """
+    Import the diseases by infectious agent from the disease ontology. The
+    OWL file is downloaded unless ontology_path is the path to a local copy
+    of the ontology in OWL (RDF/XML) or OBO format.
+    """
     connection = get_database_connection(create_database=True)
     cur = connection.cursor()
     if drop_previous:
@@ -31,6 +212,19 @@ def import_disease_ontology(drop_previous=False):
     if current_version:
         print("The disease ontology has already been imported. Run this again with --drop-previous to re-import it.")
         return
+    download_path = None
+    if not ontology_path:
+        print("Downloading disease ontology from: " + DISEASE_ONTOLOGY_URL)
+        download_file, download_path = tempfile.mkstemp(suffix='.owl')
+        with os.fdopen(download_file, 'wb') as f:
+            shutil.copyfileobj(request.urlopen(DISEASE_ONTOLOGY_URL), f, 2**20)
+        ontology_path = download_path
+    try:
+        print("Loading disease ontology...")
+        terms = read_disease_ontology(ontology_path)
+    finally:
+        if download_path:
+            os.remove(download_path)
     # synonyms_init is a temporary tables that is aggregated to generate the
     # final synonyms table.
     cur.execute("DROP TABLE IF EXISTS synonyms_init")
@@ -38,95 +232,24 @@ def import_disease_ontology(drop_previous=False):
     CREATE TABLE synonyms_init (
         synonym TEXT, entity_id TEXT, weight INTEGER
     )""")
-    print("Loading disease ontology...")
-    disease_ontology = rdflib.Graph()
-    disease_ontology.parse(DISEASE_ONTOLOGY_URL, format="xml")
-
     # Store disease ontology version
-    version_query = disease_ontology.query("""
-    SELECT ?version
-    WHERE {
-        ?s owl:versionIRI ?version
-    }
-    """)
-    disease_ontology_version = str(list(version_query)[0][0])
     cur.execute("INSERT INTO metadata VALUES ('disease_ontology_version', ?)",
-                (disease_ontology_version,))
+                (terms.version,))
 
     print("Importing entities from disease ontology...")
-    disease_labels = disease_ontology.query("""
-    SELECT ?entity ?label
-    WHERE {
-        # only include diseases by infectious agent
-        ?entity rdfs:subClassOf* obo:DOID_0050117
-        ; rdfs:label ?label
-    }
-    """)
+    diseases = terms.descendants(ROOT_URI)
     cur.executemany("INSERT INTO entities VALUES (?, ?, 'disease', 'Disease Ontology')", [
-        (str(result[0]), str(result[1]))
-        for result in disease_labels])
+        (uri, label)
+        for uri in diseases
+        for label in terms.labels[uri]])
 
     print("Importing synonyms from disease ontology...")
     insert_command = 'INSERT OR IGNORE INTO synonyms_init VALUES (?, ?, ?)'
-    disease_query = disease_ontology.query("""
-    SELECT ?entity ?synonym ?synonymType (count(?child) AS ?children)
-    WHERE {
-        VALUES ?synonymType {
-            rdfs:label
-            oboInOwl:hasExactSynonym
-            oboInOwl:hasRelatedSynonym
-            oboInOwl:hasNarrowSynonym
-        }
-        # only include diseases by infectious agent
-        ?entity rdfs:subClassOf* obo:DOID_0050117
-        ; ?synonymType ?synonym .
-        OPTIONAL {
-            ?child rdfs:subClassOf ?entity
-        }
-    } GROUP BY ?entity ?synonym ?synonymType
-    """)
-    for batch in batched(disease_query):
-        tuples = []
-        for result in batch:
-            rdict = result.asdict()
-            synonymType = rdict['synonymType'].split("#")[1]
-            weight = 0
-            if synonymType == 'label':
-                weight += 3
-            elif synonymType == 'hasExactSynonym':
-                weight += 2
-            elif synonymType == 'hasNarrowSynonym':
-                weight += 1
-            elif synonymType == 'hasRelatedSynonym':
-                weight += 0
-            else:
-                print("Unknown synonymType:", synonymType)
-                continue
-            if rdict['children'] == 0:
-                # Sometimes parents diseases have as synonyms child disease
-                # names. The weight of diseases with no children is boosted
-                # so that the most specific entity is used.
-                weight += 1
-            syn_string = str(rdict['synonym'])
-            uri = str(rdict['entity'])
-            # Remove text that starts with a bracket
-            if re.match(re.compile(r"^(\[|\()", re.I), syn_string):
-                continue
-            syn_string = re.sub(r"\s*\(.*?\)\s*", " ", syn_string)
-            syn_string = re.sub(r"\s*\[.*?\]\s*", " ", syn_string)
-            syn_string = syn_string.strip()
-            if re.match(re.compile(r"^(or|and)\b", re.I), syn_string):
-                continue
-            if len(syn_string) == 0:
-                continue
-            elif len(syn_string) > 6:
-                tuples.append((syn_string.lower(), uri, weight))
-                tuples.append((syn_string, uri, weight))
-            else:
-                # Short syn_strings are likely to be acronyms so
-                # capitalization is preserved.
-                tuples.append((syn_string, uri, weight))
-        cur.executemany(insert_command, tuples)
+    tuples = []
+    for uri in diseases:
+        for synonym_type, synonym in set(terms.synonyms[uri]):
+            tuples.extend(get_synonym_tuples(uri, synonym_type, synonym))
+    cur.executemany(insert_command, tuples)
     # Extra synonyms not in the disease ontology.
     cur.executemany(insert_command, [
         ('HIV', 'http://purl.obolibrary.org/obo/DOID_526', 3),
@@ -141,6 +264,7 @@ def import_disease_ontology(drop_previous=False):
     ''')
     cur.execute("DROP TABLE IF EXISTS 'synonyms_init'")
     connection.commit()
+    rebuild_synonym_index(connection)
     connection.close()
 
 
@@ -149,6 +273,9 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--drop-previous", dest='drop_previous', action='store_true')
+    parser.add_argument(
+        "--ontology-file", dest='ontology_path',
+        help="A local copy of doid.owl or doid.obo to import instead of downloading it.")
     parser.set_defaults(drop_previous=False)
     args = parser.parse_args()
-    import_disease_ontology(args.drop_previous)
+    import_disease_ontology(args.drop_previous, args.ontology_path)
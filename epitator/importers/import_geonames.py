@@ -1,20 +1,29 @@
 from __future__ import absolute_import
 from __future__ import print_function
-import six
-import csv
-import unicodecsv
+import json
+import multiprocessing
+import os
 import re
-from six import BytesIO
-from zipfile import ZipFile
+import shutil
+import tempfile
+from collections import deque
+from zipfile import ZipFile, is_zipfile
+from six.moves import map
 from six.moves.urllib import request
 from ..get_database_connection import get_database_connection
-from ..utils import parse_number, batched
+from ..utils import parse_number
 
 
 GEONAMES_ZIP_URL = "http://download.geonames.org/export/dump/allCountries.zip"
 
+# The number of lines parsed by each task sent to the parser processes.
+PARSE_CHUNK_SIZE = 10000
+# The number of lines imported in each transaction. Progress is saved at the
+# end of each transaction so an interrupted import can resume from there.
+TRANSACTION_SIZE = 500000
+
 geonames_field_mappings = [
-    ('geonameid', 'text primary key'),
+    ('geonameid', 'text'),
     ('name', 'text'),
     ('asciiname', 'text'),
     ('alternatenames', None),
@@ -36,32 +45,175 @@ geonames_field_mappings = [
 ]
 
 
-def read_geonames_csv():
+def download_geonames(path):
+    """
+    Download the geonames.org dump to the given path.
+    """
     print("Downloading geoname data from: " + GEONAMES_ZIP_URL)
     url = request.urlopen(GEONAMES_ZIP_URL)
-    zipfile = ZipFile(BytesIO(url.read()))
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(url, f, 2**20)
     print("Download complete")
-    # Loading geonames data may cause errors without this line:
-    csv.field_size_limit(six.MAXSIZE)
-    with zipfile.open('allCountries.txt') as f:
-        reader = unicodecsv.DictReader(f,
-                                       fieldnames=[
-                                           k for k, v in geonames_field_mappings],
-                                       encoding='utf-8',
-                                       delimiter='\t',
-                                       quoting=csv.QUOTE_NONE)
-        for d in reader:
-            d['population'] = parse_number(d['population'], 0)
-            d['latitude'] = parse_number(d['latitude'], 0)
-            d['longitude'] = parse_number(d['longitude'], 0)
-            if len(d['alternatenames']) > 0:
-                d['alternatenames'] = d['alternatenames'].split(',')
-            else:
-                d['alternatenames'] = []
-            yield d
 
 
-def import_geonames(drop_previous=False):
+def open_geonames_file(path):
+    """
+    Open allCountries.txt or the zip file containing it in binary mode.
+    """
+    if is_zipfile(path):
+        return ZipFile(path).open('allCountries.txt')
+    return open(path, 'rb')
+
+
+def parse_geoname_line(line):
+    values = line.decode('utf-8').rstrip('\r\n').split('\t')
+    d = {}
+    for idx, (field, sqltype) in enumerate(geonames_field_mappings):
+        d[field] = values[idx] if idx < len(values) else None
+    d['population'] = parse_number(d['population'], 0)
+    d['latitude'] = parse_number(d['latitude'], 0)
+    d['longitude'] = parse_number(d['longitude'], 0)
+    if len(d['alternatenames']) > 0:
+        d['alternatenames'] = d['alternatenames'].split(',')
+    else:
+        d['alternatenames'] = []
+    return d
+
+
+def read_geonames_csv(path):
+    with open_geonames_file(path) as f:
+        for line in f:
+            yield parse_geoname_line(line)
+
+
+def parse_geoname_lines(lines):
+    """
+    Return the rows to insert into the geonames, alternatenames and
+    adminnames tables for the given lines of allCountries.txt, and the
+    number of lines.
+    """
+    geoname_tuples = []
+    alternatename_tuples = []
+    adminname_tuples = []
+    for line in lines:
+        geoname = parse_geoname_line(line)
+        if re.match(r"ADM[1-3]$", geoname['feature_code']) or re.match(r"PCL[IH]$", geoname['feature_code']):
+            adminname_tuples.append((
+                geoname['name'],
+                geoname['country_code'],
+                geoname['admin1_code'],
+                geoname['admin2_code'],
+                geoname['admin3_code'],))
+        geoname_tuples.append(
+            tuple(geoname[field]
+                  for field, sqltype in geonames_field_mappings
+                  if sqltype))
+        for alternatename in set(geoname['alternatenames'] + [geoname['name'], geoname['asciiname']]):
+            alternatename_tuples.append((
+                geoname['geonameid'],
+                alternatename,
+                alternatename.lower().strip()))
+    return geoname_tuples, alternatename_tuples, adminname_tuples, len(lines)
+
+
+def iterate_line_chunks(f, skip_lines, chunk_size):
+    chunk = []
+    for idx, line in enumerate(f):
+        if idx < skip_lines:
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_in_pool(pool, chunks, max_pending):
+    """
+    Yield the parsed chunks in order while parsing up to max_pending chunks
+    in the process pool ahead of the consumer.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.apply_async(parse_geoname_lines, (chunk,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def get_checkpoint(cur):
+    checkpoint = next(cur.execute("""
+    SELECT value FROM metadata WHERE property = 'geonames_import_checkpoint'
+    """), None)
+    return json.loads(checkpoint[0]) if checkpoint else None
+
+
+def save_checkpoint(cur, lines):
+    """
+    Record the number of lines imported and the last row of each table.
+    """
+    checkpoint = {'lines': lines}
+    for table in ['geonames', 'alternatenames', 'adminnames']:
+        checkpoint[table] = next(cur.execute("SELECT max(rowid) FROM " + table))[0] or 0
+    write_checkpoint(cur, checkpoint)
+
+
+def write_checkpoint(cur, checkpoint):
+    cur.execute("INSERT OR REPLACE INTO metadata VALUES ('geonames_import_checkpoint', ?)",
+                (json.dumps(checkpoint),))
+    return checkpoint
+
+
+def create_geoname_lookup_table(cur):
+    """
+    Create the geoname_lookup table that the GeonameAnnotator looks up
+    geonames in. It has a row for each lemmatized alternate name and
+    geoname with the geoname's columns, its number of alternate names and the
+    alternate names the lemmatized name was created from. Its primary key
+    index contains the rows, so a lookup is a range scan of it.
+
+    Databases imported before the table was added can be migrated by running
+    `python -m epitator.importers.import_geonames --create-lookup-table`.
+    Until then, the annotator queries the geonames and alternatenames tables.
+    """
+    cur.execute("""DROP TABLE IF EXISTS geoname_lookup""")
+    cur.execute("CREATE TABLE geoname_lookup (" + ",".join([
+        '"' + k + '" ' + sqltype
+        for k, sqltype in geonames_field_mappings if sqltype] + [
+        'name_count integer',
+        'alternatename_lemmatized text',
+        'names_used text',
+        'PRIMARY KEY (alternatename_lemmatized, geonameid)']) + ") WITHOUT ROWID")
+    cur.execute('''
+    INSERT INTO geoname_lookup
+    SELECT
+        geonames.*,
+        count AS name_count,
+        alternatename_lemmatized,
+        group_concat(alternatename, ";") AS names_used
+    FROM geonames
+    JOIN alternatename_counts USING ( geonameid )
+    JOIN alternatenames USING ( geonameid )
+    GROUP BY alternatename_lemmatized, geonameid
+    ORDER BY alternatename_lemmatized, geonameid
+    ''')
+
+
+def import_geonames(drop_previous=False, geonames_path=None, processes=None):
+    """
+    Import the geonames.org dump into the database. It is downloaded unless
+    geonames_path is the path to a local copy of allCountries.zip or
+    allCountries.txt.
+
+    Progress is saved periodically, so running the import again after it
+    is interrupted resumes it. The database uses a write-ahead log during
+    the import, so a killed import process or a system crash only loses the
+    rows added since the last checkpoint. If the database fails an integrity
+    check when the import resumes, the import must be restarted with
+    drop_previous.
+    """
     connection = get_database_connection(create_database=True)
     cur = connection.cursor()
     if drop_previous:
@@ -71,62 +223,101 @@ def import_geonames(drop_previous=False):
         cur.execute("""DROP TABLE IF EXISTS 'alternatename_counts'""")
         cur.execute("""DROP INDEX IF EXISTS 'alternatename_index'""")
         cur.execute("""DROP TABLE IF EXISTS 'adminnames'""")
+        cur.execute("""DROP TABLE IF EXISTS 'geoname_lookup'""")
+        cur.execute("""DELETE FROM metadata WHERE property = 'geonames_import_checkpoint'""")
+        connection.commit()
     table_exists = len(list(cur.execute("""SELECT name FROM sqlite_master
         WHERE type='table' AND name='geonames'"""))) > 0
-    if table_exists:
-        print("The geonames table already exists."
+    checkpoint = get_checkpoint(cur)
+    if table_exists and not checkpoint:
+        print("The geonames table already exists. "
               "Run this again with --drop-previous to recreate it.")
         return
-    # Create table
-    cur.execute("CREATE TABLE geonames (" + ",".join([
-        '"' + k + '" ' + sqltype
-        for k, sqltype in geonames_field_mappings if sqltype]) + ")")
-    cur.execute('''CREATE TABLE alternatenames
-                 (geonameid text, alternatename text, alternatename_lemmatized text)''')
-    cur.execute('''CREATE TABLE adminnames
-                 (name text,
-                  country_code text, admin1_code text, admin2_code text, admin3_code text,
-                  PRIMARY KEY (country_code, admin1_code, admin2_code, admin3_code))''')
-    i = 0
+    if table_exists and checkpoint:
+        if next(cur.execute("PRAGMA quick_check"))[0] != 'ok':
+            print("The database is corrupt and the import can't be resumed. "
+                  "Run this again with --drop-previous to restart it.")
+            return
+        print("Resuming the import after", checkpoint['lines'], "geonames")
+        # Remove rows added after the last checkpoint.
+        for table in ['geonames', 'alternatenames', 'adminnames']:
+            cur.execute("DELETE FROM " + table + " WHERE rowid > ?", (checkpoint[table],))
+    else:
+        checkpoint = write_checkpoint(cur, {
+            'lines': 0, 'geonames': 0, 'alternatenames': 0, 'adminnames': 0})
+        # The geonameid index is created after the rows are inserted.
+        cur.execute("CREATE TABLE geonames (" + ",".join([
+            '"' + k + '" ' + sqltype
+            for k, sqltype in geonames_field_mappings if sqltype]) + ")")
+        cur.execute('''CREATE TABLE alternatenames
+                     (geonameid text, alternatename text, alternatename_lemmatized text)''')
+        cur.execute('''CREATE TABLE adminnames
+                     (name text,
+                      country_code text, admin1_code text, admin2_code text, admin3_code text,
+                      PRIMARY KEY (country_code, admin1_code, admin2_code, admin3_code))''')
+    connection.commit()
+    # Committed transactions are written to the log without waiting for
+    # the disk, which is safe in WAL mode. A rollback journal would have to
+    # be synced, and disabling it lets a killed import corrupt the database.
+    cur.execute("PRAGMA journal_mode = WAL")
+    cur.execute("PRAGMA synchronous = NORMAL")
+    download_path = None
+    if not geonames_path:
+        download_file, download_path = tempfile.mkstemp(suffix='.zip')
+        os.close(download_file)
+        download_geonames(download_path)
+        geonames_path = download_path
     geonames_insert_command = 'INSERT INTO geonames VALUES (' + ','.join([
         '?' for x, sqltype in geonames_field_mappings if sqltype]) + ')'
     alternatenames_insert_command = 'INSERT INTO alternatenames VALUES (?, ?, ?)'
     adminnames_insert_command = 'INSERT OR IGNORE INTO adminnames VALUES (?, ?, ?, ?, ?)'
-    for batch in batched(read_geonames_csv()):
-        geoname_tuples = []
-        alternatename_tuples = []
-        adminname_tuples = []
-        for geoname in batch:
-            i += 1
-            total_row_estimate = 11000000
-            if i % (total_row_estimate / 40) == 0:
-                print(i, '/', total_row_estimate, '+ geonames imported')
-                connection.commit()
-            if re.match(r"ADM[1-3]$", geoname['feature_code']) or re.match(r"PCL[IH]$", geoname['feature_code']):
-                adminname_tuples.append((
-                    geoname['name'],
-                    geoname['country_code'],
-                    geoname['admin1_code'],
-                    geoname['admin2_code'],
-                    geoname['admin3_code'],))
-            geoname_tuples.append(
-                tuple(geoname[field]
-                      for field, sqltype in geonames_field_mappings
-                      if sqltype))
-            for alternatename in set(geoname['alternatenames'] + [geoname['name'], geoname['asciiname']]):
-                alternatename_tuples.append((
-                    geoname['geonameid'],
-                    alternatename,
-                    alternatename.lower().strip()))
-        cur.executemany(geonames_insert_command, geoname_tuples)
-        cur.executemany(alternatenames_insert_command, alternatename_tuples)
-        cur.executemany(adminnames_insert_command, adminname_tuples)
+    total_row_estimate = 11000000
+    lines_imported = checkpoint['lines']
+    last_checkpoint = lines_imported
+    pool = None
+    if processes != 1:
+        processes = processes or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes)
+    try:
+        with open_geonames_file(geonames_path) as f:
+            chunks = iterate_line_chunks(f, lines_imported, PARSE_CHUNK_SIZE)
+            if pool:
+                parsed_chunks = parse_in_pool(pool, chunks, 2 * processes)
+            else:
+                parsed_chunks = map(parse_geoname_lines, chunks)
+            for geoname_tuples, alternatename_tuples, adminname_tuples, line_count in parsed_chunks:
+                cur.executemany(geonames_insert_command, geoname_tuples)
+                cur.executemany(alternatenames_insert_command, alternatename_tuples)
+                cur.executemany(adminnames_insert_command, adminname_tuples)
+                lines_imported += line_count
+                if lines_imported - last_checkpoint >= TRANSACTION_SIZE:
+                    save_checkpoint(cur, lines_imported)
+                    connection.commit()
+                    last_checkpoint = lines_imported
+                    print(lines_imported, '/', total_row_estimate, '+ geonames imported')
+        save_checkpoint(cur, lines_imported)
+        connection.commit()
+    except Exception:
+        # The database can't leave WAL mode when it is resumed while this
+        # connection is open.
+        connection.close()
+        raise
+    finally:
+        if pool:
+            pool.terminate()
+        if download_path:
+            os.remove(download_path)
     print("Creating indexes...")
     cur.execute('''
-    CREATE INDEX alternatename_index
+    CREATE UNIQUE INDEX IF NOT EXISTS geonameid_index
+    ON geonames (geonameid);
+    ''')
+    cur.execute('''
+    CREATE INDEX IF NOT EXISTS alternatename_index
     ON alternatenames (alternatename_lemmatized);
     ''')
     connection.commit()
+    cur.execute('''DROP TABLE IF EXISTS alternatename_counts''')
     cur.execute('''CREATE TABLE alternatename_counts
                  (geonameid text primary key, count integer)''')
     cur.execute('''
@@ -135,7 +326,11 @@ def import_geonames(drop_previous=False):
     FROM geonames INNER JOIN alternatenames USING ( geonameid )
     GROUP BY geonameid
     ''')
+    print("Creating geoname lookup table...")
+    create_geoname_lookup_table(cur)
+    cur.execute("""DELETE FROM metadata WHERE property = 'geonames_import_checkpoint'""")
     connection.commit()
+    cur.execute("PRAGMA journal_mode = DELETE")
     connection.close()
 
 
@@ -144,6 +339,21 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--drop-previous", dest='drop_previous', action='store_true')
-    parser.set_defaults(drop_previous=False)
+    parser.add_argument(
+        "--geonames-file", dest='geonames_path',
+        help="A local copy of allCountries.zip or allCountries.txt to import instead of downloading it.")
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="The number of processes used to parse the geonames. By default one per CPU is used.")
+    parser.add_argument(
+        "--create-lookup-table", dest='create_lookup_table', action='store_true',
+        help="Only create the geoname lookup table from previously imported geonames.")
+    parser.set_defaults(drop_previous=False, create_lookup_table=False)
     args = parser.parse_args()
-    import_geonames(args.drop_previous)
+    if args.create_lookup_table:
+        connection = get_database_connection()
+        create_geoname_lookup_table(connection.cursor())
+        connection.commit()
+        connection.close()
+    else:
+        import_geonames(args.drop_previous, args.geonames_path, args.processes)
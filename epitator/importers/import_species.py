@@ -5,40 +5,76 @@ annotator.
 """
 from __future__ import absolute_import
 from __future__ import print_function
-import sqlite3
-from six import BytesIO
+import os
+import shutil
+import tempfile
 from zipfile import ZipFile
 from six.moves.urllib import request
-from tempfile import NamedTemporaryFile
-import os
 from ..get_database_connection import get_database_connection
-from ..utils import batched
+from .synonym_index import rebuild_synonym_index
 
 
 ITIS_URL = "https://www.itis.gov/downloads/itisSqlite.zip"
 
+# Common names that ITIS doesn't include or that should be weighted highly.
+HARD_CODED_SYNONYMS = [
+    ('man', 'tsn:180092', 3),
+    ('men', 'tsn:180092', 3),
+    ('woman', 'tsn:180092', 3),
+    ('women', 'tsn:180092', 3),
+    ('human', 'tsn:180092', 3),
+    ('humans', 'tsn:180092', 3),
+    ('person', 'tsn:180092', 3),
+    ('people', 'tsn:180092', 3),
+    # buffalo
+    ('buffalo', 'tsn:898079', 3),
+    ('buffaloes', 'tsn:898079', 3),
+    # chickens
+    ('chicken', 'tsn:176086', 3),
+    ('chickens', 'tsn:176086', 3),
+    ('hen', 'tsn:176086', 3),
+    ('rooster', 'tsn:176086', 3),
+    # ducks
+    ('duck', 'tsn:174983', 3),
+    ('ducks', 'tsn:174983', 3),
+]
+
 
 # The data model for the itis database is available here:
 # https://www.itis.gov/pdf/ITIS_ConceptualModelEntityDefinition.pdf
-def download_itis_database():
+def download_itis_database(directory):
+    """
+    Download the ITIS zip file and extract the sqlite database in it to the
+    given directory. Both are streamed to disk rather than held in memory.
+    Returns the path of the database and the ITIS version.
+    """
     print("Downloading ITIS data from: " + ITIS_URL)
-    url = request.urlopen(ITIS_URL)
-    zipfile = ZipFile(BytesIO(url.read(int(url.headers['content-length']))))
+    zip_path = os.path.join(directory, 'itisSqlite.zip')
+    with open(zip_path, 'wb') as f:
+        shutil.copyfileobj(request.urlopen(ITIS_URL), f, 2**20)
     print("Download complete")
-    named_temp_file = NamedTemporaryFile()
-    itis_version = zipfile.filelist[0].filename.split('/')[0]
-    db_file = None
-    for f in zipfile.filelist:
-        if f.filename.endswith('.sqlite'):
-            db_file = f
-            break
-    with zipfile.open(db_file) as open_db_file:
-        named_temp_file.write(open_db_file.read())
-        named_temp_file.flush()
-    return named_temp_file, itis_version
+    db_path = os.path.join(directory, 'itis.sqlite')
+    with ZipFile(zip_path) as zipfile:
+        itis_version = zipfile.filelist[0].filename.split('/')[0]
+        db_file = None
+        for f in zipfile.filelist:
+            if f.filename.endswith('.sqlite'):
+                db_file = f
+                break
+        with zipfile.open(db_file) as open_db_file, open(db_path, 'wb') as f:
+            shutil.copyfileobj(open_db_file, f, 2**20)
+    os.remove(zip_path)
+    return db_path, itis_version
 
 
 def import_species(drop_previous=False):
+    """
+    Import the species names in ITIS. The ITIS database is downloaded unless
+    the ITIS_DB_PATH environment variable is the path to a local copy of it,
+    in which case ITIS_VERSION should be set to its version. The ITIS
+    database is attached to the EpiTator database so the rows are copied
+    within sqlite.
+    """
     connection = get_database_connection(create_database=True)
     cur = connection.cursor()
     if drop_previous:
@@ -53,95 +89,76 @@ def import_species(drop_previous=False):
     if current_itis_version:
         print("The species data has already been imported. Run this again with --drop-previous to re-import it.")
         return
+    download_directory = None
     if os.environ.get('ITIS_DB_PATH'):
-        itis_db_file = open(os.environ.get('ITIS_DB_PATH'))
+        itis_db_path = os.environ.get('ITIS_DB_PATH')
         itis_version = os.environ.get('ITIS_VERSION')
     else:
-        itis_db_file, itis_version = download_itis_database()
-    itis_db = sqlite3.connect(itis_db_file.name)
-    cur.execute("INSERT INTO metadata VALUES ('itis_version', ?)", (itis_version,))
-    itis_cur = itis_db.cursor()
-    results = itis_cur.execute("""
-    SELECT
-      tsn,
-      complete_name
-    FROM taxonomic_units
-    """)
-    cur.executemany("INSERT INTO entities VALUES (?, ?, 'species', 'ITIS')", [
-        ("tsn:" + str(result[0]), result[1])
-        for result in results])
-    connection.commit()
-    # synonyms_init is a temporary tables that is aggregated to generate the
-    # final synonyms table.
-    cur.execute("DROP TABLE IF EXISTS synonyms_init")
-    cur.execute("""
-    CREATE TABLE synonyms_init (
-        synonym TEXT, entity_id TEXT, weight INTEGER
-    )""")
-    insert_command = 'INSERT OR IGNORE INTO synonyms_init VALUES (?, ?, ?)'
-    # vern_ref_links and reference_links are used to weight the terms
-    query = itis_cur.execute("""
-    SELECT
-      tsn,
-      completename AS name,
-      count(documentation_id) AS refs
-    FROM longnames
-    LEFT JOIN reference_links USING (tsn)
-    GROUP BY tsn, completename
+        download_directory = tempfile.mkdtemp()
+    try:
+        if download_directory:
+            itis_db_path, itis_version = download_itis_database(download_directory)
+        # Databases can't be attached within a transaction.
+        connection.commit()
+        cur.execute("ATTACH DATABASE ? AS itis", (itis_db_path,))
+        cur.execute("INSERT INTO metadata VALUES ('itis_version', ?)", (itis_version,))
+        print("Importing entities from ITIS database...")
+        cur.execute("""
+        INSERT INTO entities
+        SELECT 'tsn:' || tsn, complete_name, 'species', 'ITIS'
+        FROM itis.taxonomic_units
+        """)
+        # synonyms_init is a temporary tables that is aggregated to generate the
+        # final synonyms table.
+        cur.execute("DROP TABLE IF EXISTS synonyms_init")
+        cur.execute("""
+        CREATE TABLE synonyms_init (
+            synonym TEXT, entity_id TEXT, weight INTEGER
+        )""")
+        # vern_ref_links and reference_links are used to weight the terms
+        cur.execute("""
+        INSERT INTO synonyms_init
+        SELECT name, 'tsn:' || tsn, min(refs, 3)
+        FROM (
+            SELECT
+              tsn,
+              completename AS name,
+              count(documentation_id) AS refs
+            FROM itis.longnames
+            LEFT JOIN itis.reference_links USING (tsn)
+            GROUP BY tsn, completename
 
-    UNION
+            UNION
 
-    SELECT
-      tsn,
-      vernacular_name AS name,
-      count(documentation_id) AS refs
-    FROM vernaculars
-    LEFT JOIN vern_ref_links USING (tsn)
-    GROUP BY tsn, vernacular_name
-    """)
-    for batch in batched(query):
-        tuples = []
-        for result in batch:
-            tsn, name, refs = [x for x in result]
-            if refs >= 3:
-                weight = 3
-            else:
-                weight = refs
-            tuples.append((name, 'tsn:' + str(tsn), weight))
-        cur.executemany(insert_command, tuples)
-    print("Importing hard-coded species names")
-    cur.executemany(insert_command, [
-        ('man', 'tsn:180092', 3),
-        ('men', 'tsn:180092', 3),
-        ('woman', 'tsn:180092', 3),
-        ('women', 'tsn:180092', 3),
-        ('human', 'tsn:180092', 3),
-        ('humans', 'tsn:180092', 3),
-        ('person', 'tsn:180092', 3),
-        ('people', 'tsn:180092', 3),
-        # buffalo
-        ('buffalo', 'tsn:898079', 3),
-        ('buffaloes', 'tsn:898079', 3),
-        # chickens
-        ('chicken', 'tsn:176086', 3),
-        ('chickens', 'tsn:176086', 3),
-        ('hen', 'tsn:176086', 3),
-        ('rooster', 'tsn:176086', 3),
-        # ducks
-        ('duck', 'tsn:174983', 3),
-        ('ducks', 'tsn:174983', 3),
-    ])
-    print("Importing synonyms from ITIS database...")
-    cur.execute('''
-    INSERT INTO synonyms
-    SELECT synonym, entity_id, max(weight)
-    FROM synonyms_init
-    GROUP BY synonym, entity_id
-    ''')
-    cur.execute("DROP TABLE 'synonyms_init'")
-    connection.commit()
-    connection.close()
-    itis_db_file.close()
+            SELECT
+              tsn,
+              vernacular_name AS name,
+              count(documentation_id) AS refs
+            FROM itis.vernaculars
+            LEFT JOIN itis.vern_ref_links USING (tsn)
+            GROUP BY tsn, vernacular_name
+        )
+        """)
+        print("Importing hard-coded species names")
+        cur.execute(
+            "INSERT INTO synonyms_init VALUES " +
+            ", ".join(["(?, ?, ?)"] * len(HARD_CODED_SYNONYMS)),
+            [value for synonym in HARD_CODED_SYNONYMS for value in synonym])
+        print("Importing synonyms from ITIS database...")
+        cur.execute('''
+        INSERT INTO synonyms
+        SELECT synonym, entity_id, max(weight)
+        FROM synonyms_init
+        GROUP BY synonym, entity_id
+        ''')
+        cur.execute("DROP TABLE 'synonyms_init'")
+        connection.commit()
+        cur.execute("DETACH DATABASE itis")
+        rebuild_synonym_index(connection)
+    finally:
+        connection.close()
+        if download_directory:
+            shutil.rmtree(download_directory)
 
 
 if __name__ == '__main__':
@@ -6,6 +6,7 @@ Currently only animal diseases are imported.
 from __future__ import absolute_import
 from __future__ import print_function
 from ..get_database_connection import get_database_connection
+from .synonym_index import rebuild_synonym_index
 from urllib import urlopen, urlencode
 import json
 import datetime
@@ -62,6 +63,7 @@ def import_wikidata(drop_previous=False):
         ('MERS-CoV', 'https://www.wikidata.org/wiki/Q16654806', 3),
     ])
     connection.commit()
+    rebuild_synonym_index(connection)
     connection.close()
 
 
@@ -0,0 +1,46 @@
+"""
+Script for building the synonyms_fts full-text index of the synonyms table
+that DatabaseInterface.lookup_synonym searches. The importers rebuild it
+after they change the synonyms, so it only needs to be run directly to add
+the index to a database imported by an earlier version of EpiTator.
+
+The index uses sqlite's FTS5 extension with the trigram tokenizer, which
+requires sqlite 3.34 or later. When it isn't available no index is built
+and lookup_synonym scans the synonyms table.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import sqlite3
+from ..get_database_connection import get_database_connection
+
+
+def rebuild_synonym_index(connection):
+    """
+    Recreate the synonyms_fts table from the synonyms table. Returns False
+    if the sqlite library doesn't support it.
+    """
+    cur = connection.cursor()
+    cur.execute("DROP TABLE IF EXISTS synonyms_fts")
+    try:
+        cur.execute("""
+        CREATE VIRTUAL TABLE synonyms_fts USING fts5(
+            synonym, entity_id UNINDEXED, weight UNINDEXED,
+            tokenize = 'trigram'
+        )""")
+    except sqlite3.OperationalError as e:
+        print("The synonym index could not be created:", e)
+        return False
+    print("Indexing synonyms...")
+    cur.execute("""
+    INSERT INTO synonyms_fts
+    SELECT synonym, entity_id, weight FROM synonyms
+    """)
+    cur.execute("INSERT INTO synonyms_fts(synonyms_fts) VALUES ('optimize')")
+    connection.commit()
+    return True
+
+
+if __name__ == '__main__':
+    connection = get_database_connection()
+    rebuild_synonym_index(connection)
+    connection.close()
@@ -9,7 +9,7 @@ class POSAnnotator(Annotator):
 
     def annotate(self, doc):
         if 'spacy.tokens' not in doc.tiers:
-            doc.add_tiers(SpacyAnnotator())
+            doc.add_tiers(SpacyAnnotator(tiers=['spacy.tokens']))
         pos_spans = [AnnoSpan(span.start, span.end, doc, label=span.token.tag_)
                      for span in doc.tiers['spacy.tokens'].spans]
         doc.tiers['pos'] = AnnoTier(pos_spans)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 from __future__ import absolute_import
-from .annotator import Annotator, AnnoTier
+from .annotator import Annotator, AnnoTier, AnnoTierBuilder
 from .annospan import AnnoSpan
 from .spacy_annotator import SpacyAnnotator
 from .date_annotator import DateAnnotator
@@ -23,16 +23,14 @@ class RawNumberAnnotator(Annotator):
     def annotate(self, doc):
         if 'dates' not in doc.tiers:
             doc.add_tiers(DateAnnotator())
-        if 'spacy.tokens' not in doc.tiers:
-            doc.add_tiers(SpacyAnnotator())
         dates = doc.tiers['dates']
-        spacy_tokens = doc.tiers['spacy.tokens']
-        spacy_nes = doc.tiers['spacy.nes']
-        numbers = []
+        spacy_tokens, spacy_nes = doc.require_tiers(
+            'spacy.tokens', 'spacy.nes', via=SpacyAnnotator)
+        numbers = AnnoTierBuilder()
         for ne_span in spacy_nes:
             if ne_span.label in ['QUANTITY', 'CARDINAL']:
                 if is_valid_number(ne_span.text):
-                    numbers.append(ne_span)
+                    numbers.add_span(ne_span)
                 else:
                     joiner_offsets = [m.span()
                                       for m in re.finditer(r'\s(?:to|and|or)\s',
@@ -41,21 +39,21 @@ class RawNumberAnnotator(Annotator):
                         range_start = AnnoSpan(ne_span.start, ne_span.start + joiner_offsets[0][0], doc)
                         range_end = AnnoSpan(ne_span.start + joiner_offsets[0][1], ne_span.end, doc)
                         if is_valid_number(range_start.text):
-                            numbers.append(range_start)
+                            numbers.add_span(range_start)
                         if is_valid_number(range_end.text):
-                            numbers.append(range_end)
+                            numbers.add_span(range_end)
 
         # Add purely numeric numbers that were not picked up by the NER.
         # NB: The dates in SpaCy NEs may be longer than those in dates. The
         # SpaCy date NEs are removed to prevent excessively long spans of text
         # from being used to remove valid counts.
-        numbers += spacy_tokens.search_spans(r'[1-9]\d{0,6}')\
-            .without_overlaps(spacy_nes.without_overlaps(dates)).spans
+        numbers.add(spacy_tokens.search_spans(r'[1-9]\d{0,6}')
+                    .without_overlaps(spacy_nes.without_overlaps(dates)))
         # Add delimited numbers
-        numbers += doc.create_regex_tier(
-            r'[1-9]\d{0,2}(( \d{3})+|(,\d{3})+)').spans
+        numbers.add(doc.create_regex_tiers([
+            ('delimited_number', r'[1-9]\d{0,2}(( \d{3})+|(,\d{3})+)')])['delimited_number'])
         # Remove counts that overlap a date
-        numbers = AnnoTier(numbers).without_overlaps(dates).optimal_span_set()
+        numbers = numbers.build().without_overlaps(dates).optimal_span_set()
         return {
             'raw_numbers': AnnoTier([
                 AnnoSpan(number.start, number.end, doc, metadata={
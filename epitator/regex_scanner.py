@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""
+Find the matches of regular expressions with a prefilter on the characters
+their matches can start with.
+
+Searching with an expression directly tries it at every position of the
+text unless it starts with a literal or a character class, and
+DateAnnotator's formatted date expression, for example, starts with \\b.
+So the expression is searched for with a lookahead for the characters that
+its matches can start with, which are derived from the parsed expression,
+and re skips to the positions where one of them occurs. Expressions with the
+same flags that are searched for together share a single scan of the text.
+"""
+from __future__ import absolute_import
+import re
+import six
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+CATEGORY_CLASSES = {
+    sre_parse.CATEGORY_DIGIT: r'\d',
+    sre_parse.CATEGORY_NOT_DIGIT: r'\D',
+    sre_parse.CATEGORY_SPACE: r'\s',
+    sre_parse.CATEGORY_NOT_SPACE: r'\S',
+    sre_parse.CATEGORY_WORD: r'\w',
+    sre_parse.CATEGORY_NOT_WORD: r'\W',
+}
+
+REPEAT_OPS = set([sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                  getattr(sre_parse, 'POSSESSIVE_REPEAT', sre_parse.MAX_REPEAT)])
+
+ZERO_WIDTH_OPS = set([sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT])
+
+
+class UnsupportedRegex(Exception):
+    pass
+
+
+def character_class_items(op, av):
+    """
+    Return the character class items for a parsed literal or character
+    class, or None if it can match characters that can't be listed in a
+    class, like the negated classes.
+    """
+    if op == sre_parse.LITERAL:
+        return [re.escape(six.unichr(av))]
+    elif op == sre_parse.RANGE:
+        return [re.escape(six.unichr(av[0])) + '-' + re.escape(six.unichr(av[1]))]
+    elif op == sre_parse.CATEGORY:
+        return [CATEGORY_CLASSES[av]] if av in CATEGORY_CLASSES else None
+    elif op == sre_parse.IN:
+        items = []
+        for item_op, item_av in av:
+            item_items = character_class_items(item_op, item_av)
+            if item_items is None:
+                return None
+            items += item_items
+        return items
+    elif op in (sre_parse.ANY, sre_parse.NOT_LITERAL, sre_parse.NEGATE):
+        return None
+    raise UnsupportedRegex()
+
+
+def first_characters(subpattern):
+    """
+    Return the character class items that the given parsed subpattern can
+    begin with, or None if they can't be listed, and whether it can match
+    the empty string. Zero-width assertions are skipped, so the items may
+    include characters that can't begin a match.
+    """
+    items = []
+    for op, av in subpattern:
+        if op in ZERO_WIDTH_OPS:
+            continue
+        elif op == sre_parse.SUBPATTERN:
+            # The parsed groups are (group, pattern) tuples in Python 2 and
+            # (group, add_flags, del_flags, pattern) tuples in Python 3.
+            if len(av) == 4 and (av[1] or av[2]):
+                raise UnsupportedRegex()
+            item_items, nullable = first_characters(av[-1])
+        elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+            item_items, nullable = first_characters(av)
+        elif op == sre_parse.BRANCH:
+            item_items, nullable = [], False
+            for branch in av[1]:
+                branch_items, branch_nullable = first_characters(branch)
+                item_items = None if item_items is None or branch_items is None\
+                    else item_items + branch_items
+                nullable = nullable or branch_nullable
+        elif op in REPEAT_OPS:
+            item_items, nullable = first_characters(av[2])
+            nullable = nullable or av[0] == 0
+        else:
+            item_items, nullable = character_class_items(op, av), False
+        items = None if items is None or item_items is None else items + item_items
+        if not nullable:
+            return items, False
+    return items, True
+
+
+def contains_group_references(subpattern):
+    """
+    Return whether the parsed subpattern refers to a group, which would be
+    a different group in the combined scanner.
+    """
+    for op, av in subpattern:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return True
+        for value in (av if isinstance(av, (list, tuple)) else [av]):
+            if isinstance(value, sre_parse.SubPattern) and contains_group_references(value):
+                return True
+            if isinstance(value, list) and any(
+                    isinstance(item, sre_parse.SubPattern) and contains_group_references(item)
+                    for item in value):
+                return True
+    return False
+
+
+def first_character_items(regex, subpattern):
+    """
+    Return the character class items that the matches of the compiled
+    regex can start with, or None if they can't be listed. Raises an
+    UnsupportedRegex exception if the regex can't be combined with other
+    regexes, for example because it refers to groups by number or it can
+    match the empty string.
+    """
+    if regex.flags & re.VERBOSE or contains_group_references(subpattern):
+        raise UnsupportedRegex()
+    items, nullable = first_characters(subpattern)
+    if nullable:
+        raise UnsupportedRegex()
+    return items
+
+
+def scan(text, regexes, items):
+    """
+    Find the matches of the given regexes, which have the same flags, by
+    searching the text once for the positions where their matches can
+    start. Returns None if the regexes can't be combined into one pattern.
+    """
+    flags = regexes[0].flags
+    character_class = u'(?=[' + u''.join(items) + u'])'
+    try:
+        if len(regexes) == 1:
+            regex = re.compile(character_class + u'(?:' + regexes[0].pattern + u')', flags)
+            return [[match.span() for match in regex.finditer(text)]]
+        scanner = re.compile(character_class + u'(?:' + u'|'.join(
+            u'(?=' + regex.pattern + u')' for regex in regexes) + u')', flags)
+    except re.error:
+        return None
+    matches = [[] for regex in regexes]
+    # The position each regex's next match can start at
+    next_starts = [0] * len(regexes)
+    pos = 0
+    while True:
+        scanner_match = scanner.search(text, pos)
+        if scanner_match is None:
+            break
+        pos = scanner_match.start()
+        for idx, regex in enumerate(regexes):
+            if next_starts[idx] > pos:
+                continue
+            match = regex.match(text, pos)
+            if match:
+                matches[idx].append((pos, match.end()))
+                next_starts[idx] = match.end()
+        pos += 1
+    return matches
+
+
+def find_matches(text, regexes):
+    """
+    Return a list of the (start, end) offsets of each given regex's matches
+    in the text. Each list has the non-empty matches re.finditer would find
+    for the regex, so the matches of a regex don't overlap each other but
+    may overlap the matches of the other regexes.
+
+    Regexes that start with a literal or a character class are searched
+    for directly, since re already skips to the positions where they can
+    match. The others are searched for with a prefilter on their first
+    characters, and the ones with the same flags share a scan.
+    """
+    regexes = [re.compile(regex) for regex in regexes]
+    matches = [None] * len(regexes)
+    groups = {}
+    for idx, regex in enumerate(regexes):
+        subpattern = sre_parse.parse(regex.pattern, regex.flags)
+        if len(subpattern) and subpattern[0][0] not in (sre_parse.LITERAL, sre_parse.IN):
+            try:
+                items = first_character_items(regex, subpattern)
+            except UnsupportedRegex:
+                items = None
+            if items is not None:
+                group = groups.setdefault(regex.flags, ([], [], []))
+                group[0].append(idx)
+                group[1].append(regex)
+                group[2].extend(items)
+    for indices, group_regexes, items in groups.values():
+        group_matches = scan(text, group_regexes, items)
+        if group_matches is not None:
+            for idx, regex_matches in zip(indices, group_matches):
+                matches[idx] = regex_matches
+    for idx, regex in enumerate(regexes):
+        if matches[idx] is None:
+            matches[idx] = [
+                match.span() for match in regex.finditer(text) if match.end() > match.start()]
+    return matches
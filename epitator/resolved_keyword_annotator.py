@@ -5,8 +5,7 @@ from __future__ import absolute_import
 from collections import defaultdict
 from .annotator import Annotator, AnnoSpan, AnnoTier
 from .ngram_annotator import NgramAnnotator
-from .get_database_connection import get_database_connection
-import sqlite3
+from .get_database_connection import get_database_connection, run_query
 import logging
 
 
@@ -14,7 +13,38 @@ logging.basicConfig(level=logging.ERROR, format='%(asctime)s %(message)s')
 logger = logging.getLogger(__name__)
 
 
+def match_synonyms(connection, ngrams):
+    """
+    Return (ngram, synonym row) pairs for the synonyms matching the ngrams.
+    The synonyms table is merged with the sorted ngrams in a single scan.
+    """
+    cursor = connection.cursor()
+    matches = []
+    ordered_ngram_iter = iter(sorted(ngrams))
+    try:
+        ngram = next(ordered_ngram_iter)
+        for result in cursor.execute("""
+        SELECT * FROM synonyms ORDER BY synonym"""):
+            while ngram < result['synonym']:
+                ngram = next(ordered_ngram_iter)
+            if ngram == result['synonym']:
+                matches.append((ngram, result))
+    except StopIteration:
+        pass
+    return matches
+
+
+def query_entities(connection, entity_ids):
+    cursor = connection.cursor()
+    return list(cursor.execute('''
+         SELECT id, label, type
+         FROM entities
+         WHERE id IN (''' + ','.join('?' for x in entity_ids) + ')', entity_ids))
+
+
 class ResolvedKeywordSpan(AnnoSpan):
+    __slots__ = []
+
     def __init__(self, span, resolutions):
         super(ResolvedKeywordSpan, self).__init__(
             span.start,
@@ -23,7 +53,10 @@ class ResolvedKeywordSpan(AnnoSpan):
             metadata={
                 'resolutions': resolutions
             })
-        self.resolutions = resolutions
+
+    @property
+    def resolutions(self):
+        return self.metadata['resolutions']
 
     def __repr__(self):
         ids = [r['entity_id'] for r in self.resolutions]
@@ -41,9 +74,15 @@ class ResolvedKeywordSpan(AnnoSpan):
 
 
 class ResolvedKeywordAnnotator(Annotator):
+    @property
+    def connection(self):
+        # Each thread uses its own read-only connection, so annotators can
+        # be shared by threads.
+        return get_database_connection(read_only=True)
+
     def __init__(self):
-        self.connection = get_database_connection()
-        self.connection.row_factory = sqlite3.Row
+        # Fail early if the database is missing.
+        get_database_connection(read_only=True)
 
     @property
     def synonyms(self):
@@ -64,39 +103,26 @@ class ResolvedKeywordAnnotator(Annotator):
                 span_text_to_spans[span_text.lower()].append(ngram_span)
 
         ngrams = list(set(span_text_to_spans.keys()))
-        cursor = self.connection.cursor()
-
         spans_to_resolved_keywords = defaultdict(list)
         entity_ids = set()
-        ordered_ngram_iter = iter(sorted(ngrams))
-        try:
-            ngram = next(ordered_ngram_iter)
-            for result in self.synonyms:
-                while ngram < result['synonym']:
-                    ngram = next(ordered_ngram_iter)
-                if ngram == result['synonym']:
-                    # increase the weight of entities matching longer spans of text
-                    # as they are less likely to be false positives.
-                    if len(ngram) > 12:
-                        match_weight = 2
-                    elif len(ngram) > 10:
-                        match_weight = 1
-                    else:
-                        match_weight = 0
-                    for span in span_text_to_spans[ngram]:
-                        spans_to_resolved_keywords[span].append(
-                            dict(result,
-                                 weight=result['weight'] + match_weight))
-                        entity_ids.add(result['entity_id'])
-        except StopIteration:
-            pass
+        for ngram, result in run_query(self.connection, match_synonyms, ngrams):
+            # increase the weight of entities matching longer spans of text
+            # as they are less likely to be false positives.
+            if len(ngram) > 12:
+                match_weight = 2
+            elif len(ngram) > 10:
+                match_weight = 1
+            else:
+                match_weight = 0
+            for span in span_text_to_spans[ngram]:
+                spans_to_resolved_keywords[span].append(
+                    dict(result,
+                         weight=result['weight'] + match_weight))
+                entity_ids.add(result['entity_id'])
 
         logger.info('%s entities resolved' % len(entity_ids))
 
-        results = cursor.execute('''
-             SELECT id, label, type
-             FROM entities
-             WHERE id IN (''' + ','.join('?' for x in entity_ids) + ')', list(entity_ids))
+        results = run_query(self.connection, query_entities, list(entity_ids))
         ids_to_entities = {}
         for result in results:
             ids_to_entities[result['id']] = result
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+An HTTP server that annotates documents with a warm set of annotators.
+
+Start it with `python -m epitator.server` and POST JSON documents like
+{"text": "...", "date": "2017-12-01", "annotators": ["geonames", "counts"]}
+to /annotate. The response contains the requested tiers as lists of span
+dicts. The server can listen on a TCP port or a Unix socket.
+
+The spacy model is loaded once and shared by all the worker threads. Texts
+that the workers process at the same time are batched together into calls
+to the model's pipe method.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import traceback
+import six
+from six.moves import BaseHTTPServer, socketserver, queue
+from .annodoc import AnnoDoc
+from .annospan import AnnoSpan
+from .annotier import AnnoTier
+from . import spacy_nlp
+
+logging.basicConfig(level=logging.ERROR, format='%(asctime)s %(message)s')
+logger = logging.getLogger(__name__)
+
+# The annotators the server can run, keyed by the name of the tier they
+# create. Modules are imported when a worker creates its annotators so
+# the server only needs the dependencies of the annotators it uses.
+ANNOTATORS = {
+    'geonames': ('epitator.geoname_annotator', 'GeonameAnnotator'),
+    'dates': ('epitator.date_annotator', 'DateAnnotator'),
+    'counts': ('epitator.count_annotator', 'CountAnnotator'),
+    'resolved_keywords': ('epitator.resolved_keyword_annotator', 'ResolvedKeywordAnnotator'),
+    'species': ('epitator.species_annotator', 'SpeciesAnnotator'),
+    'raw_numbers': ('epitator.raw_number_annotator', 'RawNumberAnnotator'),
+    'structured_data': ('epitator.structured_data_annotator', 'StructuredDataAnnotator'),
+    'structured_incidents': ('epitator.structured_incident_annotator', 'StructuredIncidentAnnotator'),
+}
+
+
+def to_json_value(value):
+    """
+    Convert annotation metadata into values that can be serialized as JSON.
+    """
+    if isinstance(value, AnnoSpan):
+        return span_to_dict(value)
+    elif isinstance(value, AnnoTier):
+        return [span_to_dict(span) for span in value]
+    elif isinstance(value, dict):
+        return {
+            k.text if isinstance(k, AnnoSpan) else six.text_type(k): to_json_value(v)
+            for k, v in value.items()}
+    elif isinstance(value, (list, tuple, set)):
+        return [to_json_value(v) for v in value]
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    elif value is None or isinstance(value, (bool, float) + six.integer_types + six.string_types):
+        return value
+    elif hasattr(value, 'to_dict'):
+        return to_json_value(value.to_dict())
+    elif hasattr(value, 'keys'):
+        return {six.text_type(k): to_json_value(value[k]) for k in value.keys()}
+    else:
+        return six.text_type(value)
+
+
+def span_to_dict(span):
+    result = span.to_dict()
+    result['text'] = span.text
+    # Spans classes that don't override to_dict keep their data in metadata.
+    if span.metadata and type(span).to_dict == AnnoSpan.to_dict:
+        result['metadata'] = span.metadata
+    return to_json_value(result)
+
+
+class AnnotationWorker(threading.Thread):
+    """
+    A thread that annotates the documents in the job queue. Each worker has
+    its own annotators so they don't share state between threads.
+    """
+    def __init__(self, jobs, annotator_names):
+        super(AnnotationWorker, self).__init__()
+        self.daemon = True
+        self.jobs = jobs
+        self.annotator_names = annotator_names
+        self.annotators = {}
+        self.ready = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            for name in self.annotator_names:
+                module_name, class_name = ANNOTATORS[name]
+                self.annotators[name] = getattr(importlib.import_module(module_name), class_name)()
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.ready.set()
+        while True:
+            job = self.jobs.get()
+            try:
+                job['result'] = self.annotate(job['request'])
+            except Exception:
+                job['exc_info'] = sys.exc_info()
+            finally:
+                job['done'].set()
+
+    def annotate(self, request):
+        doc = AnnoDoc(request['text'], date=request['date'])
+        annotator_names = request.get('annotators') or self.annotator_names
+        for name in annotator_names:
+            if name not in doc.tiers:
+                doc.add_tiers(self.annotators[name])
+        tier_names = request.get('tiers') or annotator_names
+        return {
+            'tiers': {
+                name: [span_to_dict(span) for span in doc.tiers[name]]
+                for name in tier_names if name in doc.tiers}
+        }
+
+
+def parse_request(body, annotator_names):
+    """
+    Parse and validate the JSON body of an annotation request. The date is
+    parsed into a datetime. Raises a ValueError if the request is invalid.
+    """
+    request = json.loads(body.decode('utf8'))
+    if not isinstance(request, dict):
+        raise ValueError("The request must be a JSON object.")
+    if not isinstance(request.get('text'), six.string_types):
+        raise ValueError("The request must include the document text.")
+    for key in ['annotators', 'tiers']:
+        value = request.get(key)
+        if value is not None and not (
+                isinstance(value, list) and
+                all(isinstance(name, six.string_types) for name in value)):
+            raise ValueError("The " + key + " must be a list of names.")
+    unknown_annotators = set(request.get('annotators') or []) - set(annotator_names)
+    if unknown_annotators:
+        raise ValueError("Unknown annotators: " + ", ".join(sorted(unknown_annotators)))
+    date = request.get('date')
+    if date:
+        if not isinstance(date, six.string_types):
+            raise ValueError("The date must be a string.")
+        try:
+            date = datetime.datetime.strptime(date[:10], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError("The date must start with a YYYY-MM-DD date.")
+    request['date'] = date or None
+    return request
+
+
+class AnnotationRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def send_json(self, status, value):
+        body = json.dumps(value).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('', '/status'):
+            self.send_json(200, {'annotators': self.server.annotator_names})
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/annotate':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            request = parse_request(self.rfile.read(content_length), self.server.annotator_names)
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        job = {
+            'request': request,
+            'done': threading.Event(),
+            'result': None,
+            'exc_info': None
+        }
+        self.server.jobs.put(job)
+        job['done'].wait()
+        if job['exc_info']:
+            logger.error(''.join(traceback.format_exception(*job['exc_info'])))
+            self.send_json(500, {'error': str(job['exc_info'][1])})
+        else:
+            self.send_json(200, job['result'])
+
+    def address_string(self):
+        # Unix socket clients don't have an address.
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return self.server.server_address
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s" % (self.address_string(), format % args))
+
+
+class AnnotationServerMixin(object):
+    """
+    Dispatches the requests received by the server to a pool of annotation
+    workers.
+    """
+    daemon_threads = True
+
+    def start_workers(self, annotator_names, num_workers):
+        self.annotator_names = list(annotator_names)
+        self.jobs = queue.Queue()
+        self.workers = [
+            AnnotationWorker(self.jobs, self.annotator_names)
+            for idx in range(num_workers)]
+        for worker in self.workers:
+            worker.start()
+        for worker in self.workers:
+            worker.ready.wait()
+            if worker.error:
+                raise worker.error
+
+
+class AnnotationServer(AnnotationServerMixin,
+                       socketserver.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    pass
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixAnnotationServer(AnnotationServerMixin,
+                               socketserver.ThreadingMixIn,
+                               socketserver.UnixStreamServer):
+        pass
+
+
+def create_server(annotator_names=None, host='127.0.0.1', port=8080,
+                  socket_path=None, num_workers=4, batch_window=0.005,
+                  batch_size=64, load_models=True):
+    """
+    Create a server with warm annotators. Call serve_forever on it to
+    start handling requests.
+
+    When batch_window is not None the shared spacy model is wrapped in a
+    BatchingModel, so it applies to every annotator in the process.
+    """
+    if annotator_names is None:
+        annotator_names = sorted(ANNOTATORS.keys())
+    unknown_annotators = set(annotator_names) - set(ANNOTATORS.keys())
+    if unknown_annotators:
+        raise ValueError("Unknown annotators: " + ", ".join(sorted(unknown_annotators)))
+    if load_models:
+        spacy_nlp.load_models()
+    if batch_window is not None:
+        if load_models:
+            model = spacy_nlp.spacy_nlp.load()
+        else:
+            model = spacy_nlp.LazyModel(spacy_nlp.load_spacy_model)
+        spacy_nlp.spacy_nlp.set_model(spacy_nlp.BatchingModel(
+            model,
+            batch_window=batch_window,
+            batch_size=batch_size))
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixAnnotationServer(socket_path, AnnotationRequestHandler)
+    else:
+        server = AnnotationServer((host, port), AnnotationRequestHandler)
+    server.start_workers(annotator_names, num_workers)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--socket', dest='socket_path',
+                        help='Listen on a Unix socket at this path instead of a TCP port.')
+    parser.add_argument('--annotators', nargs='+', choices=sorted(ANNOTATORS.keys()),
+                        help='The annotators to load. By default all of them are loaded.')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='The number of documents to annotate at once.')
+    parser.add_argument('--batch-window', type=float, default=5,
+                        help='Milliseconds to wait for concurrent texts to batch together for spacy.')
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+    server = create_server(
+        annotator_names=args.annotators,
+        host=args.host,
+        port=args.port,
+        socket_path=args.socket_path,
+        num_workers=args.workers,
+        batch_window=args.batch_window / 1000.0,
+        batch_size=args.batch_size)
+    print("EpiTator server listening on", args.socket_path or "%s:%s" % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
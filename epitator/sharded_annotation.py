@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Annotate long documents by splitting them into shards that are annotated in
+parallel processes.
+
+The text is split at paragraph breaks where possible, or else at line
+breaks, sentence ends or whitespace. Each shard is annotated with the
+text around it as context, by the annotators that don't have a true
+document_level attribute. The tiers of the shards are merged into the
+document with their offsets shifted, and the spans that start in the
+context of a shard are dropped, since they belong to the neighbouring
+shard. The document level annotators, like the GeonameAnnotator and
+StructuredIncidentAnnotator, use information from the whole document, so
+they are run afterwards on the merged document.
+
+    pipeline = ShardedPipeline([SpacyAnnotator(), CountAnnotator(), GeonameAnnotator()])
+    pipeline.annotate(AnnoDoc(text))
+
+The annotators and the spans they create are sent between processes, so
+they must be picklable. This module requires Python 3.
+"""
+from __future__ import absolute_import
+import re
+from concurrent.futures import ProcessPoolExecutor
+from .annodoc import AnnoDoc, iterate_referenced_spans
+
+# The patterns of the places to split the text at, in order of preference
+SHARD_BREAK_RES = [re.compile(pattern) for pattern in [
+    r'\n[ \t]*\n', r'\n', r'[.!?]\s', r'\s']]
+
+
+def find_shard_boundaries(text, shard_size):
+    """
+    Return the offsets that split the text into shards of at most
+    shard_size characters. Shards are split at the last break of the most
+    preferred kind in their second half.
+    """
+    boundaries = [0]
+    while len(text) - boundaries[-1] > shard_size:
+        start = boundaries[-1]
+        end = start + shard_size
+        for break_re in SHARD_BREAK_RES:
+            split = None
+            for match in break_re.finditer(text, start + shard_size // 2, end):
+                split = match.end()
+            if split is not None:
+                break
+        boundaries.append(end if split is None else split)
+    boundaries.append(len(text))
+    return boundaries
+
+
+def annotate_shard(text, date, properties, annotators):
+    """
+    Annotate the text of a shard in a separate document. Returns the
+    document and its annotators, with the given annotators replaced by their
+    indices, since they are copies of the annotators in the parent process.
+    """
+    doc = AnnoDoc(text, date=date)
+    doc.properties = properties
+    for annotator, kwargs in annotators:
+        doc.add_tiers(annotator, **kwargs)
+    annotator_indices = {id(annotator): idx for idx, (annotator, kwargs) in enumerate(annotators)}
+    doc_annotators = [
+        (annotator_indices.get(id(annotator), annotator), kwargs)
+        for annotator, kwargs in doc.annotators]
+    tier_annotators = {
+        name: annotator_indices.get(id(annotator), annotator)
+        for name, annotator in doc.tier_annotators.items()}
+    # The annotators are returned separately so the spans that refer to the
+    # document don't include them.
+    doc.annotators = []
+    doc.tier_annotators = {}
+    return doc, doc_annotators, tier_annotators
+
+
+class ShardedPipeline(object):
+    """
+    Applies a sequence of annotators to documents, splitting the documents
+    longer than shard_size characters into shards that are annotated in
+    the processes of an executor.
+
+    context is the number of characters on each side of a shard that are
+    included in its text. It should be longer than the spans the annotators
+    create, since spans that extend past the context are cut off.
+
+    executor is the concurrent.futures executor the shards are annotated
+    in. By default a ProcessPoolExecutor is created the first time a
+    document is sharded. It is shut down by the shutdown method.
+    """
+    def __init__(self, annotators, shard_size=100000, context=1000, executor=None):
+        self.annotators = [
+            annotator if isinstance(annotator, tuple) else (annotator, {})
+            for annotator in annotators]
+        self.shard_size = shard_size
+        self.context = context
+        self.executor = executor
+        self.owns_executor = False
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor()
+            self.owns_executor = True
+        return self.executor
+
+    def shutdown(self, wait=True):
+        if self.owns_executor:
+            self.executor.shutdown(wait)
+            self.executor = None
+            self.owns_executor = False
+
+    def annotate(self, doc):
+        """
+        Apply the annotators to the document and return it. The annotators
+        run on the shards don't have access to the tiers the document already
+        has, and the tiers they create replace them.
+        """
+        text = doc.text
+        if len(text) <= self.shard_size:
+            for annotator, kwargs in self.annotators:
+                doc.add_tiers(annotator, **kwargs)
+            return doc
+        local_annotators = [
+            (annotator, kwargs) for annotator, kwargs in self.annotators
+            if not getattr(annotator, 'document_level', False)]
+        boundaries = find_shard_boundaries(text, self.shard_size)
+        shard_starts = []
+        futures = []
+        for own_start, own_end in zip(boundaries, boundaries[1:]):
+            shard_start = max(0, own_start - self.context)
+            shard_end = min(len(text), own_end + self.context)
+            shard_starts.append(shard_start)
+            futures.append(self.get_executor().submit(
+                annotate_shard, text[shard_start:shard_end], doc.date, dict(doc.properties),
+                local_annotators))
+        spans_by_tier = {}
+        tier_classes = {}
+        for shard_idx, future in enumerate(futures):
+            shard_doc, shard_annotators, tier_annotators = future.result()
+            shard_start = shard_starts[shard_idx]
+            own_start = boundaries[shard_idx]
+            own_end = boundaries[shard_idx + 1]
+            if shard_idx == len(futures) - 1:
+                # Empty spans at the end of the text belong to the last shard.
+                own_end += 1
+            for span in iterate_referenced_spans(
+                    span for tier in shard_doc.tiers.values() for span in tier.spans):
+                span.start += shard_start
+                span.end += shard_start
+                span.doc = doc
+            for name, tier in shard_doc.tiers.items():
+                tier_classes[name] = tier.__class__
+                spans_by_tier.setdefault(name, []).extend(
+                    span for span in tier.spans if own_start <= span.start < own_end)
+            doc.properties.update(shard_doc.properties)
+            if shard_idx == 0:
+                for annotator, kwargs in shard_annotators:
+                    if isinstance(annotator, int):
+                        annotator = local_annotators[annotator][0]
+                    if not any(a is annotator for a, _ in doc.annotators):
+                        doc.annotators.append((annotator, kwargs))
+                for name, annotator in tier_annotators.items():
+                    if isinstance(annotator, int):
+                        annotator = local_annotators[annotator][0]
+                    doc.tier_annotators[name] = annotator
+        for name, spans in spans_by_tier.items():
+            doc.tiers[name] = tier_classes[name](spans, presorted=True)
+        for annotator, kwargs in self.annotators:
+            if getattr(annotator, 'document_level', False):
+                doc.add_tiers(annotator, **kwargs)
+        return doc
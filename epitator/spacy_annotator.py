@@ -6,6 +6,71 @@ import re
 from .spacy_nlp import spacy_nlp, sent_nlp
 
 
+# The spacy pipeline components that must be run to produce each tier.
+# Tokens only need the tagger for their lemmas and part of speech tags.
+# Sentences are produced by the separate sentencizer pipeline.
+TIER_PIPES = {
+    'spacy.sentences': set(),
+    'spacy.tokens': set(['tagger']),
+    'spacy.noun_chunks': set(['tagger', 'parser']),
+    'spacy.nes': set(['ner']),
+}
+
+
+# The key the SpacyDocState of a spacy doc is stored under in its user data
+DOC_STATE_KEY = 'epitator.doc_state'
+
+
+class SpacyDocState(object):
+    """
+    Pickles a spacy doc without its vocab, which is large and is loaded
+    from the same model by the process that unpickles the doc. The strings
+    the doc's tokens use are included in case they aren't in the model's
+    vocab. The token and sentence spans of a doc share a single state, so
+    the doc is only pickled once.
+    """
+    def __init__(self, spacy_doc):
+        self.spacy_doc = spacy_doc
+
+    @classmethod
+    def of(cls, spacy_doc):
+        state = spacy_doc.user_data.get(DOC_STATE_KEY)
+        if state is None:
+            state = spacy_doc.user_data[DOC_STATE_KEY] = cls(spacy_doc)
+        return state
+
+    def __reduce__(self):
+        spacy_doc = self.spacy_doc
+        if sent_nlp.loaded and spacy_doc.vocab is sent_nlp.vocab:
+            model_name = 'sent_nlp'
+        else:
+            model_name = 'spacy_nlp'
+        strings = set()
+        for token in spacy_doc:
+            strings.update([token.lemma_, token.tag_, token.dep_, token.ent_type_])
+        return (load_spacy_doc, (
+            model_name, sorted(strings), spacy_doc.to_bytes(tensor=False, user_data=False),
+            spacy_doc.is_parsed, spacy_doc.is_tagged))
+
+
+def load_spacy_doc(model_name, strings, data, is_parsed, is_tagged):
+    from spacy.tokens import Doc
+    vocab = (sent_nlp if model_name == 'sent_nlp' else spacy_nlp).vocab
+    for string in strings:
+        vocab.strings.add(string)
+    spacy_doc = Doc(vocab).from_bytes(data)
+    # The heads and tags of every doc are serialized, so from_bytes marks
+    # docs as parsed and tagged even if the pipes that set them were
+    # disabled.
+    spacy_doc.is_parsed = is_parsed
+    spacy_doc.is_tagged = is_tagged
+    return spacy_doc
+
+
+def span_slot_state(span):
+    return None, {name: getattr(span, name) for name in AnnoSpan.__slots__}
+
+
 class TokenSpan(AnnoSpan):
     __slots__ = ['token']
 
@@ -16,6 +81,19 @@ class TokenSpan(AnnoSpan):
             doc)
         self.token = token
 
+    def __reduce__(self):
+        # Spacy tokens can't be pickled, so the token is looked up in its
+        # unpickled doc.
+        return (load_token_span,
+                (SpacyDocState.of(self.token.doc), self.token.i),
+                span_slot_state(self))
+
+
+def load_token_span(spacy_doc, token_idx):
+    span = TokenSpan.__new__(TokenSpan)
+    span.token = spacy_doc[token_idx]
+    return span
+
 
 class SentSpan(AnnoSpan):
     __slots__ = ['span']
@@ -27,13 +105,86 @@ class SentSpan(AnnoSpan):
             doc)
         self.span = span
 
+    def __reduce__(self):
+        return (load_sent_span,
+                (SpacyDocState.of(self.span.doc), self.span.start, self.span.end, self.span.label),
+                span_slot_state(self))
+
+
+def load_sent_span(spacy_doc, start, end, label):
+    from spacy.tokens import Span
+    span = SentSpan.__new__(SentSpan)
+    span.span = Span(spacy_doc, start, end, label=label)
+    return span
+
+
+class TokenTier(AnnoTier):
+    """
+    A tier of TokenSpans that stores the spacy lemma ids of its tokens in a
+    list parallel to its spans so they can be matched without looking up
+    the strings of every token.
+    """
+    def __init__(self, spans=None, presorted=False):
+        super(TokenTier, self).__init__(spans, presorted)
+        self.lemma_ids = [span.token.lemma for span in self.spans]
+
+    def search_lemmas(self, lemma_groups):
+        """
+        Find the tokens with lemmas in each of the given groups in a single
+        pass over the tier.
+
+        Args:
+            lemma_groups (dict): A mapping from group names to lists of lemmas.
+        Returns:
+            A dict mapping each group name to a tier of the tokens with
+            lemmas in the group.
+        """
+        if len(self.spans) == 0:
+            return {name: AnnoTier() for name in lemma_groups}
+        strings = self.spans[0].token.vocab.strings
+        lemma_id_to_groups = {}
+        for name, lemmas in lemma_groups.items():
+            for lemma in set(lemmas):
+                lemma_id_to_groups.setdefault(strings[lemma], []).append(name)
+        group_spans = {name: [] for name in lemma_groups}
+        for span, lemma_id in zip(self.spans, self.lemma_ids):
+            for name in lemma_id_to_groups.get(lemma_id, ()):
+                group_spans[name].append(span)
+        return {name: AnnoTier(spans, presorted=True)
+                for name, spans in group_spans.items()}
+
 
 class SpacyAnnotator(Annotator):
+    """
+    Creates tiers from the output of the spacy pipeline.
+
+    Args:
+        tiers (iterable): The names of the spacy tiers to create. By default
+        all of them are created. The pipeline components that are not needed
+        for the requested tiers are disabled. Note that tokens created without
+        the spacy.noun_chunks tier are not dependency parsed.
+    """
+    def __init__(self, tiers=None):
+        if tiers is None:
+            tiers = TIER_PIPES.keys()
+        self.tiers = set(tiers)
+        unknown_tiers = self.tiers - set(TIER_PIPES.keys())
+        if unknown_tiers:
+            raise ValueError("Unknown spacy tiers: " + ", ".join(sorted(unknown_tiers)))
+        self.required_pipes = set()
+        for tier_name in self.tiers:
+            self.required_pipes |= TIER_PIPES[tier_name]
+
     def annotate(self, doc):
         tiers = {}
         ne_spans = []
         token_spans = []
         noun_chunks = []
+        disabled_pipes = [name for name in spacy_nlp.pipe_names
+                          if name not in self.required_pipes]
+        include_tokens = 'spacy.tokens' in self.tiers
+        include_nes = 'spacy.nes' in self.tiers
+        include_noun_chunks = 'spacy.noun_chunks' in self.tiers
         # SpaCy's neural nets currently use up too much memory on large docs,
         # so the document is divided into sections before recognizing named
         # entities. Each section is composed of N sentences. Sentence parsing
@@ -41,7 +192,10 @@ class SpacyAnnotator(Annotator):
         # https://github.com/explosion/spaCy/issues/1636
         sentences = AnnoTier([
             SentSpan(sent, doc) for sent in sent_nlp(doc.text).sents])
-        tiers['spacy.sentences'] = sentences
+        if 'spacy.sentences' in self.tiers:
+            tiers['spacy.sentences'] = sentences
+        if not (include_tokens or include_nes or include_noun_chunks):
+            return tiers
         group_size = 10
         for sent_group_idx in range(0, len(sentences), group_size):
             doc_offset = sentences.spans[sent_group_idx].start
@@ -49,14 +203,18 @@ class SpacyAnnotator(Annotator):
             ne_chunk_start = None
             ne_chunk_end = None
             ne_chunk_type = None
-            spacy_doc = spacy_nlp(doc.text[doc_offset:sent_group_end])
-            noun_chunks.extend(SentSpan(chunk, doc, offset=doc_offset) for chunk in spacy_doc.noun_chunks)
+            spacy_doc = spacy_nlp(doc.text[doc_offset:sent_group_end],
+                                  disable=disabled_pipes)
+            if include_noun_chunks:
+                noun_chunks.extend(SentSpan(chunk, doc, offset=doc_offset) for chunk in spacy_doc.noun_chunks)
             for token in spacy_doc:
                 start = token.idx + doc_offset
                 end = start + len(token)
                 # White-space tokens are skipped.
-                if not re.match(r"^\s", token.text):
+                if include_tokens and not re.match(r"^\s", token.text):
                     token_spans.append(TokenSpan(token, doc, offset=doc_offset))
+                if not include_nes:
+                    continue
                 if ne_chunk_start is not None and token.ent_iob_ != "I":
                     ne_spans.append(AnnoSpan(ne_chunk_start, ne_chunk_end,
                                              doc, label=ne_chunk_type))
@@ -89,7 +247,10 @@ class SpacyAnnotator(Annotator):
                 if date_as_number < 1900:
                     ne_span.label = 'QUANTITY'
 
-        tiers['spacy.noun_chunks'] = AnnoTier(noun_chunks, presorted=True)
-        tiers['spacy.tokens'] = AnnoTier(token_spans, presorted=True)
-        tiers['spacy.nes'] = AnnoTier(ne_spans, presorted=True)
+        if include_noun_chunks:
+            tiers['spacy.noun_chunks'] = AnnoTier(noun_chunks, presorted=True)
+        if include_tokens:
+            tiers['spacy.tokens'] = TokenTier(token_spans, presorted=True)
+        if include_nes:
+            tiers['spacy.nes'] = AnnoTier(ne_spans, presorted=True)
         return tiers
@@ -1,11 +1,149 @@
 #!/usr/bin/env python
-"""Load a shared spacy model"""
-import spacy
+"""
+Load a shared spacy model
+
+The models are loaded the first time they are used so that importing
+EpiTator modules doesn't pay the cost of loading spacy. Call load_models
+to load them in advance, for example when a worker process starts.
+"""
 import os
-if os.environ.get('SPACY_MODEL_SHORTCUT_LINK'):
-    spacy_nlp = spacy.load(os.environ.get('SPACY_MODEL_SHORTCUT_LINK'))
-else:
-    import en_core_web_md as spacy_model
-    spacy_nlp = spacy_model.load()
-sent_nlp = spacy.blank('en')
-sent_nlp.add_pipe(sent_nlp.create_pipe('sentencizer'))
+import sys
+import threading
+import time
+import six
+
+
+class LazyModel(object):
+    """
+    A proxy for an object that is created by the loader function the first
+    time it is used. Loading is thread-safe, so when several threads use the
+    model at the same time it is only loaded once.
+    """
+    def __init__(self, loader):
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        """
+        Return the underlying object, loading it if necessary.
+        """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._loader()
+        return self._model
+
+    def set_model(self, model):
+        """
+        Use the given object instead of loading one. This can be used to
+        wrap the loaded model, for example with a BatchingModel.
+        """
+        with self._lock:
+            self._model = model
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+class BatchingModel(object):
+    """
+    A wrapper for a spacy model that processes the texts passed to it by
+    concurrent threads together using the model's pipe method.
+
+    The first thread to submit a text waits batch_window seconds for other
+    threads to submit theirs, then processes all the pending texts while the
+    other threads wait for their results.
+    """
+    def __init__(self, model, batch_window=0.005, batch_size=64):
+        self.model = model
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        # Models are only used by one thread at a time.
+        self._model_lock = threading.Lock()
+        self._pending = []
+        self._collecting = False
+
+    def __call__(self, text, disable=()):
+        item = {
+            'text': text,
+            'disable': tuple(disable),
+            'done': threading.Event(),
+            'result': None,
+            'exc_info': None
+        }
+        with self._lock:
+            self._pending.append(item)
+            is_leader = not self._collecting
+            self._collecting = True
+        if is_leader:
+            time.sleep(self.batch_window)
+            with self._lock:
+                batch = self._pending
+                self._pending = []
+                self._collecting = False
+            self._process(batch)
+        item['done'].wait()
+        if item['exc_info']:
+            six.reraise(*item['exc_info'])
+        return item['result']
+
+    def _process(self, batch):
+        items_by_disabled_pipes = {}
+        for item in batch:
+            items_by_disabled_pipes.setdefault(item['disable'], []).append(item)
+        try:
+            for disable, items in items_by_disabled_pipes.items():
+                try:
+                    with self._model_lock:
+                        results = list(self.model.pipe(
+                            [item['text'] for item in items],
+                            disable=list(disable),
+                            batch_size=self.batch_size))
+                    for item, result in zip(items, results):
+                        item['result'] = result
+                except Exception:
+                    for item in items:
+                        item['exc_info'] = sys.exc_info()
+        finally:
+            for item in batch:
+                item['done'].set()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def load_spacy_model():
+    import spacy
+    if os.environ.get('SPACY_MODEL_SHORTCUT_LINK'):
+        return spacy.load(os.environ.get('SPACY_MODEL_SHORTCUT_LINK'))
+    else:
+        import en_core_web_md as spacy_model
+        return spacy_model.load()
+
+
+def load_sentence_model():
+    import spacy
+    model = spacy.blank('en')
+    model.add_pipe(model.create_pipe('sentencizer'))
+    return model
+
+
+spacy_nlp = LazyModel(load_spacy_model)
+sent_nlp = LazyModel(load_sentence_model)
+
+
+def load_models():
+    """
+    Load the shared spacy models now rather than when they are first used.
+    """
+    spacy_nlp.load()
+    sent_nlp.load()
@@ -2,101 +2,318 @@
 from __future__ import absolute_import
 from .annotator import Annotator, AnnoTier, AnnoSpan
 import re
-import pyparsing as pypar
+
+table_cell_separators = ["|", "/", ","]
+key_value_separators = [":", "-", ">"]
+# The maximum number of whitespace separated words in a table cell, key, or value.
+MAX_VALUE_WORDS = 10
+# The number of characters of text scanned at a time in streaming mode.
+WINDOW_SIZE = 2 ** 16
+
+inline_whitespace_re = re.compile(r"[ \t]*")
+block_whitespace_re = re.compile(r"[ \t\r\n]*")
 
 
 def word_token_regex(disallowed_delimiter):
-    return pypar.Regex(r"[^\s\n" + re.escape(disallowed_delimiter) + r"]+")
+    return re.compile(r"[^\s" + re.escape(disallowed_delimiter) + r"]+", re.UNICODE)
 
 
-pypar.ParserElement.setDefaultWhitespaceChars(" \t")
-table_parser = pypar.NoMatch()
-table_cell_separators = ["|", "/", ","]
-for separator in table_cell_separators:
-    value = pypar.Combine(
-        word_token_regex(separator) * (0, 10),
-        joinString=' ',
-        adjacent=False)
-    value.setParseAction(lambda start, tokens: (start, tokens[0]))
-    empty = pypar.Empty()
-    empty.setParseAction(lambda start, tokens: (start, tokens))
-    value = pypar.Group(value + empty)
-    row = pypar.Group(pypar.Optional(separator).suppress() +
-                      (value + pypar.Literal(separator).suppress()) * (1, None) +
-                      pypar.Optional(value) +
-                      (pypar.StringEnd() | pypar.Literal("\n")).suppress() +
-                      pypar.Optional("\n").suppress())
-    table_parser ^= (
-        (pypar.LineStart() + pypar.Optional(pypar.White())).suppress() +
-        row * (1, None)).setResultsName("delimiter:" + separator)
+class LineScanner(object):
+    """
+    Finds tables and key value lists in text one line at a time.
 
-key_value_separators = [":", "-", ">"]
-key_value_list_parser = pypar.NoMatch()
-for separator in key_value_separators:
-    value = pypar.Combine(
-        word_token_regex(separator) * (1, 10),
-        joinString=' ',
-        adjacent=False)
-    value.setParseAction(lambda start, tokens: (start, tokens[0]))
-    empty = pypar.Empty()
-    empty.setParseAction(lambda start, tokens: (start, tokens))
-    value = pypar.Group(value + empty)
-    row = pypar.Group(value + pypar.Literal(separator).suppress() + value +
-                      (pypar.StringEnd() | pypar.Literal("\n")).suppress() +
-                      pypar.Optional("\n").suppress())
-    key_value_list_parser ^= (
-        (pypar.LineStart() + pypar.Optional(pypar.White())).suppress() +
-        row * (2, None)).setResultsName("delimiter:" + separator)
+    A row is a single line containing the delimiter and may be followed by one
+    blank line. A block starts at the beginning of a line and extends over
+    all the rows that follow it. When several delimiters match at the
+    same line the one producing the longest block is used, with ties going to
+    the delimiter listed first.
 
+    If complete is False the text is treated as a window of complete lines
+    that more text will follow. Scanning stops at the first block that could
+    be changed by that text and resume_pos is set to the offset of the line
+    it starts on.
+    """
 
-class StructuredDataAnnotator(Annotator):
+    def __init__(self, text, delimiters, min_words, min_rows, key_value=False,
+                 start=0, complete=True):
+        self.text = text
+        self.text_len = len(text)
+        self.delimiters = delimiters
+        self.word_regexes = {
+            delimiter: word_token_regex(delimiter) for delimiter in delimiters}
+        self.min_words = min_words
+        self.min_rows = min_rows
+        self.key_value = key_value
+        self.row_cache = {}
+        self.start = start
+        self.complete = complete
+        self.resume_pos = None
+        self.reached_end = False
+
+    def skip_whitespace(self, pos):
+        return inline_whitespace_re.match(self.text, pos).end()
+
+    def parse_value(self, pos, delimiter):
+        """
+        Return the start and end offsets of the value at pos and the offset
+        following any trailing whitespace, or None if the value has fewer
+        than min_words words.
+        """
+        word_regex = self.word_regexes[delimiter]
+        start = self.skip_whitespace(pos)
+        end = start
+        next_pos = start
+        word_count = 0
+        while word_count < MAX_VALUE_WORDS:
+            match = word_regex.match(self.text, next_pos)
+            if not match:
+                break
+            word_count += 1
+            end = match.end()
+            next_pos = self.skip_whitespace(end)
+        if word_count < self.min_words:
+            return None
+        return start, end, next_pos
+
+    def at_delimiter(self, pos, delimiter):
+        return self.text.startswith(delimiter, pos)
+
+    def parse_row(self, pos, delimiter):
+        if pos >= self.text_len:
+            self.reached_end = True
+        key = (pos, delimiter)
+        if key not in self.row_cache:
+            self.row_cache[key] = self._parse_row(pos, delimiter)
+        return self.row_cache[key]
+
+    def _parse_row(self, pos, delimiter):
+        """
+        Return the (start, end) offsets of the cells in the row at pos and the
+        offset where the next row begins, or None if there is no row at pos.
+        """
+        text = self.text
+        line_end = text.find("\n", pos)
+        if line_end < 0:
+            line_end = self.text_len
+        if text.find(delimiter, pos, line_end) < 0:
+            return None
+        pos = self.skip_whitespace(pos)
+        cells = []
+        if not self.key_value and self.at_delimiter(pos, delimiter):
+            # Table rows may have a leading cell delimiter.
+            pos += 1
+        # Cells terminated by the delimiter. Key value rows have only one.
+        while not (self.key_value and cells):
+            value = self.parse_value(pos, delimiter)
+            if value is None or not self.at_delimiter(value[2], delimiter):
+                break
+            cells.append(value[:2])
+            pos = value[2] + 1
+        if len(cells) == 0:
+            return None
+        # The final cell terminated by the end of the line
+        value = self.parse_value(pos, delimiter)
+        if value is None:
+            return None
+        cells.append(value[:2])
+        pos = value[2]
+        if pos >= self.text_len:
+            pos = self.text_len + 1
+        elif text[pos] == "\n":
+            pos += 1
+            blank_line_end = self.skip_whitespace(pos)
+            if text.startswith("\n", blank_line_end):
+                pos = blank_line_end + 1
+        else:
+            return None
+        return cells, pos
+
+    def parse_block(self, pos, delimiter):
+        if self.text.startswith(("\n", "\r"), pos):
+            pos = block_whitespace_re.match(self.text, pos).end()
+        rows = []
+        while True:
+            row = self.parse_row(pos, delimiter)
+            if row is None:
+                break
+            cells, pos = row
+            rows.append(cells)
+        if len(rows) < self.min_rows:
+            return None
+        return rows, pos
+
+    def __iter__(self):
+        """
+        Yield a (rows, delimiter, start, end) tuple for each block in the text.
+        """
+        text = self.text
+        pos = self.start
+        while pos <= self.text_len:
+            line_start = pos
+            pos = self.skip_whitespace(pos)
+            if pos == line_start:
+                best = None
+                self.reached_end = False
+                for delimiter in self.delimiters:
+                    block = self.parse_block(pos, delimiter)
+                    if block and (best is None or block[1] > best[1][1]):
+                        best = (delimiter, block)
+                if self.reached_end and not self.complete:
+                    self.resume_pos = line_start
+                    return
+                if best:
+                    delimiter, (rows, end) = best
+                    yield rows, delimiter, pos, end
+                    pos = end
+                    continue
+            line_end = text.find("\n", pos)
+            if line_end < 0:
+                break
+            pos = line_end + 1
+        self.resume_pos = self.text_len
+
+
+def scan_tables(text, start=0, complete=True):
+    return LineScanner(text, table_cell_separators,
+                       min_words=0, min_rows=1,
+                       start=start, complete=complete)
+
+
+def scan_key_value_lists(text, start=0, complete=True):
+    return LineScanner(text, key_value_separators,
+                       min_words=1, min_rows=2, key_value=True,
+                       start=start, complete=complete)
+
+
+def iter_text_windows(text, window_size=WINDOW_SIZE):
     """
-    Annotates tables and key value lists embedded in documents.
+    Split text into chunks of at least window_size characters that end
+    at line breaks.
     """
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + window_size - 1) + 1 or len(text)
+        yield text[start:end]
+        start = end
 
-    def annotate(self, doc):
-        doc_text_len = len(doc.text)
 
-        def create_trimmed_annospan_for_doc(start, end, label=None, metadata=None):
-            return AnnoSpan(
-                start,
-                min(doc_text_len, end),
-                doc,
-                label=label,
-                metadata=metadata).trimmed()
+def iter_structured_data(lines, window_size=WINDOW_SIZE):
+    """
+    Scan the text made up of the given lines or line aligned chunks for tables
+    and key value lists. Only a window of at least window_size characters
+    is scanned at a time, and it is extended as long as the last block in it
+    is still open, so each block is yielded once the line ending it is read.
 
-        spans = []
-        value_spans = []
-        for token, start, end in table_parser.scanString(doc.text):
-            data = [[
-                create_trimmed_annospan_for_doc(value_start, value_end)
-                for ((value_start, value), (value_end, _)) in row] for row in token]
-            new_value_spans = [value for row in data for value in row]
+    Blocks are yielded as (type, rows, delimiter, start, end) tuples with
+    offsets into the full text. Table rows are lists of (start, end) cell
+    offsets and key value list rows are pairs of key and value offsets.
+    """
+    lines = iter(lines)
+    buffer = ""
+    # The offset of the start of the buffer in the full text
+    offset = 0
+    table_pos = 0
+    key_value_pos = 0
+    complete = False
+    while not complete:
+        chunks = []
+        chunk_size = 0
+        for line in lines:
+            chunks.append(line)
+            chunk_size += len(line)
+            if chunk_size >= window_size and line.endswith("\n"):
+                break
+        else:
+            complete = True
+        buffer += "".join(chunks)
+        buffer_len = len(buffer)
+
+        def trimmed(start, end):
+            end = min(end, buffer_len)
+            while start < end and buffer[start] == " ":
+                start += 1
+            while start < end and buffer[end - 1] == " ":
+                end -= 1
+            return offset + start, offset + end
+
+        table_scanner = scan_tables(buffer, table_pos - offset, complete)
+        for rows, delimiter, start, end in table_scanner:
             # Skip tables with one row and numeric/empty columns since they are likely
             # to be confused with unstructured text punctuation.
-            if len(data) == 1:
-                if len(new_value_spans) < 3:
+            if len(rows) == 1:
+                if len(rows[0]) < 3:
                     continue
-                elif any(re.match(r"\d*$", value.text) for value in new_value_spans):
+                elif any(re.match(r"\d*$", buffer[value_start:value_end])
+                         for value_start, value_end in rows[0]):
                     continue
-            spans.append(create_trimmed_annospan_for_doc(start, end, "table", metadata={
-                "type": "table",
-                "data": data,
-                "delimiter": next(k.split("delimiter:")[1] for k in token.keys() if k.startswith("delimiter:"))
-            }))
-            value_spans += new_value_spans
-        for token, start, end in key_value_list_parser.scanString(doc.text):
-            data = {
-                create_trimmed_annospan_for_doc(key_start, key_end): create_trimmed_annospan_for_doc(value_start, value_end)
-                for (((key_start, key), (key_end, _)), ((value_start, value), (value_end, _2))) in token
-            }
-            spans.append(create_trimmed_annospan_for_doc(start, end, "keyValuePairs", metadata={
-                "type": "keyValuePairs",
+            data = [[trimmed(*value) for value in row] for row in rows]
+            yield ("table", data, delimiter) + trimmed(start, end)
+        table_pos = offset + table_scanner.resume_pos
+        key_value_scanner = scan_key_value_lists(buffer, key_value_pos - offset, complete)
+        for rows, delimiter, start, end in key_value_scanner:
+            data = [(trimmed(*key), trimmed(*value)) for key, value in rows]
+            yield ("keyValuePairs", data, delimiter) + trimmed(start, end)
+        key_value_pos = offset + key_value_scanner.resume_pos
+        # Drop the text before the first open block.
+        next_offset = min(table_pos, key_value_pos)
+        buffer = buffer[next_offset - offset:]
+        offset = next_offset
+
+
+class StructuredDataAnnotator(Annotator):
+    """
+    Annotates tables and key value lists embedded in documents.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE):
+        self.window_size = window_size
+
+    def iter_spans(self, doc, lines=None):
+        """
+        Yield structured data spans for the document as soon as each table or
+        key value list in it is closed. The text is scanned in line aligned
+        windows, so when lines is an iterable over the document text, like
+        an open file, the scanner only keeps the current window and the
+        block that is still open in memory.
+
+        The spans refer to the document, so their text is read from
+        doc.text, which must still hold the full text. The
+        StructuredIncidentAnnotator doesn't consume the spans as they are
+        yielded. It uses the geonames and other entities of the whole
+        document, so it reads the finished structured_data tier.
+        """
+        if lines is None:
+            lines = iter_text_windows(doc.text, self.window_size)
+        for block_type, rows, delimiter, start, end in iter_structured_data(lines, self.window_size):
+            if block_type == "table":
+                data = [[
+                    AnnoSpan(value_start, value_end, doc)
+                    for value_start, value_end in row] for row in rows]
+            else:
+                data = {
+                    AnnoSpan(key_start, key_end, doc): AnnoSpan(value_start, value_end, doc)
+                    for ((key_start, key_end), (value_start, value_end)) in rows
+                }
+            yield AnnoSpan(start, end, doc, label=block_type, metadata={
+                "type": block_type,
                 "data": data,
-                "delimiter": next(k.split("delimiter:")[1] for k in token.keys() if k.startswith("delimiter:"))
-            }))
-            value_spans += data.values()
+                "delimiter": delimiter
+            })
+
+    def annotate(self, doc):
+        tables = []
+        key_value_lists = []
+        for span in self.iter_spans(doc):
+            if span.label == "table":
+                tables.append(span)
+            else:
+                key_value_lists.append(span)
+        value_spans = []
+        for span in tables:
+            value_spans += [value for row in span.metadata["data"] for value in row]
+        for span in key_value_lists:
+            value_spans += span.metadata["data"].values()
         return {
-            'structured_data': AnnoTier(spans),
+            'structured_data': AnnoTier(tables + key_value_lists),
             'structured_data.values': AnnoTier(value_spans)
         }
@@ -10,6 +10,7 @@ from .date_annotator import DateAnnotator
 from .raw_number_annotator import RawNumberAnnotator
 import re
 import logging
+from bisect import bisect_left, bisect_right
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -62,6 +63,98 @@ def combine_metadata(spans):
     return result
 
 
+class TypedSpanIndex(object):
+    """
+    An index of the spans in several tiers by start offset that finds the
+    spans of every type contained by a span in a single lookup.
+    """
+
+    def __init__(self, tiers_by_type):
+        self.types = list(tiers_by_type.keys())
+        entries = []
+        for type_idx, value_type in enumerate(self.types):
+            for span_idx, span in enumerate(tiers_by_type[value_type]):
+                entries.append((span.start, type_idx, span_idx, span))
+        entries.sort(key=lambda entry: entry[:3])
+        self.starts = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def spans_contained_by_span(self, selector_span):
+        """
+        Return a list for each type of the spans of that type contained by
+        the selector span, in the same order as in their tier.
+        """
+        result = [[] for value_type in self.types]
+        idx = bisect_left(self.starts, selector_span.start)
+        entries = self.entries
+        while idx < len(entries):
+            start, type_idx, span_idx, span = entries[idx]
+            if start >= selector_span.end:
+                break
+            if span.end <= selector_span.end:
+                result[type_idx].append(span)
+            idx += 1
+        return result
+
+
+class TableTitleFinder(object):
+    """
+    Finds the title candidates that come before tables. Candidates are
+    chains of up to 5 lines that don't overlap any structured data, so they
+    are computed separately for each gap between structured data spans,
+    and only for the gaps that are searched for a title.
+    """
+    line_re = re.compile(r"[^\n]+\n")
+
+    def __init__(self, doc, structured_data):
+        self.doc = doc
+        # The offsets of the regions covered by structured data
+        self.region_starts = []
+        self.region_ends = []
+        for span in structured_data:
+            if self.region_ends and span.start < self.region_ends[-1]:
+                self.region_ends[-1] = max(self.region_ends[-1], span.end)
+            else:
+                self.region_starts.append(span.start)
+                self.region_ends.append(span.end)
+        self.titles_by_gap = {}
+
+    def titles_in_gap(self, gap_idx):
+        """
+        Return the optimal set of title candidates in the gap before the
+        structured data region with the given index.
+        """
+        if gap_idx not in self.titles_by_gap:
+            gap_start = self.region_ends[gap_idx - 1] if gap_idx > 0 else 0
+            gap_end = self.region_starts[gap_idx]
+            text = self.doc.text
+            lines = []
+            for match in self.line_re.finditer(text, gap_start, gap_end):
+                # Lines that begin in the preceding region overlap it.
+                if match.start() == 0 or text[match.start() - 1] == "\n":
+                    lines.append(SpanGroup([AnnoSpan(
+                        match.start(),
+                        match.end(),
+                        self.doc,
+                        match.group(0))]))
+            self.titles_by_gap[gap_idx] = AnnoTier(lines, presorted=True)\
+                .chains(at_most=5, max_dist=0)\
+                .optimal_span_set()
+        return self.titles_by_gap[gap_idx]
+
+    def title_before(self, span):
+        """
+        Return the last title candidate before the given structured data span.
+        """
+        gap_idx = bisect_right(self.region_starts, span.start)
+        while gap_idx > 0:
+            gap_idx -= 1
+            titles = self.titles_in_gap(gap_idx)
+            if len(titles) > 0:
+                return titles.spans[-1]
+        return None
+
+
 def split_list(li):
     group = []
     for value in li:
@@ -79,6 +172,8 @@ class StructuredIncidentAnnotator(Annotator):
     """
     The structured incident annotator will find groupings of case counts and incidents
     """
+    # Tables use the titles and entities mentioned before them.
+    document_level = True
 
     def annotate(self, doc):
         if 'structured_data' not in doc.tiers:
@@ -127,17 +222,20 @@ class StructuredIncidentAnnotator(Annotator):
             'incident_type': spacy_tokens.search_spans(r'(case|death)s?'),
             'incident_status': spacy_tokens.search_spans(r'suspected|confirmed'),
         }
+        # Index the entities used to determine column types once for the
+        # whole document. Numbers that are part of dates are excluded.
+        entity_index = TypedSpanIndex(dict(
+            entities_by_type,
+            number=numbers.without_overlaps(dates)))
         tables = []
-        possible_titles = doc.create_regex_tier("[^\n]+\n")\
-            .chains(at_most=5, max_dist=0)\
-            .without_overlaps(doc.tiers['structured_data'])\
-            .optimal_span_set()
+        title_finder = TableTitleFinder(doc, doc.tiers['structured_data'])
+        species_tier = AnnoTier(species_list, presorted=True)
         for span in doc.tiers['structured_data'].spans:
             if span.metadata['type'] != 'table':
                 continue
             # Add virtual metadata columns based on surrounding text from
             # title sentence/paragraph.
-            table_title = possible_titles.span_before(span)
+            table_title = title_finder.title_before(span)
             if table_title:
                 table_title = AnnoSpan(
                     table_title.start,
@@ -148,18 +246,12 @@ class StructuredIncidentAnnotator(Annotator):
             last_date_mentioned = None
             last_species_mentioned = None
             if table_title:
-                last_species_mentioned = next(iter(AnnoTier(
-                    species_list,
-                    presorted=True
-                ).spans_contained_by_span(table_title).spans[-1:]), None)
-                last_geoname_mentioned = next(iter(AnnoTier(
-                    geonames,
-                    presorted=True
-                ).spans_contained_by_span(table_title).spans[-1:]), None)
-                last_date_mentioned = next(iter(AnnoTier(
-                    dates,
-                    presorted=True
-                ).spans_contained_by_span(table_title).spans[-1:]), None)
+                last_species_mentioned = next(iter(
+                    species_tier.spans_contained_by_span(table_title).spans[-1:]), None)
+                last_geoname_mentioned = next(iter(
+                    geonames.spans_contained_by_span(table_title).spans[-1:]), None)
+                last_date_mentioned = next(iter(
+                    dates.spans_contained_by_span(table_title).spans[-1:]), None)
             rows = span.metadata['data']
             # Detect header
             first_row = AnnoTier(rows[0])
@@ -188,28 +280,31 @@ class StructuredIncidentAnnotator(Annotator):
             for column_values in table_by_column:
                 num_non_null_rows = sum(not is_null(value.text) for value in column_values)
                 column_values = AnnoTier(column_values)
+                contained_spans_by_cell = [
+                    entity_index.spans_contained_by_span(value)
+                    for value in column_values]
                 # Choose column type based on greatest percent match,
                 # if under 30, choose text.
                 max_matches = 0
-                matching_column_entities = None
+                matching_type_idx = None
                 column_type = "text"
-                for value_type, value_spans in entities_by_type.items():
-                    filtered_value_spans = value_spans
-                    if value_type == "number":
-                        filtered_value_spans = value_spans.without_overlaps(dates)
-                    column_entities = [
-                        SpanGroup(contained_spans, metadata=combine_metadata(contained_spans)) if len(contained_spans) > 0 else None
-                        for group_span, contained_spans in column_values.group_spans_by_containing_span(filtered_value_spans)]
+                for type_idx, value_type in enumerate(entity_index.types):
                     num_matches = sum(
-                        contained_spans is not None
-                        for contained_spans in column_entities)
+                        len(contained_spans[type_idx]) > 0
+                        for contained_spans in contained_spans_by_cell)
                     if num_non_null_rows > 0 and float(num_matches) / num_non_null_rows > 0.3:
                         if num_matches > max_matches:
                             max_matches = num_matches
-                            matching_column_entities = column_entities
+                            matching_type_idx = type_idx
                             column_type = value_type
-                    if matching_column_entities is None:
-                        matching_column_entities = [[] for x in column_values]
+                if matching_type_idx is None:
+                    matching_column_entities = [[] for x in column_values]
+                else:
+                    matching_column_entities = []
+                    for contained_spans in contained_spans_by_cell:
+                        contained_spans = contained_spans[matching_type_idx]
+                        matching_column_entities.append(
+                            SpanGroup(contained_spans, metadata=combine_metadata(contained_spans)) if len(contained_spans) > 0 else None)
                 column_types.append(column_type)
                 parsed_column_entities.append(matching_column_entities)
 
@@ -8,6 +8,6 @@ from .spacy_annotator import SpacyAnnotator
 class TokenAnnotator(Annotator):
     def annotate(self, doc):
         if 'spacy.tokens' not in doc.tiers:
-            doc.add_tiers(SpacyAnnotator())
+            doc.add_tiers(SpacyAnnotator(tiers=['spacy.tokens']))
         doc.tiers['tokens'] = doc.tiers['spacy.tokens']
         return doc
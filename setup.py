@@ -30,11 +30,8 @@ setup(
         'regex==2017.4.5',
         'dateparser==0.6.0',
         'geopy>=1.11.0',
-        'unicodecsv>=0.14.1',
         'spacy==2.0.12',
-        'pyparsing==2.2.0',
         'numpy>=1.14.0',
-        'rdflib>=4.2.2',
         'python-dateutil>=2.6.0',
         'six'],
     classifiers=['Topic :: Text Processing',
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import unittest
+from epitator.annotator import AnnoDoc, Annotator
+
+
+class WordAnnotator(Annotator):
+
+    def __init__(self):
+        self.annotated_lengths = []
+
+    def annotate(self, doc):
+        self.annotated_lengths.append(len(doc.text))
+        return {'words': doc.create_regex_tier(r"\w+")}
+
+
+class WordCountAnnotator(Annotator):
+    document_level = True
+
+    def __init__(self, word_annotator):
+        self.word_annotator = word_annotator
+
+    def annotate(self, doc):
+        words = doc.require_tiers('words', via=lambda: self.word_annotator)
+        return {'word_count': doc.create_regex_tier(str(len(words)) + '$')}
+
+
+class TestAnnoDoc(unittest.TestCase):
+
+    def test_dependency_tier_annotators(self):
+        word_annotator = WordAnnotator()
+        count_annotator = WordCountAnnotator(word_annotator)
+        doc = AnnoDoc(u"one two three\n" * 100)
+        doc.add_tiers(count_annotator)
+        self.assertIs(doc.tier_annotators['words'], word_annotator)
+        self.assertIs(doc.tier_annotators['word_count'], count_annotator)
+        doc.update_text(u"one two three\n" * 99 + u"one two\n", context=0)
+        # The word annotator only re-annotates the changed line.
+        self.assertEqual(word_annotator.annotated_lengths, [len(u"one two three\n") * 100, 8])
+        self.assertEqual(len(doc.tiers['words']), 299)
+
+
+if __name__ == '__main__':
+    unittest.main()
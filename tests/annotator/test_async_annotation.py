@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import threading
+import time
+import unittest
+from epitator.annotator import AnnoDoc, Annotator
+from epitator.structured_data_annotator import StructuredDataAnnotator
+from epitator.get_database_connection import run_query
+try:
+    import asyncio
+    from epitator.async_annotation import AsyncPipeline
+except ImportError:
+    asyncio = None
+
+
+class SlowAnnotator(Annotator):
+    """
+    Waits before adding a tier with the thread it ran in.
+    """
+    def __init__(self, name, delay):
+        self.name = name
+        self.delay = delay
+
+    def annotate(self, doc):
+        time.sleep(self.delay)
+        doc.properties[self.name] = threading.current_thread().name
+        return doc
+
+
+class QueryRecorder(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, query_function, *args):
+        self.calls.append(args)
+        return query_function('connection', *args)
+
+
+class QueryAnnotator(Annotator):
+    connection = None
+
+    def annotate(self, doc):
+        doc.properties['query'] = run_query(self.connection, lambda connection, x: (connection, x), 1)
+        return doc
+
+
+@unittest.skipIf(asyncio is None, "asyncio requires Python 3")
+class TestAsyncAnnotation(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_add_tiers_async(self):
+        doc = AnnoDoc("Species / Cases\nDogs / 20\n")
+        result = self.loop.run_until_complete(doc.add_tiers_async(StructuredDataAnnotator()))
+        self.assertIs(result, doc)
+        self.assertEqual(len(doc.tiers['structured_data']), 1)
+
+    def test_database_executor(self):
+        recorder = QueryRecorder()
+        doc = AnnoDoc("text")
+        pipeline = AsyncPipeline([QueryAnnotator()], database_executor=recorder)
+        self.loop.run_until_complete(pipeline.annotate(doc))
+        self.assertEqual(doc.properties['query'], ('connection', 1))
+        self.assertEqual(recorder.calls, [(1,)])
+        # Outside of the pipeline queries use the annotator's connection.
+        QueryAnnotator().annotate(doc)
+        self.assertEqual(doc.properties['query'], (None, 1))
+
+    def test_timeout(self):
+        docs = [AnnoDoc("a"), AnnoDoc("b")]
+        pipeline = AsyncPipeline([SlowAnnotator('first', 0.2), SlowAnnotator('second', 0)])
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(pipeline.annotate_all(docs, timeout=0.05))
+        time.sleep(0.3)
+        for doc in docs:
+            self.assertIn('first', doc.properties)
+            self.assertNotIn('second', doc.properties)
+            self.assertNotEqual(doc.properties['first'], threading.current_thread().name)
+
+
+if __name__ == '__main__':
+    unittest.main()
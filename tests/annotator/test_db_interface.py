@@ -20,6 +20,13 @@ class TestCountAnnotator(unittest.TestCase):
                            'weight': 3,
                            'label': u'hand, foot and mouth disease'}], list(results))
 
+    def test_lookup_synonym_prefix(self):
+        results = self.db_interface.lookup_synonym('hand, foot', 'disease', mode='prefix')
+        self.assertEqual(u'http://purl.obolibrary.org/obo/DOID_10881', list(results)[0]['id'])
+        results = self.db_interface.lookup_synonym('foot and mouth', 'disease', mode='prefix')
+        self.assertNotIn(u'http://purl.obolibrary.org/obo/DOID_10881',
+                         [result['id'] for result in results])
+
     def test_get_entity(self):
         result = self.db_interface.get_entity('http://purl.obolibrary.org/obo/DOID_4325')
         self.assertEqual({'source': u'Disease Ontology',
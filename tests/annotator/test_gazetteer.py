@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from epitator import get_database_connection as db
+from epitator.gazetteer import PackedGazetteer
+from epitator.geoname_annotator import GeonameAnnotator, query_geonames_for_names, query_admin_names
+from epitator.importers.export_gazetteer import export_gazetteer
+from epitator.importers.import_geonames import geonames_field_mappings
+
+GEONAMES = [
+    # geonameid, name, alternate names, feature code, admin codes, population
+    ('2', u'Springfield', [u'Springfield', u'Springfeld'], 'PPL', ('US', 'IL', '167', ''), 116250),
+    ('10', u'Illinois', [u'Illinois', u'IL'], 'ADM1', ('US', 'IL', '', ''), 12830632),
+    ('11', u'Sangamon County', [u'Sangamon County'], 'ADM2', ('US', 'IL', '167', ''), 197465),
+    ('12', u'United States', [u'United States', u'USA'], 'PCLI', ('US', '00', '', ''), 310232863),
+    ('3', u'Springfield', [u'Springfield'], 'PPL', ('US', 'MO', '077', ''), 159498),
+    ('4', u'Zürich', [u'Zürich', u'Zurich'], 'PPLA', ('CH', 'ZH', '', ''), 341730),
+]
+
+
+class TestPackedGazetteer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.original_path = db.ANNOTATOR_DB_PATH
+        db.ANNOTATOR_DB_PATH = os.path.join(cls.directory, 'test.sqlitedb')
+        connection = db.get_database_connection(create_database=True)
+        connection.execute("CREATE TABLE geonames (" + ",".join([
+            '"' + k + '" ' + sqltype
+            for k, sqltype in geonames_field_mappings if sqltype]) + ")")
+        connection.execute('''CREATE TABLE alternatenames
+            (geonameid text, alternatename text, alternatename_lemmatized text)''')
+        connection.execute('''CREATE TABLE adminnames
+            (name text,
+             country_code text, admin1_code text, admin2_code text, admin3_code text,
+             PRIMARY KEY (country_code, admin1_code, admin2_code, admin3_code))''')
+        connection.execute('''CREATE TABLE alternatename_counts
+            (geonameid text primary key, count integer)''')
+        for geonameid, name, alternatenames, feature_code, codes, population in GEONAMES:
+            connection.execute("INSERT INTO geonames VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", (
+                geonameid, name, name, 40.5, -89.5, 'A', feature_code, codes[0], '',
+                codes[1], codes[2], codes[3], '', population))
+            for alternatename in alternatenames:
+                connection.execute("INSERT INTO alternatenames VALUES (?,?,?)", (
+                    geonameid, alternatename, alternatename.lower()))
+            connection.execute("INSERT INTO alternatename_counts VALUES (?,?)", (
+                geonameid, len(alternatenames)))
+            if feature_code.startswith('ADM') or feature_code.startswith('PCL'):
+                connection.execute("INSERT INTO adminnames VALUES (?,?,?,?,?)", (name,) + codes)
+        # A stale count and alternate name for a geoname that isn't in the
+        # geonames table
+        connection.execute("INSERT INTO alternatenames VALUES (?,?,?)", (
+            '20', u'Springfield', u'springfield'))
+        connection.execute("INSERT INTO alternatename_counts VALUES (?,?)", ('20', 1))
+        connection.commit()
+        connection.close()
+        cls.gazetteer_path = os.path.join(cls.directory, 'gazetteer')
+        export_gazetteer(cls.gazetteer_path)
+        cls.gazetteer = PackedGazetteer(cls.gazetteer_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        db.ANNOTATOR_DB_PATH = cls.original_path
+        shutil.rmtree(cls.directory)
+
+    def test_geonames_for_names(self):
+        names = [u'springfield', u'il', u'zürich', u'usa', u'nowhere', u'springfeld']
+        connection = db.get_database_connection(read_only=True)
+
+        def key(result):
+            return (result['alternatename_lemmatized'], result['geonameid'])
+        expected = sorted([dict(row) for row in query_geonames_for_names(connection, names)], key=key)
+        results = sorted(self.gazetteer.get_geonames_for_names(names), key=key)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results, expected)
+
+    def test_admin_names(self):
+        admin_codes = [
+            ('US', 'IL', '167', ''),
+            ('US', 'IL', '', ''),
+            ('US', 'MO', '077', ''),
+            ('CH', 'ZH', '', '')]
+        connection = db.get_database_connection(read_only=True)
+        expected = [[tuple(row) for row in rows] for rows in query_admin_names(connection, admin_codes)]
+        self.assertEqual(self.gazetteer.get_admin_names(admin_codes), expected)
+        self.assertEqual(expected[0], [('United States', 'Illinois', 'Sangamon County', 'Sangamon County')])
+
+    def test_concurrent_candidate_lookups(self):
+        gazetteer = self.gazetteer
+        first_query_started = threading.Event()
+        finish_first_query = threading.Event()
+
+        class SlowGazetteer(object):
+            calls = 0
+
+            def get_geonames_for_names(self, names):
+                SlowGazetteer.calls += 1
+                if SlowGazetteer.calls == 1:
+                    first_query_started.set()
+                    finish_first_query.wait(5)
+                return gazetteer.get_geonames_for_names(names)
+        annotator = GeonameAnnotator(gazetteer=SlowGazetteer())
+        first_results = []
+        thread = threading.Thread(target=lambda: first_results.extend(
+            annotator.get_geonames_for_names([u'springfield'])))
+        thread.start()
+        first_query_started.wait(5)
+        # The names the first thread is still querying aren't cached yet.
+        results = annotator.get_geonames_for_names([u'springfield'])
+        finish_first_query.set()
+        thread.join()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(first_results, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+from __future__ import absolute_import
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from epitator import get_database_connection as db
+
+
+class TestGetDatabaseConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.original_path = db.ANNOTATOR_DB_PATH
+        db.ANNOTATOR_DB_PATH = os.path.join(self.directory, 'test db.sqlitedb')
+        connection = db.get_database_connection(create_database=True)
+        connection.execute("INSERT INTO entities VALUES ('1', 'Ebola', 'disease', 'test')")
+        connection.commit()
+        connection.close()
+
+    def tearDown(self):
+        db.ANNOTATOR_DB_PATH = self.original_path
+        shutil.rmtree(self.directory)
+
+    def test_read_only(self):
+        connection = db.get_database_connection(read_only=True)
+        self.assertEqual(next(connection.execute("SELECT label FROM entities"))['label'], 'Ebola')
+        with self.assertRaises(sqlite3.OperationalError):
+            connection.execute("INSERT INTO entities VALUES ('2', 'Zika', 'disease', 'test')")
+
+    def test_connection_per_thread(self):
+        connection = db.get_database_connection(read_only=True)
+        self.assertIs(db.get_database_connection(read_only=True), connection)
+        thread_connections = []
+
+        def get_connection():
+            thread_connection = db.get_database_connection(read_only=True)
+            thread_connections.append(thread_connection)
+            # Connections can only be used in the thread that created them.
+            list(thread_connection.execute("SELECT * FROM entities"))
+        thread = threading.Thread(target=get_connection)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(thread_connections), 1)
+        self.assertIsNot(thread_connections[0], connection)
+
+
+if __name__ == '__main__':
+    unittest.main()
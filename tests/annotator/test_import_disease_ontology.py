@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from epitator import get_database_connection as db
+from epitator.database_interface import DatabaseInterface
+from epitator.importers import import_disease_ontology as importer
+
+OWL = u"""<?xml version="1.0"?>
+<rdf:RDF xmlns="http://purl.obolibrary.org/obo/doid.owl#"
+     xmlns:owl="http://www.w3.org/2002/07/owl#"
+     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+     xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">
+    <owl:Ontology rdf:about="http://purl.obolibrary.org/obo/doid.owl">
+        <owl:versionIRI rdf:resource="http://purl.obolibrary.org/obo/doid/releases/2018-01-01/doid.owl"/>
+    </owl:Ontology>
+    <owl:Class rdf:about="http://purl.obolibrary.org/obo/DOID_0050117">
+        <rdfs:label>disease by infectious agent</rdfs:label>
+    </owl:Class>
+    <owl:Class rdf:about="http://purl.obolibrary.org/obo/DOID_526">
+        <rdfs:subClassOf rdf:resource="http://purl.obolibrary.org/obo/DOID_0050117"/>
+        <rdfs:label>human immunodeficiency virus infectious disease</rdfs:label>
+    </owl:Class>
+    <owl:Class rdf:about="http://purl.obolibrary.org/obo/DOID_4325">
+        <rdfs:subClassOf rdf:resource="http://purl.obolibrary.org/obo/DOID_1"/>
+        <rdfs:subClassOf rdf:resource="http://purl.obolibrary.org/obo/DOID_0050117"/>
+        <rdfs:label>Ebola hemorrhagic fever</rdfs:label>
+        <oboInOwl:hasExactSynonym>Ebola virus disease</oboInOwl:hasExactSynonym>
+        <oboInOwl:hasRelatedSynonym>EHF (disorder)</oboInOwl:hasRelatedSynonym>
+    </owl:Class>
+    <owl:Class rdf:about="http://purl.obolibrary.org/obo/DOID_2">
+        <rdfs:subClassOf rdf:resource="http://purl.obolibrary.org/obo/DOID_4325"/>
+        <rdfs:label>Zaire ebolavirus infection</rdfs:label>
+        <oboInOwl:hasNarrowSynonym>ZEBOV</oboInOwl:hasNarrowSynonym>
+    </owl:Class>
+    <owl:Class rdf:about="http://purl.obolibrary.org/obo/DOID_1">
+        <rdfs:label>unrelated disease</rdfs:label>
+    </owl:Class>
+</rdf:RDF>
+"""
+
+OBO = u"""format-version: 1.2
+data-version: doid/releases/2018-01-01/doid.owl
+
+[Term]
+id: DOID:0050117
+name: disease by infectious agent
+
+[Term]
+id: DOID:526
+name: human immunodeficiency virus infectious disease
+is_a: DOID:0050117 ! disease by infectious agent
+
+[Term]
+id: DOID:4325
+name: Ebola hemorrhagic fever
+synonym: "Ebola virus disease" EXACT []
+synonym: "EHF (disorder)" RELATED []
+is_a: DOID:1 ! unrelated disease
+is_a: DOID:0050117 ! disease by infectious agent
+
+[Term]
+id: DOID:2
+name: Zaire ebolavirus infection
+synonym: "ZEBOV" NARROW []
+is_a: DOID:4325 ! Ebola hemorrhagic fever
+
+[Term]
+id: DOID:1
+name: unrelated disease
+
+[Typedef]
+id: has_material_basis_in
+name: has material basis in
+"""
+
+
+class TestImportDiseaseOntology(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.original_path = db.ANNOTATOR_DB_PATH
+
+    def tearDown(self):
+        db.ANNOTATOR_DB_PATH = self.original_path
+        shutil.rmtree(self.directory)
+
+    def import_file(self, name, text):
+        path = os.path.join(self.directory, name)
+        with io.open(path, 'w', encoding='utf8') as f:
+            f.write(text)
+        db.ANNOTATOR_DB_PATH = os.path.join(self.directory, name + '.sqlitedb')
+        importer.import_disease_ontology(ontology_path=path)
+        connection = db.get_database_connection()
+        tables = {
+            table: sorted(connection.execute('SELECT * FROM ' + table))
+            for table in ['entities', 'synonyms', 'metadata']}
+        connection.close()
+        return tables
+
+    def test_import(self):
+        tables = self.import_file('doid.owl', OWL)
+        prefix = importer.OBO_URI_PREFIX
+        self.assertEqual(
+            [entity[0] for entity in tables['entities']],
+            [prefix + 'DOID_0050117', prefix + 'DOID_2', prefix + 'DOID_4325', prefix + 'DOID_526'])
+        synonyms = tables['synonyms']
+        self.assertIn(('ebola virus disease', prefix + 'DOID_4325', 2), synonyms)
+        self.assertIn(('EHF', prefix + 'DOID_4325', 0), synonyms)
+        self.assertIn(('ZEBOV', prefix + 'DOID_2', 1), synonyms)
+        self.assertIn(('Ebola', prefix + 'DOID_4325', 3), synonyms)
+        self.assertFalse([s for s in synonyms if s[1] == prefix + 'DOID_1'])
+        self.assertIn(('disease_ontology_version',
+                       prefix + 'doid/releases/2018-01-01/doid.owl'), tables['metadata'])
+
+    def test_lookup_synonym(self):
+        self.import_file('doid.owl', OWL)
+        db_interface = DatabaseInterface()
+        self.assertTrue(db_interface.has_synonym_index)
+        prefix = importer.OBO_URI_PREFIX
+        results = list(db_interface.lookup_synonym('ebola', 'disease'))
+        self.assertEqual([result['id'] for result in results],
+                         [prefix + 'DOID_4325', prefix + 'DOID_2'])
+        results = list(db_interface.lookup_synonym('ebola', 'disease', mode='prefix'))
+        self.assertEqual([result['synonym'] for result in results], ['Ebola'])
+        results = list(db_interface.lookup_synonym('ebolavirus', 'disease', mode='prefix'))
+        self.assertEqual(results, [])
+        db_interface.db_connection.close()
+
+    def test_obo_matches_owl(self):
+        self.assertEqual(self.import_file('doid.obo', OBO), self.import_file('doid.owl', OWL))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import io
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import tempfile
+import unittest
+from zipfile import ZipFile
+from epitator import get_database_connection as db
+from epitator.importers import import_geonames as importer
+from epitator import geoname_annotator
+
+
+def geoname_line(geonameid, name, alternatenames, feature_code, admin1_code):
+    return u'\t'.join([
+        str(geonameid), name, name, u','.join(alternatenames), u'40.5', u'-89.5',
+        u'A', feature_code, u'US', u'', admin1_code, u'', u'', u'', u'1000',
+        u'', u'200', u'America/Chicago', u'2017-01-01']) + u'\n'
+
+
+LINES = [
+    geoname_line(idx, u'Place %d' % idx, [u'Pläce %d' % idx, u'P%d' % idx],
+                 u'ADM1' if idx % 10 == 0 else u'PPL', u'%02d' % (idx // 10))
+    for idx in range(1, 60)]
+
+
+def import_until_killed(db_path, geonames_path, kill_after_chunks):
+    """
+    Import the geonames in a separate process that is killed after it
+    inserts the given number of chunks.
+    """
+    db.ANNOTATOR_DB_PATH = db_path
+    importer.PARSE_CHUNK_SIZE = 5
+    importer.TRANSACTION_SIZE = 10
+    iterate_line_chunks = importer.iterate_line_chunks
+
+    def iterate_until_killed(*args):
+        for idx, chunk in enumerate(iterate_line_chunks(*args)):
+            if idx == kill_after_chunks:
+                os.kill(os.getpid(), signal.SIGKILL)
+            yield chunk
+    importer.iterate_line_chunks = iterate_until_killed
+    importer.import_geonames(geonames_path=geonames_path, processes=1)
+
+
+class TestImportGeonames(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.original_path = db.ANNOTATOR_DB_PATH
+        self.original_sizes = importer.PARSE_CHUNK_SIZE, importer.TRANSACTION_SIZE
+        importer.PARSE_CHUNK_SIZE = 5
+        importer.TRANSACTION_SIZE = 10
+
+    def tearDown(self):
+        db.ANNOTATOR_DB_PATH = self.original_path
+        importer.PARSE_CHUNK_SIZE, importer.TRANSACTION_SIZE = self.original_sizes
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with io.open(path, 'w', encoding='utf8') as f:
+            f.write(u''.join(lines))
+        return path
+
+    def import_to(self, db_name, geonames_path, processes=1):
+        db.ANNOTATOR_DB_PATH = os.path.join(self.directory, db_name)
+        importer.import_geonames(geonames_path=geonames_path, processes=processes)
+
+    def get_tables(self):
+        connection = db.get_database_connection()
+        tables = {
+            table: sorted(connection.execute('SELECT * FROM ' + table))
+            for table in ['geonames', 'alternatenames', 'adminnames', 'alternatename_counts',
+                          'geoname_lookup']}
+        connection.close()
+        return tables
+
+    def test_import(self):
+        text_path = self.write_file('allCountries.txt', LINES)
+        zip_path = os.path.join(self.directory, 'allCountries.zip')
+        with ZipFile(zip_path, 'w') as zip_file:
+            zip_file.write(text_path, 'allCountries.txt')
+        self.import_to('text.sqlitedb', text_path)
+        tables = self.get_tables()
+        self.assertEqual(len(tables['geonames']), 59)
+        self.assertEqual(len(tables['alternatenames']), 59 * 3)
+        self.assertEqual(len(tables['adminnames']), 5)
+        self.assertIn(('1', u'Pläce 1', u'pläce 1'), tables['alternatenames'])
+        self.import_to('zip.sqlitedb', zip_path, processes=2)
+        self.assertEqual(self.get_tables(), tables)
+
+    def test_lookup_table(self):
+        self.import_to('lookup.sqlitedb', self.write_file('allCountries.txt', LINES))
+        connection = db.get_database_connection()
+        connection.row_factory = sqlite3.Row
+        names = [u'place 1', u'p2', u'pläce 10', u'place 12', u'missing']
+
+        def query(function):
+            return sorted(tuple(sorted(dict(row).items())) for row in function(connection, names))
+        lookup_results = query(geoname_annotator.query_geoname_lookup_table)
+        self.assertEqual(len(lookup_results), 4)
+        self.assertEqual(lookup_results, query(geoname_annotator.query_geoname_tables))
+        self.assertTrue(geoname_annotator.has_geoname_lookup_table(connection))
+        connection.close()
+
+    def test_resume(self):
+        self.import_to('complete.sqlitedb', self.write_file('allCountries.txt', LINES))
+        expected = self.get_tables()
+        # An invalid line makes the import fail after some progress is saved.
+        bad_path = self.write_file('bad.txt', LINES[:30] + [u'invalid\n'] + LINES[31:])
+        with self.assertRaises(Exception):
+            self.import_to('resumed.sqlitedb', bad_path)
+        connection = db.get_database_connection()
+        checkpoint = importer.get_checkpoint(connection.cursor())
+        connection.close()
+        self.assertEqual(checkpoint['lines'], 30)
+        self.import_to('resumed.sqlitedb', self.write_file('allCountries.txt', LINES))
+        self.assertEqual(self.get_tables(), expected)
+
+    @unittest.skipIf(not hasattr(signal, 'SIGKILL'), "requires SIGKILL")
+    def test_resume_after_kill(self):
+        geonames_path = self.write_file('allCountries.txt', LINES)
+        self.import_to('complete.sqlitedb', geonames_path)
+        expected = self.get_tables()
+        # The process is killed with 5 lines imported after the last checkpoint.
+        db_path = os.path.join(self.directory, 'killed.sqlitedb')
+        process = multiprocessing.Process(
+            target=import_until_killed, args=(db_path, geonames_path, 7))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, -signal.SIGKILL)
+        connection = sqlite3.connect(db_path)
+        self.assertEqual(next(connection.execute('PRAGMA quick_check'))[0], 'ok')
+        checkpoint = importer.get_checkpoint(connection.cursor())
+        connection.close()
+        self.assertEqual(checkpoint['lines'], 30)
+        self.import_to('killed.sqlitedb', geonames_path)
+        self.assertEqual(self.get_tables(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from epitator import get_database_connection as db
+from epitator.importers import import_species as importer
+
+
+class TestImportSpecies(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.original_path = db.ANNOTATOR_DB_PATH
+        self.original_environ = dict(os.environ)
+        itis_path = os.path.join(self.directory, 'itis.sqlite')
+        itis = sqlite3.connect(itis_path)
+        itis.executescript("""
+        CREATE TABLE taxonomic_units (tsn INTEGER PRIMARY KEY, complete_name TEXT);
+        CREATE TABLE longnames (tsn INTEGER, completename TEXT);
+        CREATE TABLE reference_links (tsn INTEGER, documentation_id INTEGER);
+        CREATE TABLE vernaculars (tsn INTEGER, vernacular_name TEXT);
+        CREATE TABLE vern_ref_links (tsn INTEGER, documentation_id INTEGER);
+        """)
+        for tsn, name in [(180092, 'Homo sapiens'), (898079, 'Bubalus bubalis'),
+                          (176086, 'Gallus gallus'), (174983, 'Anas platyrhynchos')]:
+            itis.execute("INSERT INTO taxonomic_units VALUES (?, ?)", (tsn, name))
+            itis.execute("INSERT INTO longnames VALUES (?, ?)", (tsn, name))
+        itis.executemany("INSERT INTO reference_links VALUES (?, ?)", [
+            (180092, 1), (180092, 2), (180092, 3), (180092, 4), (176086, 1)])
+        itis.executemany("INSERT INTO vernaculars VALUES (?, ?)", [
+            (176086, 'chicken'), (176086, 'red junglefowl')])
+        itis.executemany("INSERT INTO vern_ref_links VALUES (?, ?)", [
+            (176086, 5), (176086, 6)])
+        itis.commit()
+        itis.close()
+        os.environ['ITIS_DB_PATH'] = itis_path
+        os.environ['ITIS_VERSION'] = 'itisSqlite010118'
+        db.ANNOTATOR_DB_PATH = os.path.join(self.directory, 'annotator.sqlitedb')
+
+    def tearDown(self):
+        db.ANNOTATOR_DB_PATH = self.original_path
+        os.environ.clear()
+        os.environ.update(self.original_environ)
+        shutil.rmtree(self.directory)
+
+    def test_import(self):
+        importer.import_species()
+        connection = db.get_database_connection()
+        entities = sorted(connection.execute("SELECT * FROM entities"))
+        synonyms = sorted(connection.execute("SELECT * FROM synonyms"))
+        version = next(connection.execute(
+            "SELECT value FROM metadata WHERE property = 'itis_version'"))[0]
+        connection.close()
+        self.assertEqual(len(entities), 4)
+        self.assertIn(('tsn:180092', 'Homo sapiens', 'species', 'ITIS'), entities)
+        self.assertEqual(version, 'itisSqlite010118')
+        # Weights are the number of references up to 3.
+        self.assertIn(('Homo sapiens', 'tsn:180092', 3), synonyms)
+        self.assertIn(('Gallus gallus', 'tsn:176086', 1), synonyms)
+        self.assertIn(('Bubalus bubalis', 'tsn:898079', 0), synonyms)
+        self.assertIn(('red junglefowl', 'tsn:176086', 2), synonyms)
+        # The hard-coded weight is used when it is higher than ITIS's.
+        self.assertIn(('chicken', 'tsn:176086', 3), synonyms)
+        self.assertNotIn(('chicken', 'tsn:176086', 2), synonyms)
+        self.assertIn(('people', 'tsn:180092', 3), synonyms)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import re
+import unittest
+from epitator.regex_scanner import find_matches
+
+
+class TestRegexScanner(unittest.TestCase):
+
+    def assertMatchesLikeFinditer(self, text, regexes):
+        self.assertEqual(find_matches(text, regexes), [
+            [match.span() for match in re.finditer(regex, text)]
+            for regex in regexes])
+
+    def test_overlapping_matches(self):
+        text = u'On 12 March 2018 there were 1,200 cases and 2018-03-13 had 3 more.'
+        self.assertMatchesLikeFinditer(text, [
+            r'\b\d{1,2} [a-zA-Z]{3,} \d{4}\b',
+            r'\b\d{4}-\d{2}-\d{2}\b',
+            r'\b\d+(,\d{3})*\b',
+            r'(?<=\d) \w+'])
+
+    def test_separately_searched_regexes(self):
+        text = u'abab aab, Abba ba'
+        self.assertMatchesLikeFinditer(text, [
+            # Starts with a literal
+            r'ab',
+            # Refers to a group
+            r'\b(a)\1',
+            # Can start with any character
+            r'\b.b',
+            re.compile(r'\bab', re.I)])
+
+    def test_empty_matches(self):
+        self.assertEqual(find_matches(u'a1b22', [r'\b\d*', r'(?=\d)\d*']), [
+            [], [(1, 2), (3, 5)]])
+
+
+if __name__ == '__main__':
+    unittest.main()
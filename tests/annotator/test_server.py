@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import json
+import threading
+import unittest
+from six.moves.urllib.request import urlopen, Request
+from six.moves.urllib.error import HTTPError
+from epitator.server import create_server
+from epitator.spacy_nlp import BatchingModel
+
+
+class PipeRecorder(object):
+    """
+    A stand in for a spacy model that records the batches passed to pipe.
+    """
+    def __init__(self):
+        self.batches = []
+
+    def pipe(self, texts, disable=None, batch_size=None):
+        self.batches.append(list(texts))
+        return [text.upper() for text in texts]
+
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = create_server(
+            annotator_names=['structured_data'],
+            port=0,
+            num_workers=2,
+            batch_window=None,
+            load_models=False)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever)
+        cls.server_thread.daemon = True
+        cls.server_thread.start()
+        cls.url = 'http://%s:%s' % cls.server.server_address[:2]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def post(self, data):
+        request = Request(self.url + '/annotate', json.dumps(data).encode('utf8'),
+                          {'Content-Type': 'application/json'})
+        return json.loads(urlopen(request).read().decode('utf8'))
+
+    def test_annotate(self):
+        result = self.post({
+            'text': 'Species / Cases / Deaths\nDogs / 20 / 1\n',
+            'annotators': ['structured_data']})
+        tables = result['tiers']['structured_data']
+        self.assertEqual(len(tables), 1)
+        self.assertEqual(tables[0]['metadata']['delimiter'], '/')
+        self.assertEqual(
+            [[cell['text'] for cell in row] for row in tables[0]['metadata']['data']],
+            [['Species', 'Cases', 'Deaths'], ['Dogs', '20', '1']])
+
+    def test_unknown_annotator(self):
+        with self.assertRaises(HTTPError) as context:
+            self.post({'text': 'Dogs', 'annotators': ['geonames']})
+        self.assertEqual(context.exception.code, 400)
+
+    def test_invalid_requests(self):
+        for data in [
+                ['Dogs'],
+                {'text': 'Dogs', 'annotators': 'structured_data'},
+                {'text': 'Dogs', 'tiers': [1]},
+                {'text': 'Dogs', 'date': '12/01/2017'},
+                {'text': 'Dogs', 'date': 20171201}]:
+            with self.assertRaises(HTTPError) as context:
+                self.post(data)
+            self.assertEqual(context.exception.code, 400)
+        result = self.post({'text': 'Dogs', 'date': '2017-12-01T00:00:00Z'})
+        self.assertEqual(result['tiers'], {'structured_data': []})
+
+    def test_batching_model(self):
+        recorder = PipeRecorder()
+        model = BatchingModel(recorder, batch_window=0.1)
+        results = {}
+
+        def process(text):
+            results[text] = model(text)
+        threads = [threading.Thread(target=process, args=(text,)) for text in ['a', 'b', 'c']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {'a': 'A', 'b': 'B', 'c': 'C'})
+        self.assertEqual(sorted(recorder.batches[0]), ['a', 'b', 'c'])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import unittest
+from epitator.annotator import AnnoDoc, Annotator
+try:
+    from concurrent.futures import ProcessPoolExecutor
+    from epitator.sharded_annotation import ShardedPipeline, find_shard_boundaries
+except ImportError:
+    ProcessPoolExecutor = None
+
+TEXT = u"""Three cases of Ebola were reported in Chiang Mai on Monday.
+Officials are investigating the source of the outbreak.
+
+Two more cases were confirmed in the following week.
+""" * 20 + u"Averyveryverylongwordwithoutanybreaksinit" * 10
+
+
+class WordAnnotator(Annotator):
+
+    def annotate(self, doc):
+        return {'words': doc.create_regex_tier(r"\w+", 'word')}
+
+
+class WordCountAnnotator(Annotator):
+    document_level = True
+
+    def annotate(self, doc):
+        doc.properties['word_count'] = len(doc.tiers['words'])
+        return doc
+
+
+@unittest.skipIf(ProcessPoolExecutor is None, "sharded annotation requires Python 3")
+class TestShardedAnnotation(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ProcessPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_find_shard_boundaries(self):
+        boundaries = find_shard_boundaries(TEXT, 500)
+        self.assertEqual(boundaries[0], 0)
+        self.assertEqual(boundaries[-1], len(TEXT))
+        for start, end in zip(boundaries, boundaries[1:]):
+            self.assertLessEqual(end - start, 500)
+        # The shards before the long word end at paragraph breaks.
+        for boundary in boundaries[1:-3]:
+            self.assertEqual(TEXT[boundary - 2:boundary], "\n\n")
+
+    def test_annotate(self):
+        word_annotator = WordAnnotator()
+        pipeline = ShardedPipeline(
+            [word_annotator, WordCountAnnotator()], shard_size=500, context=500,
+            executor=self.executor)
+        doc = pipeline.annotate(AnnoDoc(TEXT))
+        expected_doc = AnnoDoc(TEXT).add_tiers(WordAnnotator())
+        self.assertEqual(
+            [(span.start, span.end, span.label) for span in doc.tiers['words']],
+            [(span.start, span.end, span.label) for span in expected_doc.tiers['words']])
+        for span in doc.tiers['words']:
+            self.assertIs(span.doc, doc)
+            self.assertEqual(span.base_spans[0].text, span.text)
+        self.assertEqual(doc.properties['word_count'], len(expected_doc.tiers['words']))
+        self.assertIs(doc.tier_annotators['words'], word_annotator)
+        doc.update_text(TEXT.replace(u"Monday", u"Tuesday", 1))
+        self.assertEqual(doc.tiers['words'].spans[10].text, u"Tuesday")
+
+    def test_short_document(self):
+        pipeline = ShardedPipeline([WordAnnotator()], shard_size=500, executor=self.executor)
+        doc = pipeline.annotate(AnnoDoc(u"One short sentence."))
+        self.assertEqual(len(doc.tiers['words']), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
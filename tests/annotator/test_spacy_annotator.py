@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for pickling the spacy tiers and annotating them in shards."""
+from __future__ import absolute_import
+import pickle
+import unittest
+from epitator.annotator import AnnoDoc
+from epitator.spacy_annotator import SpacyAnnotator
+from epitator.count_annotator import CountAnnotator
+try:
+    from concurrent.futures import ProcessPoolExecutor
+    from epitator.sharded_annotation import ShardedPipeline
+except ImportError:
+    ProcessPoolExecutor = None
+
+TEXT = u"""Three people died of cholera in the capital last week.
+
+The ministry of health reported 25 new cases on Friday. Two of them were hospitalized.
+
+"""
+
+
+def token_attributes(tier):
+    return [(span.start, span.end, span.text, span.token.lemma_, span.token.tag_,
+             span.token.dep_, span.token.head.i - span.token.i) for span in tier]
+
+
+def count_attributes(tier):
+    return [(span.start, span.end, span.metadata.get('count'), span.metadata.get('attributes'))
+            for span in tier]
+
+
+class TestSpacyAnnotator(unittest.TestCase):
+
+    def test_pickle(self):
+        doc = AnnoDoc(TEXT).add_tiers(SpacyAnnotator())
+        copied_doc = pickle.loads(pickle.dumps(doc, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(
+            token_attributes(copied_doc.tiers['spacy.tokens']),
+            token_attributes(doc.tiers['spacy.tokens']))
+        self.assertEqual(copied_doc.tiers['spacy.tokens'].lemma_ids,
+                         doc.tiers['spacy.tokens'].lemma_ids)
+        for name in ['spacy.sentences', 'spacy.noun_chunks']:
+            self.assertEqual(
+                [(span.start, span.end, span.span.text) for span in copied_doc.tiers[name]],
+                [(span.start, span.end, span.span.text) for span in doc.tiers[name]])
+        for span in copied_doc.tiers['spacy.tokens']:
+            self.assertIs(span.doc, copied_doc)
+        self.assertTrue(copied_doc.tiers['spacy.tokens'].spans[0].token.doc.is_parsed)
+
+    def test_pickle_unparsed_tokens(self):
+        doc = AnnoDoc(TEXT).add_tiers(SpacyAnnotator(['spacy.tokens', 'spacy.sentences']))
+        copied_doc = pickle.loads(pickle.dumps(doc, pickle.HIGHEST_PROTOCOL))
+        self.assertFalse(copied_doc.tiers['spacy.tokens'].spans[0].token.doc.is_parsed)
+        self.assertFalse(copied_doc.tiers['spacy.sentences'].spans[0].span.doc.is_tagged)
+        # The count annotator replaces the unparsed tokens.
+        copied_doc.add_tiers(CountAnnotator())
+        self.assertEqual(
+            count_attributes(copied_doc.tiers['counts']),
+            count_attributes(AnnoDoc(TEXT).add_tiers(CountAnnotator()).tiers['counts']))
+
+    @unittest.skipIf(ProcessPoolExecutor is None, "sharded annotation requires Python 3")
+    def test_sharded_annotation(self):
+        text = TEXT * 10
+        executor = ProcessPoolExecutor(2)
+        pipeline = ShardedPipeline(
+            [SpacyAnnotator(), CountAnnotator()], shard_size=500, context=200,
+            executor=executor)
+        try:
+            doc = pipeline.annotate(AnnoDoc(text))
+        finally:
+            executor.shutdown()
+        expected_doc = AnnoDoc(text).add_tiers(SpacyAnnotator()).add_tiers(CountAnnotator())
+        self.assertEqual(
+            token_attributes(doc.tiers['spacy.tokens']),
+            token_attributes(expected_doc.tiers['spacy.tokens']))
+        self.assertEqual(
+            count_attributes(doc.tiers['counts']),
+            count_attributes(expected_doc.tiers['counts']))
+        self.assertGreater(len(doc.tiers['counts']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
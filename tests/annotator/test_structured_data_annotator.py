@@ -154,3 +154,52 @@ Integer County - 3 cases
             },
             'delimiter': '-'
         })
+
+    def test_tab_separated_cells(self):
+        doc = AnnoDoc("Species\t/ Cases\t/ Deaths\nDogs\t/ 20\t/ 1\n")
+        doc.add_tier(self.annotator)
+        metadatas = [
+            stringify_data_annospans(span.metadata)
+            for span in doc.tiers['structured_data'].spans
+        ]
+        self.assertEqual(metadatas, [{
+            'type': 'table',
+            'data': [
+                ['Species', 'Cases', 'Deaths'],
+                ['Dogs', '20', '1']
+            ],
+            'delimiter': '/'
+        }])
+
+    def test_streaming(self):
+        text = ''.join(
+            "Region %d / Cases / Deaths\nNorth / 1 / 0\nSouth / 2 / 1\n\nNotes:\n\n" % i
+            for i in range(20))
+        doc = AnnoDoc(text)
+        doc.add_tier(self.annotator)
+        read_lines = []
+
+        def iter_lines():
+            for line in text.splitlines(True):
+                read_lines.append(line)
+                yield line
+        spans = StructuredDataAnnotator(window_size=10).iter_spans(doc, iter_lines())
+        first_span = next(spans)
+        self.assertEqual(first_span.text, "Region 0 / Cases / Deaths\nNorth / 1 / 0\nSouth / 2 / 1\n\n")
+        self.assertLess(len(read_lines), 10)
+        self.assertEqual(
+            [(span.start, span.end) for span in [first_span] + list(spans)],
+            [(span.start, span.end) for span in doc.tiers['structured_data']])
+
+    def test_update_text(self):
+        doc = AnnoDoc("Species / Cases\nDogs / 20\n\nSome text.\n\nA: 1\nB: 2\n")
+        doc.add_tier(self.annotator)
+        doc.update_text("Species / Cases\nDogs / 20\nCats / 3\n\nSome text.\n\nA: 1\nB: 2\n", context=0)
+        expected = AnnoDoc(doc.text)
+        expected.add_tier(self.annotator)
+        self.assertEqual(
+            [stringify_data_annospans(span.metadata) for span in doc.tiers['structured_data']],
+            [stringify_data_annospans(span.metadata) for span in expected.tiers['structured_data']])
+        self.assertEqual(
+            [(span.start, span.end) for span in doc.tiers['structured_data.values']],
+            [(span.start, span.end) for span in expected.tiers['structured_data.values']])
@@ -73,6 +73,28 @@ class TokenAnnotatorTest(unittest.TestCase):
         self.assertEqual(self.doc.tiers['tokens'].spans[3].start, 29)
         self.assertEqual(self.doc.tiers['tokens'].spans[3].end, 30)
 
+    def test_only_token_tiers_created(self):
+
+        self.doc = AnnoDoc("I'm married to Joe from New York City.")
+        self.annotator.annotate(self.doc)
+
+        self.assertEqual(
+            sorted(self.doc.tiers.keys()), ['spacy.tokens', 'tokens'])
+        self.assertEqual(self.doc.tiers['tokens'].spans[0].token.lemma_, '-PRON-')
+
+    def test_search_lemmas(self):
+
+        self.doc = AnnoDoc("Two men died and three women were hospitalized.")
+        self.annotator.annotate(self.doc)
+
+        matches = self.doc.tiers['tokens'].search_lemmas({
+            'death': ['death', 'die'],
+            'person': ['man', 'woman'],
+            'recovery': ['recovery']})
+        self.assertEqual([span.text for span in matches['death']], ['died'])
+        self.assertEqual([span.text for span in matches['person']], ['men', 'women'])
+        self.assertEqual(len(matches['recovery']), 0)
+
 
 if __name__ == '__main__':
     unittest.main()